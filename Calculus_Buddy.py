@@ -64,6 +64,15 @@ def _replace_const_token(s, token, repl):
 
     return out
 
+# eval_expr falls back to eval() on the rewritten string when the parser
+# rejects an expression. Hosts that take untrusted input switch this off;
+# anything the parser rejects is then simply undefined.
+_EVAL_FALLBACK = True
+
+def set_eval_fallback(on):
+    global _EVAL_FALLBACK
+    _EVAL_FALLBACK = bool(on)
+
 def eval_expr(expr, x):
     """
     TI-safe expression evaluator.
@@ -72,6 +81,16 @@ def eval_expr(expr, x):
     """
     DEBUG = False
 
+    # Fast path: parse once, fold constants, reuse the compiled function
+    f = _compiled_evaluator(expr)
+    if f is not None:
+        try:
+            return f(x)
+        except Exception:
+            return None
+    if not _EVAL_FALLBACK:
+        return None
+
     def _is_digit(ch):
         o = ord(ch)
         return 48 <= o <= 57
@@ -163,15 +182,7 @@ def eval_expr(expr, x):
         # Power
         s = s.replace("^", "**")
 
-        # Functions
-        s = s.replace("sin(", "math.sin(")
-        s = s.replace("cos(", "math.cos(")
-        s = s.replace("tan(", "math.tan(")
-        s = s.replace("sqrt(", "math.sqrt(")
-        s = s.replace("ln(", "math.log(")
-        s = s.replace("exp(", "math.exp(")
-
-        # Constants (token-safe)
+        # Constants (token-safe); functions are looked up by name in _FUNCS
         s = _replace_const_token(s, "pi", "math.pi")
         s = _replace_const_token(s, "e", "math.e")
 
@@ -180,7 +191,11 @@ def eval_expr(expr, x):
             print("DEBUG final:", repr(s))
 
         # safer eval: no builtins
-        return eval(s, {"__builtins__": None, "math": math}, {"x": x})
+        v = eval(s, _func_env(), {"x": x})
+        if isinstance(v, tuple):
+            # a stray comma, e.g. (x,2)
+            return None
+        return v
 
     except Exception as e:
         if DEBUG:
@@ -190,6 +205,15 @@ def eval_expr(expr, x):
         return None
 
 def derivative_at(expr, a):
+    # Exact f'(a) when the expression differentiates symbolically
+    df = _compiled_derivative(expr)
+    if df is not None:
+        try:
+            return df(a)
+        except Exception:
+            return None
+
+    # Otherwise: symmetric difference quotient
     h = 1e-5
     f1 = eval_expr(expr, a + h)
     f2 = eval_expr(expr, a - h)
@@ -209,139 +233,65 @@ def _is_small_int(s):
     return True
 
 def _binom_coeffs(n):
-    # returns coeffs for (x+h)^n = sum_{k=0..n} C(n,k) x^(n-k) h^k
-    # n is small (2..6 typically)
-    # simple Pascal triangle
+    # coeffs for (x+h)^n = sum_{k=0..n} C(n,k) x^(n-k) h^k (length n+1).
+    # One row straight from C(n,k+1) = C(n,k)*(n-k)/(k+1): O(n) work and
+    # nothing kept between calls (the heap on the handheld is small).
     row = [1]
-    i = 0
-    while i < n:
-        new = [1]
-        j = 0
-        while j < len(row) - 1:
-            new.append(row[j] + row[j + 1])
-            j += 1
-        new.append(1)
-        row = new
-        i += 1
-    return row  # length n+1
+    c = 1
+    k = 0
+    while k < n:
+        c = c * (n - k) // (k + 1)
+        row.append(c)
+        k += 1
+    return row
 
-def _poly_diff_factored_form_power(n):
+def _binomial_terms(n, a=1, b=1, k0=0, h_drop=0):
     """
-    Builds the classic identity:
-      (x+h)^n - x^n = h * [C(n,1)x^(n-1) + C(n,2)x^(n-2)h + ... + h^(n-1)]
-    Returns inside string (the bracket), TI-style with ^.
+    Terms (c, x_pow, h_pow) of (a*x + b*h)^n, one at a time:
+    C(n,k) a^(n-k) b^k x^(n-k) h^k for k = k0..n, with h_pow lowered
+    by h_drop (after factoring out h).
     """
-    coeffs = _binom_coeffs(n)  # C(n,k)
-    # we want terms for k = 1..n : C(n,k) x^(n-k) h^k
-    # after factoring h: k becomes (k-1) on h
-    terms = []
-    k = 1
+    row = _binom_coeffs(n)
+    apow = [1]
+    while len(apow) <= n:
+        apow.append(apow[-1] * a)
+    bk = b ** k0
+    k = k0
     while k <= n:
-        c = coeffs[k]
-        x_pow = n - k
-        h_pow = k - 1
-
-        # build x piece
-        if x_pow == 0:
-            x_part = ""
-        elif x_pow == 1:
-            x_part = "x"
-        else:
-            x_part = "x^" + str(x_pow)
-
-        # build h piece (after factoring h)
-        if h_pow == 0:
-            h_part = ""
-        elif h_pow == 1:
-            h_part = "h"
-        else:
-            h_part = "h^" + str(h_pow)
-
-        # multiply pieces carefully
-        piece = ""
-        if c != 1:
-            piece += str(c) + "*"
-
-        if x_part != "" and h_part != "":
-            piece += x_part + "*" + h_part
-        elif x_part != "":
-            piece += x_part
-        elif h_part != "":
-            piece += h_part
-        else:
-            piece += "1"
-
-        terms.append(piece)
+        yield (row[k] * apow[n - k] * bk, n - k, k - h_drop)
+        bk *= b
         k += 1
 
-    # join with +
-    out = ""
-    i = 0
-    while i < len(terms):
-        if i == 0:
-            out += terms[i]
-        else:
-            out += " + " + terms[i]
-        i += 1
-    return out
+_STREAM_TERMS = 12        # terms per printed line in long expansions
 
-def _binomial_expand_xh(n):
+def _ws_terms(ws, prefix, terms, suffix=""):
     """
-    Returns expansion for (x+h)^n as a TI-style string with ^ and *.
-    Example n=2 -> x^2 + 2*x*h + h^2
+    Worksheet lines for prefix + the signed sum of terms (c, x_pow, h_pow)
+    + suffix, _STREAM_TERMS terms per line. Lines are written as the terms
+    are generated; no one string holds the whole expansion.
     """
-    coeffs = _binom_coeffs(n)  # C(n,k)
-
-    terms = []
-    k = 0
-    while k <= n:
-        c = coeffs[k]
-        x_pow = n - k
-        h_pow = k
-
-        # x piece
-        if x_pow == 0:
-            x_part = ""
-        elif x_pow == 1:
-            x_part = "x"
-        else:
-            x_part = "x^" + str(x_pow)
-
-        # h piece
-        if h_pow == 0:
-            h_part = ""
-        elif h_pow == 1:
-            h_part = "h"
-        else:
-            h_part = "h^" + str(h_pow)
-
-        # coefficient
-        piece = ""
-        if c != 1:
-            piece += str(c) + "*"
-
-        if x_part != "" and h_part != "":
-            piece += x_part + "*" + h_part
-        elif x_part != "":
-            piece += x_part
-        elif h_part != "":
-            piece += h_part
-        else:
-            piece += "1"
-
-        terms.append(piece)
-        k += 1
-
-    # join
-    out = ""
-    i = 0
-    while i < len(terms):
-        if i == 0:
-            out += terms[i]
+    line = prefix
+    count = 0
+    first = True
+    for (c, i, j) in terms:
+        if count == _STREAM_TERMS:
+            _ws_line(ws, line)
+            line = "   "
+            count = 0
+        piece = _xh_piece(c, i, j)
+        if first:
+            if c < 0:
+                line += "-"
+            line += piece
+            first = False
+        elif c < 0:
+            line += " - " + piece
         else:
-            out += " + " + terms[i]
-        i += 1
-    return out
+            line += " + " + piece
+        count += 1
+    if first:
+        line += "0"
+    _ws_line(ws, line + suffix)
 
 def _power_simple_derivative_str(n):
     # derivative of x^n is n*x^(n-1)
@@ -360,7 +310,7 @@ def _try_power_of_x(expr):
         n_str = s[2:]
         if _is_small_int(n_str):
             n = int(n_str)
-            if n >= 2 and n <= 8:
+            if n >= 2 and n <= _POLY_MAX_DEGREE:
                 return n
     return None
 
@@ -382,9 +332,128 @@ def _is_int_str(s):
         i += 1
     return True
 
-def _int_str_dec(s):
-    # decrement integer string (assumes _is_int_str(s))
-    return str(int(s) - 1)
+# ================================
+# Exact Rationals
+# ================================
+
+# A rational is a tuple (p, q) with q > 0 and gcd(p, q) = 1.
+# TI-safe stand-in for fractions.Fraction (not available on the handheld).
+
+Q_ZERO = (0, 1)
+Q_ONE = (1, 1)
+
+def _gcd(a, b):
+    # math.gcd is not in Python 3.4
+    if a < 0:
+        a = -a
+    if b < 0:
+        b = -b
+    while b:
+        a, b = b, a % b
+    return a
+
+def _q(p, q):
+    if q == 0:
+        raise ZeroDivisionError("rational with zero denominator")
+    if q < 0:
+        p = -p
+        q = -q
+    g = _gcd(p, q)
+    if g > 1:
+        p //= g
+        q //= g
+    return (p, q)
+
+def _q_from_str(s):
+    # "12", "2.5", ".5", "-3", "1/2" -> rational, or None
+    if s is None or len(s) == 0:
+        return None
+    if s[0] == "-":
+        r = _q_from_str(s[1:])
+        if r is None:
+            return None
+        return (-r[0], r[1])
+    slash = s.find("/")
+    if slash >= 0:
+        a = _q_from_str(s[:slash])
+        b = _q_from_str(s[slash + 1:])
+        if a is None or b is None or b[0] == 0:
+            return None
+        return _q_div(a, b)
+    dot = s.find(".")
+    if dot < 0:
+        if not _is_small_int(s):
+            return None
+        return (int(s), 1)
+    whole = s[:dot]
+    frac = s[dot + 1:]
+    if whole == "":
+        whole = "0"
+    if frac == "":
+        frac = "0"
+    if not _is_small_int(whole) or not _is_small_int(frac):
+        return None
+    return _q(int(whole + frac), 10 ** len(frac))
+
+def _q_str(r):
+    if r[1] == 1:
+        return str(r[0])
+    return str(r[0]) + "/" + str(r[1])
+
+def _q_add(a, b):
+    return _q(a[0] * b[1] + b[0] * a[1], a[1] * b[1])
+
+def _q_sub(a, b):
+    return _q(a[0] * b[1] - b[0] * a[1], a[1] * b[1])
+
+def _q_mul(a, b):
+    return _q(a[0] * b[0], a[1] * b[1])
+
+def _q_div(a, b):
+    return _q(a[0] * b[1], a[1] * b[0])
+
+def _q_neg(a):
+    return (-a[0], a[1])
+
+def _q_pow(a, b):
+    # exact only for integer exponents; None otherwise
+    if b[1] != 1:
+        return None
+    n = b[0]
+    if n >= 0:
+        return (a[0] ** n, a[1] ** n)
+    if a[0] == 0:
+        return None
+    return _q(a[1] ** (-n), a[0] ** (-n))
+
+# Folded constants stay below 2^256 (about 77 digits); past that a node
+# is left symbolic, so ((2^64)^64)^64 never becomes a 260000-bit integer.
+_Q_MAX = 2 ** 256
+
+def _q_fits(r):
+    return r is not None and abs(r[0]) < _Q_MAX and r[1] < _Q_MAX
+
+def _q_binop(op, a, b):
+    # exact a op b, or None when the result is not rational / defined
+    if op == "+":
+        return _q_add(a, b)
+    if op == "-":
+        return _q_sub(a, b)
+    if op == "*":
+        return _q_mul(a, b)
+    if op == "/":
+        if b[0] == 0:
+            return None
+        return _q_div(a, b)
+    if op == "^":
+        # keep huge powers like 10^400 symbolic
+        if b[1] != 1 or abs(b[0]) > 64:
+            return None
+        return _q_pow(a, b)
+    return None
+
+def _q_float(r):
+    return r[0] / r[1]
 
 def _menu_choice(prompt):
     """
@@ -462,20 +531,49 @@ def _read_atom(s, i):
 
     return s[i], i + 1
 
+def _read_exponent(s, i):
+    # Exponent text after "^": signed atoms joined by further ^ powers
+    # (^ groups to the right, so e^x^2 = e^(x^2))
+    n = len(s)
+    out = ""
+    while True:
+        sign = ""
+        k = i
+        if k < n and s[k] == "-":
+            sign = "-"
+            k += 1
+        atom, j = _read_atom(s, k)
+        if atom == "":
+            break
+        out += sign + atom
+        i = j
+        if i + 1 < n and s[i] == "^":
+            out += "^"
+            i += 1
+            continue
+        break
+    if len(out) > 0 and out[-1] == "^":
+        out = out[:-1]
+        i -= 1
+    return out, i
+
 def _rewrite_e_power_to_exp_all(s):
     out = ""
     i = 0
     n = len(s)
 
     while i < n:
-        if s[i] == "e" and i + 1 < n and s[i + 1] == "^":
-            atom, j = _read_atom(s, i + 2)
+        # the constant e, not the end of a name such as rate^2
+        if (s[i] == "e" and i + 1 < n and s[i + 1] == "^"
+                and (i == 0 or not _is_alnum_or_underscore(s[i - 1]))):
+            atom, j = _read_exponent(s, i + 2)
             if atom == "":
                 out += "e^"
                 i += 2
                 continue
 
-            if len(atom) >= 2 and atom[0] == "(" and atom[-1] == ")":
+            # one (...) group already supplies the call parentheses
+            if atom[0] == "(" and _read_atom(atom, 0)[1] == len(atom):
                 out += "exp" + atom
             else:
                 out += "exp(" + atom + ")"
@@ -581,7 +679,7 @@ def _tokenize(s):
     while i < n:
         ch = s[i]
 
-        if ch in "+-*/^()":
+        if ch in "+-*/^(),":
             tokens.append(ch)
             i += 1
             continue
@@ -644,7 +742,171 @@ def _is_name_token(tok):
     return True
 
 def _is_supported_func(name):
-    return name in ["sin", "cos", "tan", "ln", "sqrt", "exp"]
+    return name in _FUNCS
+
+
+# ================================
+# Function Library
+# ================================
+
+# Evaluators written with exp/cos/sin/log only, so they work with the
+# basic math module on the calculator
+def _sec(v):
+    return 1.0 / math.cos(v)
+
+def _csc(v):
+    return 1.0 / math.sin(v)
+
+def _cot(v):
+    return math.cos(v) / math.sin(v)
+
+def _sinh(v):
+    return (math.exp(v) - math.exp(-v)) / 2.0
+
+def _cosh(v):
+    return (math.exp(v) + math.exp(-v)) / 2.0
+
+def _tanh(v):
+    # exp(2v) overflows long before tanh stops being +-1 in floats
+    if v > 20:
+        return 1.0
+    if v < -20:
+        return -1.0
+    e2 = math.exp(2.0 * v)
+    return (e2 - 1.0) / (e2 + 1.0)
+
+def _log(v, b=10.0):
+    # log(v) is base 10 (as on the TI); log(v, b) is base b
+    return math.log(v) / math.log(b)
+
+def _one_over(den):
+    return N_bin("/", N_num("1"), den)
+
+def _log_base_node(u, b):
+    # log(u, b): base 10 stays log(u), base e is ln(u), others ln(u)/ln(b)
+    if b["t"] == "num" and b["q"] == (10, 1):
+        return N_fun("log", u)
+    if b["t"] == "name" and b["v"] == "e":
+        return N_fun("ln", u)
+    return N_bin("/", N_fun("ln", u), N_fun("ln", b))
+
+# One entry per function name:
+#   f      : numeric evaluator
+#   d      : builds f'(u) as an AST (the chain rule multiplies by u')
+#   step   : rule text for the step list
+#   leibniz: du_k/du_(k+1) text, with U standing for u_(k+1)
+#   domain : (lo, lo_closed, hi, hi_closed), None for an open end,
+#            or None for all reals
+#   two    : builds the AST for a two-argument call, if there is one
+_FUNCS = {
+    "sin": {"f": math.sin,
+            "d": lambda u: N_fun("cos", u),
+            "step": "Chain: sin -> cos*u'",
+            "leibniz": "cos(U)",
+            "domain": None},
+    "cos": {"f": math.cos,
+            "d": lambda u: N_un("-", N_fun("sin", u)),
+            "step": "Chain: cos -> -sin*u'",
+            "leibniz": "-sin(U)",
+            "domain": None},
+    "tan": {"f": math.tan,
+            "d": lambda u: _one_over(N_bin("^", N_fun("cos", u), N_num("2"))),
+            "step": "Chain: tan -> (1/cos^2)*u'",
+            "leibniz": "1/(cos(U)^2)",
+            "domain": None},
+    "ln": {"f": math.log,
+           "d": lambda u: _one_over(u),
+           "step": "Chain: ln -> (1/u)*u'",
+           "leibniz": "1/U",
+           "domain": (0.0, False, None, False)},
+    "sqrt": {"f": math.sqrt,
+             "d": lambda u: _one_over(N_bin("*", N_num("2"), N_fun("sqrt", u))),
+             "step": "Chain: sqrt -> (1/(2*sqrt(u)))*u'",
+             "leibniz": "1/(2*sqrt(U))",
+             "domain": (0.0, True, None, False)},
+    "exp": {"f": math.exp,
+            "d": lambda u: N_fun("exp", u),
+            "step": "Chain: exp -> exp(u)*u'",
+            "leibniz": "exp(U)",
+            "domain": None},
+    "sec": {"f": _sec,
+            "d": lambda u: N_bin("*", N_fun("sec", u), N_fun("tan", u)),
+            "step": "Chain: sec -> sec*tan*u'",
+            "leibniz": "sec(U)*tan(U)",
+            "domain": None},
+    "csc": {"f": _csc,
+            "d": lambda u: N_un("-", N_bin("*", N_fun("csc", u), N_fun("cot", u))),
+            "step": "Chain: csc -> -csc*cot*u'",
+            "leibniz": "-csc(U)*cot(U)",
+            "domain": None},
+    "cot": {"f": _cot,
+            "d": lambda u: N_un("-", _one_over(N_bin("^", N_fun("sin", u), N_num("2")))),
+            "step": "Chain: cot -> -(1/sin^2)*u'",
+            "leibniz": "-1/(sin(U)^2)",
+            "domain": None},
+    "asin": {"f": math.asin,
+             "d": lambda u: _one_over(N_fun("sqrt", N_bin("-", N_num("1"),
+                                                          N_bin("^", u, N_num("2"))))),
+             "step": "Chain: asin -> (1/sqrt(1-u^2))*u'",
+             "leibniz": "1/sqrt(1-U^2)",
+             "domain": (-1.0, True, 1.0, True)},
+    "acos": {"f": math.acos,
+             "d": lambda u: N_un("-", _one_over(N_fun("sqrt", N_bin("-", N_num("1"),
+                                                                    N_bin("^", u, N_num("2")))))),
+             "step": "Chain: acos -> -(1/sqrt(1-u^2))*u'",
+             "leibniz": "-1/sqrt(1-U^2)",
+             "domain": (-1.0, True, 1.0, True)},
+    "atan": {"f": math.atan,
+             "d": lambda u: _one_over(N_bin("+", N_num("1"), N_bin("^", u, N_num("2")))),
+             "step": "Chain: atan -> (1/(1+u^2))*u'",
+             "leibniz": "1/(1+U^2)",
+             "domain": None},
+    "sinh": {"f": _sinh,
+             "d": lambda u: N_fun("cosh", u),
+             "step": "Chain: sinh -> cosh*u'",
+             "leibniz": "cosh(U)",
+             "domain": None},
+    "cosh": {"f": _cosh,
+             "d": lambda u: N_fun("sinh", u),
+             "step": "Chain: cosh -> sinh*u'",
+             "leibniz": "sinh(U)",
+             "domain": None},
+    "tanh": {"f": _tanh,
+             "d": lambda u: _one_over(N_bin("^", N_fun("cosh", u), N_num("2"))),
+             "step": "Chain: tanh -> (1/cosh^2)*u'",
+             "leibniz": "1/(cosh(U)^2)",
+             "domain": None},
+    "log": {"f": _log,
+            "d": lambda u: _one_over(N_bin("*", u, N_fun("ln", N_num("10")))),
+            "step": "Chain: log -> (1/(u*ln(10)))*u'",
+            "leibniz": "1/(U*ln(10))",
+            "domain": (0.0, False, None, False),
+            "two": _log_base_node},
+    "abs": {"f": abs,
+            "d": lambda u: N_bin("/", u, N_fun("abs", u)),
+            "step": "Chain: abs -> (u/abs(u))*u'",
+            "leibniz": "U/abs(U)",
+            "domain": None}
+}
+
+def _in_domain(fn, v):
+    # True if v lies in the interval where fn is defined
+    dom = _FUNCS[fn]["domain"]
+    if dom is None:
+        return True
+    lo, lo_closed, hi, hi_closed = dom
+    if lo is not None and (v < lo or (v == lo and not lo_closed)):
+        return False
+    if hi is not None and (v > hi or (v == hi and not hi_closed)):
+        return False
+    return True
+
+def _func_env():
+    # Globals for eval/exec of generated code: every function by name
+    env = {"__builtins__": None, "math": math}
+    for name in _FUNCS:
+        env[name] = _FUNCS[name]["f"]
+    return env
 
 
 # ================================
@@ -652,7 +914,8 @@ def _is_supported_func(name):
 # ================================
 
 # AST nodes
-def N_num(v): return {"t": "num", "v": v}
+def N_num(v): return {"t": "num", "v": v, "q": _q_from_str(v)}
+def N_rat(r): return {"t": "num", "v": _q_str(r), "q": r}
 def N_var():  return {"t": "var"}
 def N_name(v):return {"t": "name", "v": v}
 def N_un(op, a): return {"t": "un", "op": op, "a": a}
@@ -686,7 +949,7 @@ def _contains_any(s, subs):
 
 def _looks_like_chain(s):
     # Quick heuristic: any of these suggests composition
-    funcs = ["sin(", "cos(", "tan(", "ln(", "sqrt(", "exp("]
+    funcs = [name + "(" for name in _FUNCS]
     if _contains_any(s, funcs):
         return True
     # power with parentheses is usually chain: ( ... )^n or something^(
@@ -697,22 +960,116 @@ def _looks_like_chain(s):
         return True
     return False
 
-def classify_rules(expr):
+_RULE_LABELS = {
+    "quotient": "Quotient rule",
+    "product": "Product rule",
+    "sumdiff": "Sum/Difference rule",
+    "chain": "Chain rule",
+    "power": "Power rule",
+    "constmult": "Constant multiple rule",
+    "function": "Basic function rule",
+    "exponential": "Exponential rule a^g"
+}
+
+def _classify_ast(ast):
     """
-    Returns a dict:
-    - normalized: cleaned expression string (simple)
-    - has_chain: True/False
-    - has_product: True/False (top-level *)
-    - has_quotient: True/False (top-level /)
-    - has_sumdiff: True/False (top-level + or -)
-    - recommended_order: list of rule names in likely order
-    - recommended_tool: text label (which menu tool)
+    One post-order walk over the AST (explicit stack).
+    Returns (outer, depth, rules) where rules is a list of
+    rule keys ordered from the outermost use to the innermost.
     """
-    s = _normalize_expr_for_symbolic(expr)
+    dep = {}
+    first = {}     # rule -> (level, first-seen index)
+    depth = 0
+    stack = [(ast, 1, False)]
+
+    while len(stack) > 0:
+        node, level, done = stack.pop()
+        t = node["t"]
+
+        if not done:
+            if level > depth:
+                depth = level
+            stack.append((node, level, True))
+            if t == "bin":
+                stack.append((node["b"], level + 1, False))
+                stack.append((node["a"], level + 1, False))
+            elif t == "un" or t == "fun":
+                stack.append((node["a"], level + 1, False))
+            continue
+
+        rule = None
+        rule2 = None
+        if t == "var":
+            d = True
+        elif t == "num" or t == "name":
+            d = False
+        elif t == "un":
+            d = dep[id(node["a"])]
+        elif t == "fun":
+            a = node["a"]
+            d = dep[id(a)]
+            if d:
+                if a["t"] == "var":
+                    rule = "function"
+                else:
+                    rule = "chain"
+        else:
+            op = node["op"]
+            da = dep[id(node["a"])]
+            db = dep[id(node["b"])]
+            d = da or db
+            if op == "+" or op == "-":
+                if d:
+                    rule = "sumdiff"
+            elif op == "*":
+                if da and db:
+                    rule = "product"
+                elif d:
+                    rule = "constmult"
+            elif op == "/":
+                if db:
+                    rule = "quotient"
+                elif da:
+                    rule = "constmult"
+            elif op == "^":
+                if db:
+                    rule = "exponential"
+                    if node["b"]["t"] != "var":
+                        rule2 = "chain"
+                elif da:
+                    if node["a"]["t"] == "var":
+                        rule = "power"
+                    else:
+                        rule = "chain"
 
-    # NOTE: do NOT normalize heavily here. This is just for rule detection.
-    # Your chain_rule_tool already normalizes for parsing.
+        dep[id(node)] = d
+        for r in (rule, rule2):
+            if r is not None:
+                old = first.get(r)
+                if old is None or level < old[0]:
+                    first[r] = (level, len(first) if old is None else old[1])
 
+    # outermost first; ties keep the order they were found in
+    keys = list(first.keys())
+    keys.sort(key=lambda r: first[r])
+
+    t = ast["t"]
+    if t == "bin":
+        outer = {"+": "sum/difference", "-": "sum/difference", "*": "product",
+                 "/": "quotient", "^": "power"}[ast["op"]]
+    elif t == "fun":
+        outer = "function " + ast["fn"]
+    elif t == "un":
+        outer = "negation"
+    elif t == "var":
+        outer = "x"
+    else:
+        outer = "constant"
+
+    return outer, depth, keys
+
+def _classify_rules_text(s):
+    # String heuristics, used only when the expression does not parse
     has_quotient = _has_top_level_op(s, "/")
     has_product = _has_top_level_op(s, "*")
     has_sumdiff = _has_top_level_op(s, "+-")
@@ -733,27 +1090,91 @@ def classify_rules(expr):
     if has_chain:
         order.append("Chain rule (inside)")
 
+    return has_chain, has_product, has_quotient, has_sumdiff, order
+
+def _is_exp_node(n):
+    # e^g is parsed as exp(g)
+    return n["t"] == "fun" and n["fn"] == "exp"
+
+def classify_rules(expr):
+    """
+    Returns a dict (memoized per input; treat it as read-only):
+    - normalized: cleaned expression string (simple)
+    - has_chain: True/False
+    - has_product: True/False (product rule needed somewhere)
+    - has_quotient: True/False (quotient rule needed somewhere)
+    - has_sumdiff: True/False (sum/difference rule needed somewhere)
+    - outer: outermost operation ("quotient", "function sin", ...)
+    - depth: nesting depth of the expression tree
+    - rules: rule keys, outermost first
+    - layers: chain layers from _extract_chain_layers
+    - recommended_order: list of rule names in likely order
+    - recommended_tool: text label (which menu tool)
+    """
+    e = _expr_entry(expr)
+    if "classify" in e:
+        return e["classify"]
+
+    s = e["normalized"]
+    ast = _entry_ast(e)
+
+    if ast is not None:
+        outer, depth, rules = _classify_ast(ast)
+        has_chain = "chain" in rules
+        has_product = "product" in rules
+        has_quotient = "quotient" in rules
+        has_sumdiff = "sumdiff" in rules
+        layers = _extract_chain_layers(ast)
+
+        order = []
+        i = 0
+        while i < len(rules):
+            label = _RULE_LABELS[rules[i]]
+            if i == 0:
+                order.append(label + " (outside)")
+            else:
+                order.append(label + " (inside)")
+            i += 1
+    else:
+        # fall back to text heuristics so the helper still answers
+        outer = None
+        depth = None
+        rules = []
+        layers = []
+        has_chain, has_product, has_quotient, has_sumdiff, order = _classify_rules_text(s)
+
     if len(order) == 0:
         order.append("Basic rules only (power, constant, etc.)")
 
     # Recommended tool
     # If anything looks like chain (or product/quotient) and you want symbolic steps
-    # your Chain Rule Solver is the best single place.
-    if has_chain or has_product or has_quotient:
+    # your Chain Rule Solver is the best single place. a^g, e^g and f^g
+    # (exponential / logarithmic differentiation) are symbolic there too.
+    exponential = "exponential" in rules
+    if ast is not None and _any_node(ast, _is_exp_node):
+        exponential = True
+    if has_chain or has_product or has_quotient or exponential:
         tool = "Use: Chain Rule Solver (steps)"
     else:
         tool = "Use: Derivative Solver f'(a) (numeric) OR Definition tool if required"
 
-    return {
+    info = {
         "normalized": s,
         "has_chain": has_chain,
         "has_product": has_product,
         "has_quotient": has_quotient,
         "has_sumdiff": has_sumdiff,
+        "outer": outer,
+        "depth": depth,
+        "rules": rules,
+        "layers": layers,
         "recommended_order": order,
         "recommended_tool": tool
     }
 
+    e["classify"] = info
+    return info
+
 def rule_helper_auto():
     print("\nRULE HELPER (AUTO)")
     expr = input("Paste the expression (in x): ")
@@ -763,10 +1184,15 @@ def rule_helper_auto():
     print(info["normalized"])
 
     print("\nDetected:")
-    print("Top-level quotient ( / ): " + ("YES" if info["has_quotient"] else "NO"))
-    print("Top-level product  ( * ): " + ("YES" if info["has_product"] else "NO"))
-    print("Top-level + or -       : " + ("YES" if info["has_sumdiff"] else "NO"))
+    if info["outer"] is not None:
+        print("Outermost operation    : " + info["outer"])
+        print("Nesting depth          : " + str(info["depth"]))
+    print("Quotient rule    ( / ) : " + ("YES" if info["has_quotient"] else "NO"))
+    print("Product rule     ( * ) : " + ("YES" if info["has_product"] else "NO"))
+    print("Sum/difference ( + - ) : " + ("YES" if info["has_sumdiff"] else "NO"))
     print("Chain/composition      : " + ("YES" if info["has_chain"] else "NO"))
+    if len(info["layers"]) > 0:
+        print("Chain layers           : " + str(len(info["layers"])))
 
     print("\nRule order (typical):")
     i = 0
@@ -788,7 +1214,8 @@ def rule_helper_auto_tests():
         "(x^2)(sin(x))",
         "(x^2 + 1)/(x - 3)",
         "7*sin(x)",
-        "sqrt(1+x)"
+        "sqrt(1+x)",
+        "x*sin(x)+1"
     ]
 
     i = 0
@@ -803,7 +1230,17 @@ def rule_helper_auto_tests():
 
     pause()
 
+# Binding strength for the parser's operator stack.
+# Unary minus sits between * / and ^ (like Python): -x^2 = -(x^2), x^-2 ok.
+_BIN_PREC = {"+": 1, "-": 1, "*": 2, "/": 2, "^": 4}
+_NEG_PREC = 3
+
 class _Parser:
+    """
+    Operator-precedence parser with explicit stacks (no recursion),
+    so nesting depth is limited only by memory.
+    parse() returns the AST or None for malformed input.
+    """
     def __init__(self, tokens):
         self.toks = tokens
         self.i = 0
@@ -819,301 +1256,466 @@ class _Parser:
             return True
         return False
 
+    def _reduce(self, out, ops):
+        # apply the operator on top of ops to the operands in out
+        kind, op = ops.pop()
+        if kind == "neg":
+            if len(out) < 1:
+                return False
+            out.append(N_un("-", out.pop()))
+            return True
+        if kind == "bin":
+            if len(out) < 2:
+                return False
+            b = out.pop()
+            a = out.pop()
+            out.append(N_bin(op, a, b))
+            return True
+        return False
+
     def parse(self):
-        node = self.expr()
-        if self.peek() is not None:
-            return None
-        return node
+        out = []        # operands (AST nodes)
+        ops = []        # ("bin", op), ("neg", None), ("(", None or ","), ("fn", name)
+        expect = True   # True when the next token must start an operand
 
-    def expr(self):
-        node = self.term()
         while True:
             t = self.peek()
-            if t == "+" or t == "-":
-                self.i += 1
-                rhs = self.term()
-                node = N_bin(t, node, rhs)
-            else:
+            if t is None:
                 break
-        return node
 
-    def term(self):
-        node = self.power()
-        while True:
-            t = self.peek()
-            if t == "*" or t == "/":
+            if expect:
                 self.i += 1
-                rhs = self.power()
-                node = N_bin(t, node, rhs)
-            else:
-                break
-        return node
+                if t == "+":
+                    continue
+                if t == "-":
+                    ops.append(("neg", None))
+                    continue
+                if t == "(":
+                    ops.append(("(", None))
+                    continue
+                if _is_number_token(t):
+                    out.append(N_num(t))
+                elif _is_name_token(t):
+                    # function call
+                    if self.peek() == "(" and _is_supported_func(t):
+                        self.i += 1
+                        ops.append(("fn", t))
+                        ops.append(("(", None))
+                        continue
+                    if t == "x":
+                        out.append(N_var())
+                    else:
+                        out.append(N_name(t))
+                else:
+                    return None
+                expect = False
+                continue
 
-    def power(self):
-        node = self.unary()
-        if self.peek() == "^":
-            self.i += 1
-            rhs = self.power()
-            node = N_bin("^", node, rhs)
-        return node
+            if t == ")":
+                self.i += 1
+                while len(ops) > 0 and ops[-1][0] != "(":
+                    if not self._reduce(out, ops):
+                        return None
+                if len(ops) == 0:
+                    return None
+                if ops.pop()[1] == ",":
+                    # second argument: log(u, b)
+                    b = out.pop()
+                    u = out.pop()
+                    out.append(_FUNCS[ops.pop()[1]]["two"](u, b))
+                elif len(ops) > 0 and ops[-1][0] == "fn":
+                    out.append(N_fun(ops.pop()[1], out.pop()))
+                continue
 
-    def unary(self):
-        t = self.peek()
-        if t == "+":
-            self.i += 1
-            return self.unary()
-        if t == "-":
-            self.i += 1
-            return N_un("-", self.unary())
-        return self.primary()
+            if t == ",":
+                # only inside a function that takes a second argument
+                self.i += 1
+                while len(ops) > 0 and ops[-1][0] != "(":
+                    if not self._reduce(out, ops):
+                        return None
+                if len(ops) < 2 or ops[-1][1] is not None or ops[-2][0] != "fn":
+                    return None
+                if "two" not in _FUNCS[ops[-2][1]]:
+                    return None
+                ops[-1] = ("(", ",")
+                expect = True
+                continue
 
-    def primary(self):
-        t = self.peek()
-        if t is None:
-            return None
+            if t in _BIN_PREC:
+                self.i += 1
+                p = _BIN_PREC[t]
+                while len(ops) > 0 and (ops[-1][0] == "bin" or ops[-1][0] == "neg"):
+                    top = ops[-1]
+                    if top[0] == "neg":
+                        tp = _NEG_PREC
+                    else:
+                        tp = _BIN_PREC[top[1]]
+                    # ^ groups to the right, everything else to the left
+                    if tp > p or (tp == p and t != "^"):
+                        if not self._reduce(out, ops):
+                            return None
+                    else:
+                        break
+                ops.append(("bin", t))
+                expect = True
+                continue
 
-        if _is_number_token(t):
-            self.i += 1
-            return N_num(t)
+            return None
 
-        if _is_name_token(t):
-            self.i += 1
-            name = t
+        if expect:
+            return None
+        while len(ops) > 0:
+            if not self._reduce(out, ops):
+                return None
+        if len(out) != 1:
+            return None
+        return out[0]
 
-            # function call
-            if self.peek() == "(" and _is_supported_func(name):
-                self.i += 1
-                inside = self.expr()
-                if not self.eat(")"):
-                    return None
-                return N_fun(name, inside)
+def _postorder(root):
+    """
+    Unique nodes of a tree (or shared-subtree DAG), children before parents.
+    Explicit stack, so depth is limited only by memory.
+    """
+    out = []
+    seen = {}
+    stack = [(root, False)]
+    while len(stack) > 0:
+        node, done = stack.pop()
+        if done:
+            out.append(node)
+            continue
+        if id(node) in seen:
+            continue
+        seen[id(node)] = True
+        stack.append((node, True))
+        t = node["t"]
+        if t == "bin":
+            stack.append((node["b"], False))
+            stack.append((node["a"], False))
+        elif t == "un" or t == "fun":
+            stack.append((node["a"], False))
+    return out
 
-            if name == "x":
-                return N_var()
+def _to_str(node):
+    """
+    Renders an AST in one pass: pieces go onto a work stack and come off
+    in output order into a single list, so the cost is proportional to
+    the length of the result. Parentheses are decided per node from its
+    shape and where it sits (_needs_parens), never by rescanning text.
+    """
+    out = []
+    stack = [(node, "")]
+    while len(stack) > 0:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+            continue
 
-            return N_name(name)
+        n, ctx = item
+        if ctx != "" and _needs_parens(n, ctx):
+            out.append("(")
+            stack.append(")")
+
+        t = n["t"]
+        if t == "num" or t == "name":
+            out.append(n["v"])
+        elif t == "var":
+            out.append("x")
+        elif t == "un":
+            out.append("-")
+            stack.append((n["a"], "un"))
+        elif t == "fun":
+            out.append(n["fn"] + "(")
+            stack.append(")")
+            stack.append((n["a"], ""))
+        elif t == "bin":
+            op = n["op"]
+            if op == "/":
+                # make division unambiguous
+                left, right = "/", "/"
+            elif op == "^":
+                left, right = "base", "pow"
+            elif op == "-":
+                # a-(b+c): the right side of a minus keeps its sum together
+                left, right = "-", "-r"
+            else:
+                left, right = op, op
+            stack.append((n["b"], right))
+            stack.append(op)
+            stack.append((n["a"], left))
+        else:
+            out.append("?")
+    return "".join(out)
 
-        if t == "(":
-            self.i += 1
-            inside = self.expr()
-            if not self.eat(")"):
-                return None
-            return inside
+def _needs_parens(child, ctx):
+    # Does child need parentheses in context ctx (the parent operator/side)?
+    t = child["t"]
+    if t == "num":
+        s = child["v"]
+        if ctx == "/":
+            # -3, 1/2 or 1e-05 next to a division bar
+            i = 0
+            while i < len(s):
+                if s[i] in "+-*/^":
+                    return True
+                i += 1
+            return False
+        # exact coefficients such as -3 or 1/2 act like a unary minus / quotient
+        return ctx != "+" and (s[0] == "-" or "/" in s)
 
-        return None
+    if t == "un":
+        return ctx in ["/", "pow", "base"]
 
-def _needs_parens_for_div(s):
-    # Add parentheses if the string contains an operator that could change meaning
-    # Example: (x+1) / x needs parens on x+1
-    if s is None or len(s) == 0:
-        return False
+    if t == "bin":
+        op = child["op"]
+        if ctx == "/" or ctx == "base":
+            # ^ groups to the right, so even a power as the base needs parens
+            return True
+        if ctx in ["*", "pow", "un", "-r"] and (op == "+" or op == "-"):
+            return True
+        if ctx == "pow" and op != "^":
+            return True
 
-    # already wrapped
-    if len(s) >= 2 and s[0] == "(" and s[-1] == ")":
-        return False
+    # numbers, x, names and function calls are atoms
+    return False
 
-    ops = "+-*/^"
-    i = 0
-    while i < len(s):
-        if s[i] in ops:
+def _is_wrt(n, wrt):
+    # Is node n the variable wrt? x is a var node, anything else a name.
+    t = n["t"]
+    if t == "var":
+        return wrt == "x"
+    return t == "name" and n["v"] == wrt
+
+def _depends_on(node, wrt="x"):
+    # explicit-stack search for the variable wrt
+    stack = [node]
+    while len(stack) > 0:
+        n = stack.pop()
+        t = n["t"]
+        if _is_wrt(n, wrt):
             return True
-        i += 1
+        if t == "bin":
+            stack.append(n["b"])
+            stack.append(n["a"])
+        elif t == "un" or t == "fun":
+            stack.append(n["a"])
     return False
 
-def _fmt_div(num_s, den_s):
-    # Prefer clean "1/(...)" over "(1)/(...)"
-    if num_s == "1":
-        # only parenthesize denominator if needed
-        if _needs_parens_for_div(den_s):
-            return "1/(" + den_s + ")"
-        return "1/" + den_s
-
-    # General case: parenthesize pieces only when needed
-    if _needs_parens_for_div(num_s):
-        num_s = "(" + num_s + ")"
-    if _needs_parens_for_div(den_s):
-        den_s = "(" + den_s + ")"
-    return num_s + "/" + den_s
+def _dep_map(root, wrt="x"):
+    # id(node) -> depends on wrt, for every node, in one bottom-up pass
+    dep = {}
+    order = _postorder(root)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        t = n["t"]
+        if _is_wrt(n, wrt):
+            dep[id(n)] = True
+        elif t == "bin":
+            dep[id(n)] = dep[id(n["a"])] or dep[id(n["b"])]
+        elif t == "un" or t == "fun":
+            dep[id(n)] = dep[id(n["a"])]
+        else:
+            dep[id(n)] = False
+        i += 1
+    return dep
 
-def _to_str(node):
-    t = node["t"]
-    if t == "num":
-        return node["v"]
-    if t == "var":
-        return "x"
-    if t == "name":
-        return node["v"]
-    if t == "un":
-        return "-" + _wrap(node["a"], "un")
-    if t == "fun":
-        return node["fn"] + "(" + _to_str(node["a"]) + ")"
-    if t == "bin":
-        op = node["op"]
+def _d(node, steps, wrt="x"):
+    """
+    Symbolic derivative of node with respect to wrt (x unless another
+    name is given; other names are held constant, as in a partial
+    derivative). Rule steps are appended to steps.
+    Runs on explicit stacks (no recursion): each node is expanded by
+    _d_rule into the subtrees it needs derivatives of plus a builder
+    that combines them, so steps come out in the usual rule order.
+    """
+    dep = _dep_map(node, wrt)
+    results = []
+    stack = [(node, None)]
 
-        # IMPORTANT: make division unambiguous
-        if op == "/":
-            num_s = _to_str(node["a"])
-            den_s = _to_str(node["b"])
-            return _fmt_div(num_s, den_s)
+    while len(stack) > 0:
+        item, build = stack.pop()
 
+        if build is None:
+            kids, build = _d_rule(item, dep, steps, wrt)
+            if len(kids) == 0:
+                results.append(build(kids))
+                continue
+            stack.append((len(kids), build))
+            i = len(kids) - 1
+            while i >= 0:
+                stack.append((kids[i], None))
+                i -= 1
+            continue
 
-        if op == "^":
-            return _wrap(node["a"], "pow") + "^" + _wrap(node["b"], "pow")
-        return _wrap(node["a"], op) + op + _wrap(node["b"], op)
-    return "?"
+        n = item
+        args = results[len(results) - n:]
+        del results[len(results) - n:]
+        results.append(build(args))
 
-def _wrap(child, ctx):
-    if child["t"] == "bin":
-        op = child["op"]
-        if ctx in ["*", "/", "^", "pow"] and (op == "+" or op == "-"):
-            return "(" + _to_str(child) + ")"
-        if ctx in ["^", "pow"] and op != "^":
-            return "(" + _to_str(child) + ")"
-    if child["t"] == "un" and ctx in ["^", "pow"]:
-        return "(" + _to_str(child) + ")"
-    return _to_str(child)
-
-def _depends_on_x(node):
-    t = node["t"]
-    if t == "var":
-        return True
-    if t == "num" or t == "name":
-        return False
-    if t == "un":
-        return _depends_on_x(node["a"])
-    if t == "fun":
-        return _depends_on_x(node["a"])
-    if t == "bin":
-        return _depends_on_x(node["a"]) or _depends_on_x(node["b"])
-    return True
+    return results[0]
 
-def _d(node, steps):
+def _d_rule(node, dep, steps, wrt="x"):
+    """
+    One differentiation rule for node.
+    Returns (kids, build): the subtrees whose derivatives are needed, in
+    order, and a function turning those derivatives into d(node).
+    """
     t = node["t"]
 
-    if t == "num":
-        return N_num("0")
-
-    if t == "name":
-        return N_num("0")
+    # anything not involving wrt is a constant (no rule needed)
+    if not dep[id(node)]:
+        return [], lambda r: N_num("0")
 
-    if t == "var":
-        return N_num("1")
+    if t == "var" or t == "name":
+        return [], lambda r: N_num("1")
 
     if t == "un":
-        return N_un("-", _d(node["a"], steps))
+        return [node["a"]], lambda r: N_un("-", r[0])
 
     if t == "bin":
         op = node["op"]
         a = node["a"]
         b = node["b"]
 
-        if op == "+":
-            return N_bin("+", _d(a, steps), _d(b, steps))
-        if op == "-":
-            return N_bin("-", _d(a, steps), _d(b, steps))
+        if op == "+" or op == "-":
+            return [a, b], lambda r: N_bin(op, r[0], r[1])
 
         if op == "*":
             # If one side is constant (doesn't depend on x), avoid product rule spam:
             # d(C*g(x)) = C*g'(x)
-            a_dep = _depends_on_x(a)
-            b_dep = _depends_on_x(b)
+            a_dep = dep[id(a)]
+            b_dep = dep[id(b)]
 
             if (not a_dep) and b_dep:
                 steps.append("Const: C*g'")
-                return N_bin("*", a, _d(b, steps))
+                return [b], lambda r: N_bin("*", a, r[0])
 
             if a_dep and (not b_dep):
                 steps.append("Const: C*g'")
-                return N_bin("*", _d(a, steps), b)
+                return [a], lambda r: N_bin("*", r[0], b)
 
             # otherwise, real product rule
             steps.append("Product: u'v + uv'")
-            return N_bin("+",
-                         N_bin("*", _d(a, steps), b),
-                         N_bin("*", a, _d(b, steps)))
-
+            return [a, b], lambda r: N_bin("+",
+                                           N_bin("*", r[0], b),
+                                           N_bin("*", a, r[1]))
 
         if op == "/":
+            # constant denominator: d(g/C) = g'/C
+            if not dep[id(b)]:
+                steps.append("Const: g'/C")
+                return [a], lambda r: N_bin("/", r[0], b)
+
             steps.append("Quotient: (u'v-uv')/v^2")
-            top = N_bin("-",
-                        N_bin("*", _d(a, steps), b),
-                        N_bin("*", a, _d(b, steps)))
-            bot = N_bin("^", b, N_num("2"))
-            return N_bin("/", top, bot)
+            return [a, b], lambda r: N_bin("/",
+                                           N_bin("-",
+                                                 N_bin("*", r[0], b),
+                                                 N_bin("*", a, r[1])),
+                                           N_bin("^", b, N_num("2")))
 
         if op == "^":
-            # (g(x))^n where n is numeric
-            if b["t"] == "num" and _depends_on_x(a):
-                n = b["v"]
-
-                # compute n-1 directly if it's an integer
-                if _is_int_str(n):
-                    n_minus_1 = _int_str_dec(n)
-                else:
-                    # fallback for decimals: keep symbolic (n-1)
-                    n_minus_1 = "(" + n + "-1)"
-
+            # (g(x))^n where n is a numeric constant (kept exact: 1/2, -3, 0.5)
+            n = _const_rational(b)
+            if n is not None and dep[id(a)]:
                 steps.append("Power+Chain: n*g^(n-1)*g'")
+                return [a], lambda r: N_bin("*",
+                                            N_bin("*", N_rat(n),
+                                                  N_bin("^", a, N_rat(_q_sub(n, Q_ONE)))),
+                                            r[0])
 
-                return N_bin("*",
-                             N_bin("*", N_num(n),
-                                   N_bin("^", a, N_num(n_minus_1))),
-                             _d(a, steps))
-
-            steps.append("NOTE: General a^g needs ln(a); not supported here.")
-            return N_num("0")
-
-
+            # f^c with a constant exponent that is not a plain number (x^pi)
+            if dep[id(a)] and not dep[id(b)]:
+                steps.append("Power+Chain: n*g^(n-1)*g'")
+                return [a], lambda r: N_bin("*",
+                                            N_bin("*", b,
+                                                  N_bin("^", a, N_bin("-", b, N_num("1")))),
+                                            r[0])
+
+            # e^g: the exponential is its own derivative
+            if a["t"] == "name" and a["v"] == "e":
+                steps.append("Chain: e^u -> e^u*u'")
+                return [b], lambda r: N_bin("*", node, r[0])
+
+            # a^g with a constant base
+            if not dep[id(a)]:
+                steps.append("Exponential: a^u -> a^u*ln(a)*u'")
+                return [b], lambda r: N_bin("*",
+                                            N_bin("*", node, N_fun("ln", a)),
+                                            r[0])
+
+            # f^g: logarithmic differentiation, y = f^g so ln(y) = g*ln(f)
+            steps.append("Log diff: f^g*(g'*ln(f) + g*f'/f)")
+            return [a, b], lambda r: N_bin("*", node,
+                                           N_bin("+",
+                                                 N_bin("*", r[1], N_fun("ln", a)),
+                                                 N_bin("/", N_bin("*", b, r[0]), a)))
 
     if t == "fun":
         fn = node["fn"]
         u = node["a"]
-        du = _d(u, steps)
+        entry = _FUNCS.get(fn)
+        if entry is None:
+            return [], lambda r: N_num("0")
 
-        if fn == "sin":
-            steps.append("Chain: sin -> cos*u'")
-            return N_bin("*", N_fun("cos", u), du)
+        def build(r):
+            steps.append(entry["step"])
+            return N_bin("*", entry["d"](u), r[0])
 
-        if fn == "cos":
-            steps.append("Chain: cos -> -sin*u'")
-            return N_bin("*", N_un("-", N_fun("sin", u)), du)
+        return [u], build
 
-        if fn == "tan":
-            steps.append("Chain: tan -> (1/cos^2)*u'")
-            sec2 = N_bin("/", N_num("1"), N_bin("^", N_fun("cos", u), N_num("2")))
-            return N_bin("*", sec2, du)
+    return [], lambda r: N_num("0")
 
-        if fn == "ln":
-            steps.append("Chain: ln -> (1/u)*u'")
-            return N_bin("*", N_bin("/", N_num("1"), u), du)
-
-        if fn == "sqrt":
-            steps.append("Chain: sqrt -> (1/(2*sqrt(u)))*u'")
-            denom = N_bin("*", N_num("2"), N_fun("sqrt", u))
-            return N_bin("*", N_bin("/", N_num("1"), denom), du)
-
-        if fn == "exp":
-            steps.append("Chain: exp -> exp(u)*u'")
-            return N_bin("*", N_fun("exp", u), du)
-
-    return N_num("0")
+def _replace_tok(s, old, new):
+    """
+    Like s.replace(old, new), but skips matches glued to a larger number,
+    name, power or quotient: "*1" leaves "*10" alone, "0*x" leaves
+    "10*x" alone and "(x)" leaves "sin(x)" alone.
+    """
+    ops = "+-*/^"
+    check_left = old[0] not in ops
+    check_right = old[-1] not in ops
+    parts = []
+    start = 0
+    n = len(s)
+    m = len(old)
+    i = s.find(old)
+    while i >= 0:
+        ok = True
+        if check_left and i > 0:
+            c = s[i - 1]
+            if _is_alnum_or_underscore(c) or c in ".^/":
+                ok = False
+        if check_right and i + m < n:
+            c = s[i + m]
+            if _is_alnum_or_underscore(c) or c in ".^(":
+                ok = False
+        if ok:
+            parts.append(s[start:i])
+            parts.append(new)
+            start = i + m
+            i = s.find(old, start)
+        else:
+            i = s.find(old, i + 1)
+    if start == 0:
+        return s
+    parts.append(s[start:])
+    return "".join(parts)
 
 def _simplify_str(s):
     # TI-safe cleanup loop. Repeat until nothing changes.
+    # Structural cleanup happens in _simplify_ast; this is the cosmetic pass.
     if s is None:
         return s
 
     def _strip_standalone_zero_terms(t):
         # Remove +0 or -0 only when it is a whole term, NOT part of decimals like -0.5 / 0.25
-        # Handles: ...+0..., ...-0... when the next char is end, ')', or an operator.
+        # Handles: ...+0..., ...-0... when the next char is end, ')', or + / -.
 
         # +0 cases
         t = t.replace("+0)", ")")
         t = t.replace("+0+", "+")
         t = t.replace("+0-", "-")
-        t = t.replace("+0*", "*")
-        t = t.replace("+0/", "/")
-        t = t.replace("+0^", "^")
         if len(t) >= 2 and t[-2:] == "+0":
             t = t[:-2]
 
@@ -1121,9 +1723,6 @@ def _simplify_str(s):
         t = t.replace("-0)", ")")
         t = t.replace("-0+", "+")
         t = t.replace("-0-", "-")
-        t = t.replace("-0*", "*")
-        t = t.replace("-0/", "/")
-        t = t.replace("-0^", "^")
         if len(t) >= 2 and t[-2:] == "-0":
             t = t[:-2]
 
@@ -1143,173 +1742,4131 @@ def _simplify_str(s):
     while prev != s:
         prev = s
 
-        s = s.replace(" ", "")
+        s = s.replace(" ", "")
+
+        # kill (1) factors
+        s = _replace_tok(s, "*(1)", "")
+        s = _replace_tok(s, "(1)*", "")
+        s = _replace_tok(s, "*1", "")
+        s = _replace_tok(s, "1*", "")
+
+        # remove standalone +0 and -0 terms safely
+        s = _strip_standalone_zero_terms(s)
+
+        # collapse 0*something and something*0 (only the safe/common forms you emit)
+        s = _replace_tok(s, "0*x", "0")
+        s = _replace_tok(s, "x*0", "0")
+        s = _replace_tok(s, "0*pi", "0")
+        s = _replace_tok(s, "pi*0", "0")
+        s = _replace_tok(s, "0*e", "0")
+        s = _replace_tok(s, "e*0", "0")
+
+        # parenthesized versions your generator emits
+        s = _replace_tok(s, "(0)*x", "0")
+        s = _replace_tok(s, "x*(0)", "0")
+        s = _replace_tok(s, "(0)*pi", "0")
+        s = _replace_tok(s, "pi*(0)", "0")
+
+        # clean double signs
+        s = s.replace("+-", "-")
+        s = s.replace("--", "+")
+
+        # cosmetic: (x) -> x
+        s = _replace_tok(s, "(x)", "x")
+
+        # SAFE exponent cosmetics (never do a global "^1" replace)
+        s = _replace_tok(s, "x^1", "x")
+        s = _replace_tok(s, "(x)^1", "x")
+        s = _replace_tok(s, "x^0", "1")
+
+    return s
+
+def _const_rational(node):
+    # Exact value of a constant built from numbers with + - * / ^, else None
+    vals = {}
+    order = _postorder(node)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        t = n["t"]
+        r = None
+        if t == "num":
+            r = n["q"]
+        elif t == "un":
+            a = vals[id(n["a"])]
+            if a is not None:
+                r = _q_neg(a)
+        elif t == "bin":
+            a = vals[id(n["a"])]
+            b = vals[id(n["b"])]
+            if a is not None and b is not None:
+                r = _q_binop(n["op"], a, b)
+        vals[id(n)] = r
+        i += 1
+    return vals[id(node)]
+
+def _neg_node(n):
+    # -n with the sign pushed into numbers and double negatives removed
+    if n["t"] == "num":
+        return N_rat(_q_neg(n["q"]))
+    if n["t"] == "un":
+        return n["a"]
+    return N_un("-", n)
+
+def _split_product(node, factors):
+    # Flattens a * chain: appends non-numeric factors, returns the exact coefficient
+    coef = Q_ONE
+    stack = [node]
+    while len(stack) > 0:
+        n = stack.pop()
+        t = n["t"]
+        if t == "num":
+            coef = _q_mul(coef, n["q"])
+        elif t == "un":
+            coef = _q_neg(coef)
+            stack.append(n["a"])
+        elif t == "bin" and n["op"] == "*":
+            stack.append(n["b"])
+            stack.append(n["a"])
+        else:
+            factors.append(n)
+    return coef
+
+def _build_product(coef, factors):
+    """
+    coef * f1 * f2 * ... as a tree. Factors shaped 1/v move under one
+    fraction bar, 1 is implicit and a negative coef becomes a leading minus.
+    """
+    if coef[0] == 0:
+        return N_rat(Q_ZERO)
+    if coef[0] < 0:
+        return N_un("-", _build_product(_q_neg(coef), factors))
+
+    top = []
+    bottom = []
+    i = 0
+    while i < len(factors):
+        f = factors[i]
+        if f["t"] == "bin" and f["op"] == "/" and f["a"]["t"] == "num" and f["a"]["q"] == Q_ONE:
+            bottom.append(f["b"])
+        else:
+            top.append(f)
+        i += 1
+
+    if coef != Q_ONE or len(top) == 0:
+        top.insert(0, N_rat(coef))
+    node = top[0]
+    i = 1
+    while i < len(top):
+        node = N_bin("*", node, top[i])
+        i += 1
+
+    if len(bottom) == 0:
+        return node
+    den = bottom[0]
+    i = 1
+    while i < len(bottom):
+        den = N_bin("*", den, bottom[i])
+        i += 1
+    return N_bin("/", node, den)
+
+def _simplify_ast(node):
+    """
+    Exact structural cleanup of a derivative tree:
+    folds numeric subtrees to rationals, collects the numeric
+    coefficient of each product, and drops +0, *1, ^1 and 0*u pieces.
+    """
+    done = {}
+    order = _postorder(node)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        t = n["t"]
+        if t == "un":
+            r = _neg_node(done[id(n["a"])])
+        elif t == "fun":
+            r = N_fun(n["fn"], done[id(n["a"])])
+        elif t == "bin":
+            r = _simplify_bin(n["op"], done[id(n["a"])], done[id(n["b"])])
+        else:
+            r = n
+        done[id(n)] = r
+        i += 1
+    return done[id(node)]
+
+def _simplify_bin(op, a, b):
+    # One _simplify_ast step for a op b, with a and b already simplified
+    a_num = a["t"] == "num"
+    b_num = b["t"] == "num"
+
+    if a_num and b_num:
+        r = _q_binop(op, a["q"], b["q"])
+        if _q_fits(r):
+            return N_rat(r)
+
+    if op == "+" or op == "-":
+        if b_num and b["q"][0] == 0:
+            return a
+        if a_num and a["q"][0] == 0:
+            if op == "+":
+                return b
+            return _neg_node(b)
+        # a + (-b) -> a - b and a - (-b) -> a + b
+        if (b_num and b["q"][0] < 0) or b["t"] == "un":
+            if op == "+":
+                return N_bin("-", a, _neg_node(b))
+            return N_bin("+", a, _neg_node(b))
+        return N_bin(op, a, b)
+
+    if op == "*":
+        factors = []
+        coef = _q_mul(_split_product(a, factors), _split_product(b, factors))
+        if not _q_fits(coef):
+            return N_bin(op, a, b)
+        return _build_product(coef, factors)
+
+    if op == "/":
+        if b_num and b["q"] == Q_ONE:
+            return a
+        if a_num and a["q"][0] == 0:
+            return a
+        # u/u -> 1 (x/x from logarithmic differentiation of x^x)
+        if _same_node(a, b):
+            return N_rat(Q_ONE)
+        # (-c)/v -> -(c/v) and (-u)/v -> -(u/v)
+        if a_num and a["q"][0] < 0:
+            return N_un("-", N_bin("/", N_rat(_q_neg(a["q"])), b))
+        if a["t"] == "un":
+            return N_un("-", _simplify_bin("/", a["a"], b))
+        # (c*u)/k -> (c/k)*u
+        if b_num and b["q"][0] != 0:
+            factors = []
+            coef = _split_product(a, factors)
+            if coef != Q_ONE and _q_fits(_q_div(coef, b["q"])):
+                return _build_product(_q_div(coef, b["q"]), factors)
+        # (6*u)/(4*v) -> (3*u)/(2*v)
+        if b["t"] == "bin" and b["op"] == "*":
+            fa = []
+            fb = []
+            ca = _split_product(a, fa)
+            cb = _split_product(b, fb)
+            if ca != Q_ONE and cb != Q_ONE and cb[0] != 0:
+                r = _q_div(ca, cb)
+                if r != ca:
+                    num = _build_product((r[0], 1), fa)
+                    den = _build_product((r[1], 1), fb)
+                    if den["t"] == "num":
+                        return num
+                    return N_bin("/", num, den)
+        return N_bin("/", a, b)
+
+    if op == "^":
+        if b_num and b["q"] == Q_ONE:
+            return a
+        if b_num and b["q"][0] == 0:
+            return N_rat(Q_ONE)
+        return N_bin("^", a, b)
+
+    return N_bin(op, a, b)
+
+def _same_node(a, b):
+    # Structural equality of two trees (explicit stack)
+    stack = [(a, b)]
+    while len(stack) > 0:
+        p, q = stack.pop()
+        if p is q:
+            continue
+        t = p["t"]
+        if t != q["t"]:
+            return False
+        if t == "num":
+            if p["q"] != q["q"]:
+                return False
+        elif t == "name":
+            if p["v"] != q["v"]:
+                return False
+        elif t == "un":
+            stack.append((p["a"], q["a"]))
+        elif t == "fun":
+            if p["fn"] != q["fn"]:
+                return False
+            stack.append((p["a"], q["a"]))
+        elif t == "bin":
+            if p["op"] != q["op"]:
+                return False
+            stack.append((p["b"], q["b"]))
+            stack.append((p["a"], q["a"]))
+    return True
+
+def _extract_chain_layers(node):
+    """
+    Returns list of layers from OUTER to INNER.
+    Each layer is a tuple ("fun", fn), ("pow", n_str) or ("base", a_str)
+    for a constant raised to the inner expression (2^u, e^u).
+    Only extracts when it's a clean single chain (composition).
+    If expression is a sum/product at the top, returns [].
+    """
+    layers = []
+    cur = node
+
+    while True:
+        if cur is None:
+            return []
+
+        t = cur.get("t")
+
+        # Function layer: sin(u), ln(u), sqrt(u), exp(u), etc.
+        if t == "fun":
+            layers.append(("fun", cur.get("fn")))
+            cur = cur.get("a")
+            continue
+
+        # Power layer: (g)^n with numeric exponent
+        if t == "bin" and cur.get("op") == "^":
+            a = cur.get("a")
+            b = cur.get("b")
+            n = None
+            if b is not None:
+                n = _const_rational(b)
+            if n is not None:
+                layers.append(("pow", _q_str(n)))
+                cur = a
+                continue
+            if not _depends_on(b):
+                # symbolic constant exponent (x^pi)
+                layers.append(("pow", _to_str(b)))
+                cur = a
+                continue
+            if not _depends_on(a):
+                layers.append(("base", _to_str(a)))
+                cur = b
+                continue
+            # f^g is not a single chain
+            return []
+
+        # Stop when no longer a clean single outer wrapper
+        break
+
+    return layers
+
+def _format_layer_apply(layer, inner_str):
+    kind = layer[0]
+    if kind == "fun":
+        fn = layer[1]
+        return fn + "(" + inner_str + ")"
+    if kind == "pow":
+        n = layer[1]
+        return "(" + inner_str + ")^" + _paren_if_compound(n)
+    if kind == "base":
+        return _paren_if_compound(layer[1]) + "^(" + inner_str + ")"
+    return inner_str
+
+def _paren_if_compound(s):
+    # "1/2" -> "(1/2)", "-3" -> "(-3)", "pi-1" -> "(pi-1)", "4" -> "4"
+    i = 1 if s[0] == "-" else 0
+    if i == 1:
+        return "(" + s + ")"
+    while i < len(s):
+        if s[i] in "+-*/^":
+            return "(" + s + ")"
+        i += 1
+    return s
+
+def _exponent_minus_one(n):
+    # "3" -> "2", "1/2" -> "-1/2", "pi" -> "pi-1"
+    q = _q_from_str(n)
+    if q is None:
+        return n + "-1"
+    return _q_str(_q_sub(q, Q_ONE))
+
+def _mul_str(a, b):
+    # "a*b" with a factor 1 left out
+    if a == "1":
+        return b
+    if b == "1":
+        return a
+    return a + "*" + b
+
+def _is_var_power(n):
+    # f^g with x in both the base and the exponent
+    return n["t"] == "bin" and n["op"] == "^" and _depends_on(n["a"]) and _depends_on(n["b"])
+
+def _any_node(ast, test):
+    order = _postorder(ast)
+    i = 0
+    while i < len(order):
+        if test(order[i]):
+            return True
+        i += 1
+    return False
+
+def _exam_log_diff_work(ws, ast):
+    # y = f^g with x in the base and the exponent: ln(y) = g*ln(f)
+    fs = _to_str(ast["a"])
+    gs = _to_str(ast["b"])
+    df = _simplify_str(_to_str(_simplify_ast(_d(ast["a"], []))))
+    dg = _simplify_str(_to_str(_simplify_ast(_d(ast["b"], []))))
+    pf = _paren_if_compound(fs)
+    pg = _paren_if_compound(gs)
+    rhs = (_mul_str(_paren_if_compound(dg), "ln(" + fs + ")") + " + "
+           + _mul_str(pg, _paren_if_compound(df)) + "/" + pf)
+
+    _ws_line(ws, "\n--- SHOW WORK (LOGARITHMIC DIFFERENTIATION) ---")
+    _ws_line(ws, "x is in the base AND the exponent, so take ln of both sides.")
+    _ws_line(ws, "y = " + pf + "^" + pg)
+    _ws_line(ws, "ln(y) = " + _mul_str(pg, "ln(" + fs + ")"))
+    _ws_pause(ws)
+    _ws_line(ws, "Differentiate (product rule on the right):")
+    _ws_line(ws, "y'/y = " + rhs)
+    _ws_pause(ws)
+    _ws_line(ws, "Multiply by y:")
+    _ws_line(ws, "y' = " + pf + "^" + pg + "*(" + rhs + ")")
+
+def _exam_chain_work(ws, ast):
+    layers = _extract_chain_layers(ast)
+
+    if len(layers) == 0:
+        if _is_var_power(ast):
+            _exam_log_diff_work(ws, ast)
+            return
+        top_op = ast["t"] == "bin" and ast["op"] in "+-*/"
+        if not top_op and _any_node(ast, _is_var_power):
+            _ws_line(ws, "This one is not a single clean chain (has f^g inside:")
+            _ws_line(ws, "x in a base AND its exponent). Use logarithmic differentiation there.")
+        else:
+            _ws_line(ws, "This one is not a single clean chain (has +, -, *, / at top).")
+            _ws_line(ws, "Use product/quotient rules plus chain rule where needed.")
+        return
+
+    # Build u_k (deepest) first
+    # inner-most expression:
+    # Walk down to get deepest node by re-traversing layers
+    cur = ast
+    i = 0
+    while i < len(layers):
+        if cur.get("t") == "fun":
+            cur = cur.get("a")
+        elif layers[i][0] == "base":
+            cur = cur.get("b")
+        elif cur.get("t") == "bin" and cur.get("op") == "^":
+            cur = cur.get("a")
+        i += 1
+        _ws_pause(ws)
+
+    deepest_str = _to_str(cur)
+
+    # Print variable chain
+    _ws_line(ws, "\n--- SHOW WORK (CHAIN OF VARIABLES) ---")
+    k = len(layers)
+    _ws_line(ws, "Let u" + str(k) + " = " + deepest_str)
+    _ws_pause(ws)
+
+    # Now build outward
+    # u_{k-1} = layer_{k-1}(u_k), ..., u0 = layer_0(u1)
+    idx = k - 1
+    while idx >= 0:
+        u_in = "u" + str(idx + 1)
+        u_out = "u" + str(idx)
+        expr_out = _format_layer_apply(layers[idx], u_in)
+        _ws_line(ws, "Let " + u_out + " = " + expr_out)
+        idx -= 1
+        _ws_pause(ws)
+
+    _ws_line(ws, "Then y = u0")
+
+    # Leibniz derivatives
+    _ws_line(ws, "\n--- LEIBNIZ FACTORS ---")
+    idx = 0
+    while idx < k:
+        layer = layers[idx]
+        if layer[0] == "fun":
+            entry = _FUNCS.get(layer[1])
+            if entry is not None:
+                rhs = entry["leibniz"].replace("U", "u" + str(idx + 1))
+            else:
+                rhs = "(unsupported)"
+            _ws_line(ws, "du" + str(idx) + "/du" + str(idx + 1) + " = " + rhs)
+        elif layer[0] == "pow":
+            n = layer[1]
+            nm1 = _exponent_minus_one(n)
+            _ws_line(ws, "du" + str(idx) + "/du" + str(idx + 1) + " = " + _paren_if_compound(n) + "*(u" + str(idx + 1) + "^" + _paren_if_compound(nm1) + ")")
+        elif layer[0] == "base":
+            a = layer[1]
+            if a == "e":
+                _ws_line(ws, "du" + str(idx) + "/du" + str(idx + 1) + " = e^u" + str(idx + 1))
+            else:
+                _ws_line(ws, "du" + str(idx) + "/du" + str(idx + 1) + " = " + _paren_if_compound(a) + "^u" + str(idx + 1) + "*ln(" + a + ")")
+
+        _ws_pause(ws)
+        idx += 1
+
+    # Last derivative du_k/dx
+    _ws_line(ws, "du" + str(k) + "/dx = d/dx(" + deepest_str + ")")
+    _ws_line(ws, "du" + str(k) + "/dx = " + _simplify_str(_to_str(_simplify_ast(_d(cur, [])))))
+
+    _ws_line(ws, "\nMultiply:")
+    _ws_line(ws, "dy/dx = (du0/du1)(du1/du2)...(duk/dx)\n")
+
+
+# ================================
+# Compiled Evaluators
+# ================================
+
+_CONST_VALUES = {"pi": math.pi, "e": math.e}
+
+
+def _has_sci_notation(s):
+    # True for literals like 1e-5 or 2e3 that eval_expr reads as scientific notation
+    n = len(s)
+    i = 1
+    while i < n - 1:
+        if s[i] == "e" and _is_digit2(s[i - 1]):
+            c = s[i + 1]
+            if c == "+" or c == "-" or _is_digit2(c):
+                return True
+        i += 1
+    return False
+
+def _parse_expr(expr):
+    # expression string -> AST, or None if it does not tokenize/parse
+    return _expr_entry(expr)["ast"]
+
+def expr_parses(expr):
+    """
+    True when the expression tokenizes and parses with the calculator
+    grammar, so eval_expr never needs its string fallback for it.
+    Scientific notation is refused: the parser and the string evaluator
+    read 1e-5 differently.
+    """
+    if _has_sci_notation(expr):
+        return False
+    return _entry_ast(_expr_entry(expr)) is not None
+
+def _eval_node(node, x):
+    # Direct tree-walking evaluation (bottom-up, no recursion)
+    vals = {}
+    order = _postorder(node)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        vals[id(n)] = _eval_step(n, vals, x)
+        i += 1
+    return vals[id(node)]
+
+def _eval_step(n, vals, x):
+    # Value of one node from its children's values (raises if undefined)
+    t = n["t"]
+    if t == "num":
+        return _q_float(n["q"])
+    if t == "var":
+        return x
+    if t == "name":
+        return _CONST_VALUES[n["v"]]
+    if t == "un":
+        return -vals[id(n["a"])]
+    if t == "fun":
+        v = vals[id(n["a"])]
+        if not _in_domain(n["fn"], v):
+            raise ValueError("outside domain of " + n["fn"])
+        return _FUNCS[n["fn"]]["f"](v)
+    if t == "bin":
+        op = n["op"]
+        a = vals[id(n["a"])]
+        b = vals[id(n["b"])]
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            return a / b
+        if op == "^":
+            return a ** b
+    raise ValueError("bad node")
+
+def _const_step(n, vals):
+    # Like _eval_step for x-independent nodes, but None instead of raising
+    t = n["t"]
+    try:
+        if t == "un" or t == "fun":
+            if vals[id(n["a"])] is None:
+                return None
+        elif t == "bin":
+            if vals[id(n["a"])] is None or vals[id(n["b"])] is None:
+                return None
+        return _eval_step(n, vals, 0.0)
+    except Exception:
+        # e.g. ln(0) or an unknown name
+        return None
+
+# Deeper generated expressions are split into locals (Python's own
+# parser has a nesting limit)
+_SRC_MAX_DEPTH = 40
+
+def _cse_scan(node, st):
+    """
+    Gives every distinct subtree a number (structural hash-consing) and
+    counts how often each one is used. Maximal x-independent subtrees
+    become single folded float constants. Numbers are assigned bottom-up,
+    so children always get smaller numbers than their parents.
+    Names listed in st["params"] are arguments, like x.
+    Returns the root's number, or None if node uses a name the
+    evaluator does not know.
+    """
+    params = st["params"]
+    keys = {}
+    dep = {}
+    vals = {}
+    order = _postorder(node)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        nid = id(n)
+        t = n["t"]
+        i += 1
+
+        if t == "var" or (t == "name" and n["v"] in params):
+            d = True
+        elif t == "bin":
+            d = dep[id(n["a"])] or dep[id(n["b"])]
+        elif t == "un" or t == "fun":
+            d = dep[id(n["a"])]
+        else:
+            d = False
+        dep[nid] = d
+
+        key = None
+        if not d:
+            v = _const_step(n, vals)
+            vals[nid] = v
+            if isinstance(v, float):
+                key = ("c", "(" + repr(v) + ")")
+
+        if key is not None:
+            pass
+        elif t == "var":
+            key = ("c", "x")
+        elif t == "num":
+            key = ("c", "(" + n["v"] + ")")
+        elif t == "name":
+            if n["v"] in params:
+                key = ("c", "p_" + n["v"])
+            elif n["v"] in _CONST_VALUES:
+                key = ("c", "math." + n["v"])
+        elif t == "un":
+            ka = keys[id(n["a"])]
+            if ka is not None:
+                key = ("un", ka)
+        elif t == "fun":
+            ka = keys[id(n["a"])]
+            if ka is not None:
+                key = ("fun", n["fn"], ka)
+        elif t == "bin":
+            ka = keys[id(n["a"])]
+            kb = keys[id(n["b"])]
+            if ka is not None and kb is not None:
+                key = ("bin", n["op"], ka, kb)
+
+        if key is None:
+            keys[nid] = None
+            continue
+
+        k = st["ids"].get(key)
+        if k is None:
+            k = len(st["shape"])
+            st["ids"][key] = k
+            st["shape"].append(key)
+            st["count"].append(0)
+        keys[nid] = k
+
+        # count uses: one per reference from a parent
+        shape = st["shape"][k]
+        if shape[0] == "un" or shape[0] == "fun":
+            st["count"][shape[-1]] += 1
+        elif shape[0] == "bin":
+            st["count"][shape[2]] += 1
+            st["count"][shape[3]] += 1
+
+    root = keys[id(node)]
+    if root is not None:
+        st["count"][root] += 1
+    return root
+
+def _cse_emit(root, st):
+    """
+    Source for subtree root. Shared subtrees, and expressions nested
+    deeper than _SRC_MAX_DEPTH, are bound once to locals tN in st["lines"].
+    """
+    shape = st["shape"]
+    count = st["count"]
+
+    # which numbers the root actually uses (children have smaller numbers)
+    needed = [False] * (root + 1)
+    needed[root] = True
+    k = root
+    while k >= 0:
+        if needed[k]:
+            sh = shape[k]
+            if sh[0] == "un" or sh[0] == "fun":
+                needed[sh[-1]] = True
+            elif sh[0] == "bin":
+                needed[sh[2]] = True
+                needed[sh[3]] = True
+        k -= 1
+
+    src = {}
+    depth = {}
+    k = 0
+    while k <= root:
+        if not needed[k]:
+            k += 1
+            continue
+        sh = shape[k]
+        kind = sh[0]
+        if kind == "c":
+            src[k] = sh[1]
+            depth[k] = 0
+            k += 1
+            continue
+
+        if kind == "un":
+            s = "(-" + src[sh[1]] + ")"
+            dp = depth[sh[1]] + 1
+        elif kind == "fun":
+            s = sh[1] + "(" + src[sh[2]] + ")"
+            dp = depth[sh[2]] + 1
+        else:
+            op = sh[1]
+            if op == "^":
+                op = "**"
+            s = "(" + src[sh[2]] + op + src[sh[3]] + ")"
+            dp = max(depth[sh[2]], depth[sh[3]]) + 1
+
+        if count[k] >= 2 or dp > _SRC_MAX_DEPTH:
+            name = "t" + str(len(st["lines"]))
+            st["lines"].append(name + " = " + s)
+            s = name
+            dp = 0
+
+        src[k] = s
+        depth[k] = dp
+        k += 1
+
+    return src[root]
+
+def _py_func_src(node, params=None):
+    """
+    Source for "def _f(x): ..." computing node, with constant folding and
+    common-subexpression elimination. Each name in params becomes one
+    more argument after x. Returns None for unknown names.
+    """
+    if params is None:
+        params = []
+    st = {"ids": {}, "shape": [], "count": [], "lines": [], "params": params}
+    root = _cse_scan(node, st)
+    if root is None:
+        return None
+
+    ret = _cse_emit(root, st)
+    args = "x"
+    i = 0
+    while i < len(params):
+        args += ", p_" + params[i]
+        i += 1
+    out = "def _f(" + args + "):\n"
+    i = 0
+    while i < len(st["lines"]):
+        out += "    " + st["lines"][i] + "\n"
+        i += 1
+    out += "    return " + ret + "\n"
+    return out
+
+def _evaluator_src(node, params=None):
+    # Source defining _f for node (Horner for polynomials), or None
+    if not params:
+        poly = _poly_from_ast(node)
+        if poly is not None and _poly_use_horner(poly):
+            return _poly_src(poly)
+    return _py_func_src(node, params)
+
+_EXEC_ENV = {}
+
+def _exec_src(src):
+    # Runs evaluator source (or its compiled code) and returns _f.
+    # All evaluators share one globals dict; _f is rebound each time.
+    if len(_EXEC_ENV) == 0:
+        _EXEC_ENV.update(_func_env())
+        _EXEC_ENV["_poly_eval"] = _poly_eval
+        _EXEC_ENV["_poly_fin"] = _poly_fin
+    exec(src, _EXEC_ENV)
+    return _EXEC_ENV["_f"]
+
+def _compile_ast(node, params=None):
+    # AST -> function f(x) (or f(x, p1, p2, ...)), or None if it cannot be compiled
+    src = _evaluator_src(node, params)
+    if src is None:
+        return None
+    return _exec_src(src)
+
+def _compiled_evaluator(expr):
+    """
+    Cached compiled evaluator for an expression string.
+    Returns None when the expression must use the string evaluator.
+    """
+    return _entry_evaluator(_expr_entry(expr))
+
+def _compiled_derivative(expr):
+    """
+    Cached evaluator for f'(x), built from the exact derivative:
+    coefficient differentiation for polynomials, _d otherwise.
+    Returns None when f' is not available symbolically.
+    """
+    return _entry_deriv_evaluator(_expr_entry(expr))
+
+def _steps_have_note(steps):
+    # _d reports unsupported pieces as "NOTE: ..." steps
+    i = 0
+    while i < len(steps):
+        if steps[i][0:5] == "NOTE:":
+            return True
+        i += 1
+    return False
+
+
+# ================================
+# Expression Registry
+# ================================
+
+# One bounded store for every form of an expression string, shared by
+# all tools: normalized text, tokens, AST, polynomial coefficients,
+# compiled evaluators, symbolic derivative and rule classification.
+# Forms other than the AST are filled in lazily, the first time a tool
+# asks for them. Least-recently-used entries are evicted when full.
+
+_REGISTRY = {}
+_REGISTRY_MAX = 256
+_REGISTRY_STATS = {"hits": 0, "misses": 0, "evictions": 0, "tick": 0}
+
+def _registry_evict():
+    # Drop the least recently used half (sorting once keeps eviction cheap)
+    entries = list(_REGISTRY.values())
+    entries.sort(key=lambda e: e["tick"])
+    drop = len(entries) // 2
+    if drop < 1:
+        drop = 1
+    i = 0
+    while i < drop:
+        del _REGISTRY[entries[i]["expr"]]
+        i += 1
+    _REGISTRY_STATS["evictions"] += drop
+
+def _expr_entry(expr):
+    """
+    Registry entry for an expression string (created on first use).
+    Keys: expr, normalized, tokens, ast (None if it does not parse).
+    """
+    st = _REGISTRY_STATS
+    st["tick"] += 1
+
+    e = _REGISTRY.get(expr)
+    if e is not None:
+        st["hits"] += 1
+        e["tick"] = st["tick"]
+        return e
+
+    st["misses"] += 1
+    if len(_REGISTRY) >= _REGISTRY_MAX:
+        _registry_evict()
+
+    s = _normalize_expr_for_symbolic(expr)
+    toks = _tokenize(s)
+    ast = None
+    if toks is not None:
+        ast = _Parser(toks).parse()
+
+    e = {"expr": expr, "normalized": s, "tokens": toks, "ast": ast, "tick": st["tick"]}
+    _REGISTRY[expr] = e
+    return e
+
+def registry_stats():
+    # Hit/miss counters plus the current size
+    out = {
+        "hits": _REGISTRY_STATS["hits"],
+        "misses": _REGISTRY_STATS["misses"],
+        "evictions": _REGISTRY_STATS["evictions"],
+        "size": len(_REGISTRY),
+        "max": _REGISTRY_MAX
+    }
+    return out
+
+def registry_clear():
+    _REGISTRY.clear()
+
+def _node_to_tuple(root):
+    """
+    Flat, index-linked form of an AST for storage: a tuple of node tuples
+    in post-order, root last. Children are positions in the tuple, so
+    shared subtrees stay shared and depth never matters.
+      ("n", text, p, q)  ("x",)  ("c", name)  ("u", op, a)
+      ("b", op, a, b)    ("f", fn, a)
+    """
+    order = _postorder(root)
+    pos = {}
+    out = []
+    i = 0
+    while i < len(order):
+        n = order[i]
+        t = n["t"]
+        if t == "num":
+            out.append(("n", n["v"], n["q"][0], n["q"][1]))
+        elif t == "var":
+            out.append(("x",))
+        elif t == "name":
+            out.append(("c", n["v"]))
+        elif t == "un":
+            out.append(("u", n["op"], pos[id(n["a"])]))
+        elif t == "bin":
+            out.append(("b", n["op"], pos[id(n["a"])], pos[id(n["b"])]))
+        else:
+            out.append(("f", n["fn"], pos[id(n["a"])]))
+        pos[id(n)] = i
+        i += 1
+    return tuple(out)
+
+def _tuple_to_node(tup):
+    # Inverse of _node_to_tuple (node dicts built inline: this runs at load time)
+    nodes = []
+    add = nodes.append
+    for k in tup:
+        c = k[0]
+        if c == "b":
+            add({"t": "bin", "op": k[1], "a": nodes[k[2]], "b": nodes[k[3]]})
+        elif c == "n":
+            add({"t": "num", "v": k[1], "q": (k[2], k[3])})
+        elif c == "x":
+            add({"t": "var"})
+        elif c == "c":
+            add({"t": "name", "v": k[1]})
+        elif c == "f":
+            add({"t": "fun", "fn": k[1], "a": nodes[k[2]]})
+        else:
+            add({"t": "un", "op": k[1], "a": nodes[k[2]]})
+    return nodes[-1]
+
+def _opt_tuple(node):
+    if node is None:
+        return None
+    return _node_to_tuple(node)
+
+def _opt_node(tup):
+    if tup is None:
+        return None
+    return _tuple_to_node(tup)
+
+def registry_export():
+    """
+    The registry as plain data (strings, numbers, tuples, lists, dicts)
+    for saving, least recently used first. Compiled evaluators are given
+    as their source; the host server stores them as code objects.
+    """
+    entries = list(_REGISTRY.values())
+    entries.sort(key=lambda e: e["tick"])
+    out = []
+    for e in entries:
+        item = {
+            "expr": e["expr"],
+            "normalized": e["normalized"],
+            "tokens": e["tokens"],
+            "ast": e["ast_t"] if "ast_t" in e else _opt_tuple(e["ast"])
+        }
+        for key in ("poly", "params", "canon", "classify"):
+            if key in e:
+                item[key] = e[key]
+        # derivatives: decoded ones plus any still packed from a load
+        derivs = dict(e.get("packed", {}))
+        if "deriv" in e:
+            derivs["x"] = (_opt_tuple(e["deriv"][0]), e["deriv"][1])
+        for (w, d) in e.get("partials", {}).items():
+            derivs[w] = (_opt_tuple(d[0]), d[1])
+        if "x" in derivs:
+            item["deriv"] = derivs.pop("x")
+        if len(derivs) > 0:
+            item["partials"] = [(w, d[0], d[1]) for (w, d) in derivs.items()]
+        if "eval" in e:
+            item["eval"] = e["eval_src"]
+        if "deriv_eval" in e:
+            item["deriv_eval"] = e["deriv_src"]
+        if "param_src" in e:
+            item["param_eval"] = [(k[0], k[1], s) for (k, s) in e["param_src"].items()]
+        out.append(item)
+    return out
+
+def registry_import(items):
+    """
+    Loads entries produced by registry_export (later items are treated as
+    more recent). Evaluators may be source text or compiled code.
+    Returns the number of entries loaded.
+    """
+    st = _REGISTRY_STATS
+    if len(items) > _REGISTRY_MAX:
+        items = items[len(items) - _REGISTRY_MAX:]
+    count = 0
+    for item in items:
+        st["tick"] += 1
+        e = {
+            "expr": item["expr"],
+            "normalized": item["normalized"],
+            "tokens": item["tokens"],
+            "ast_t": item["ast"],
+            "tick": st["tick"]
+        }
+        for key in ("poly", "params", "canon", "classify"):
+            if key in item:
+                e[key] = item[key]
+        # derivative trees stay packed until _entry_derivative needs them
+        packed = {}
+        if "deriv" in item:
+            packed["x"] = item["deriv"]
+        if "partials" in item:
+            for (w, d, steps) in item["partials"]:
+                packed[w] = (d, steps)
+        if len(packed) > 0:
+            e["packed"] = packed
+        for key, src_key in (("eval", "eval_src"), ("deriv_eval", "deriv_src")):
+            if key in item:
+                code = item[key]
+                e[key] = None if code is None else _exec_src(code)
+                e[src_key] = code
+        if "param_eval" in item:
+            e["param_eval"] = {}
+            e["param_src"] = {}
+            for (wrt, params, code) in item["param_eval"]:
+                key = (wrt, tuple(params))
+                e["param_eval"][key] = None if code is None else _exec_src(code)
+                e["param_src"][key] = code
+
+        if item["expr"] not in _REGISTRY and len(_REGISTRY) >= _REGISTRY_MAX:
+            _registry_evict()
+        _REGISTRY[item["expr"]] = e
+        count += 1
+    return count
+
+def registry_resize(max_entries):
+    # Hosts can afford far more than the calculator default
+    global _REGISTRY_MAX
+    _REGISTRY_MAX = max_entries
+    while len(_REGISTRY) > _REGISTRY_MAX:
+        _registry_evict()
+
+def _entry_ast(e):
+    # the entry's AST (entries loaded from a snapshot decode it on first use)
+    if "ast_t" in e:
+        e["ast"] = _opt_node(e.pop("ast_t"))
+    return e["ast"]
+
+def _entry_numeric_ast(e):
+    # AST for numeric use; None when eval_expr must read the string itself
+    # (scientific notation like 1e-5 means something else there)
+    if _has_sci_notation(e["expr"]):
+        return None
+    return _entry_ast(e)
+
+def _entry_poly(e):
+    if "poly" not in e:
+        p = None
+        if _entry_ast(e) is not None:
+            p = _poly_from_ast(_entry_ast(e))
+        e["poly"] = p
+    return e["poly"]
+
+def _entry_evaluator(e):
+    # compiled f(x); the source is kept in "eval_src" for snapshots
+    if "eval" not in e:
+        f = None
+        src = None
+        ast = _entry_numeric_ast(e)
+        if ast is not None:
+            try:
+                src = _evaluator_src(ast)
+                if src is not None:
+                    f = _exec_src(src)
+            except Exception:
+                f = None
+                src = None
+        e["eval"] = f
+        e["eval_src"] = src
+    return e["eval"]
+
+def _entry_derivative(e, wrt="x"):
+    """
+    (d_ast, steps) for the entry, with d_ast simplified: d/dx, or the
+    partial derivative with respect to another name.
+    d_ast is None when the expression does not parse.
+    """
+    if wrt == "x":
+        cache = e
+        key = "deriv"
+    else:
+        cache = e.setdefault("partials", {})
+        key = wrt
+    if key not in cache:
+        packed = e.get("packed")
+        if packed is not None and wrt in packed:
+            tup, steps = packed.pop(wrt)
+            cache[key] = (_opt_node(tup), steps)
+            return cache[key]
+        d = (None, [])
+        if _entry_ast(e) is not None:
+            steps = []
+            d = (_simplify_ast(_d(_entry_ast(e), steps, wrt)), steps)
+        cache[key] = d
+    return cache[key]
+
+def _entry_deriv_evaluator(e):
+    if "deriv_eval" not in e:
+        df = None
+        src = None
+        if _entry_numeric_ast(e) is not None:
+            try:
+                poly = _entry_poly(e)
+                if poly is not None:
+                    src = _poly_src(_poly_deriv(poly))
+                else:
+                    d_ast, steps = _entry_derivative(e)
+                    if not _steps_have_note(steps):
+                        src = _evaluator_src(d_ast)
+                if src is not None:
+                    df = _exec_src(src)
+            except Exception:
+                df = None
+                src = None
+        e["deriv_eval"] = df
+        e["deriv_src"] = src
+    return e["deriv_eval"]
+
+
+# ================================
+# Parameterized Expressions
+# ================================
+
+# Any name other than x, pi and e is a parameter: "a*x^2+b" is compiled
+# once to f(x, a, b) and then evaluated for many bindings, instead of
+# substituting numbers into the string and reparsing every variant.
+
+def _free_names(ast):
+    # Parameter names used in ast, sorted
+    names = {}
+    order = _postorder(ast)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        if n["t"] == "name" and n["v"] not in _CONST_VALUES:
+            names[n["v"]] = True
+        i += 1
+    out = list(names.keys())
+    out.sort()
+    return out
+
+def expr_params(expr):
+    # Parameter names of an expression string ([] if it does not parse)
+    e = _expr_entry(expr)
+    if "params" not in e:
+        p = []
+        if _entry_ast(e) is not None:
+            p = _free_names(_entry_ast(e))
+        e["params"] = p
+    return e["params"]
+
+def partial_derivative(expr, wrt="x"):
+    """
+    Symbolic derivative with respect to x or any parameter name,
+    holding everything else constant.
+    Returns (derivative string, steps), or (None, []) if expr does not parse.
+    """
+    d_ast, steps = _entry_derivative(_expr_entry(expr), wrt)
+    if d_ast is None:
+        return None, []
+    return _simplify_str(_to_str(d_ast)), list(steps)
+
+def param_evaluator(expr, params=None, wrt=None):
+    """
+    Compiled f(x, p1, p2, ...) with the parameters in the order of params
+    (default: expr_params(expr)). With wrt, compiles the derivative with
+    respect to wrt instead. Cached per expression; None if not compilable.
+    """
+    e = _expr_entry(expr)
+    if params is None:
+        params = expr_params(expr)
+    key = (wrt, tuple(params))
+    cache = e.setdefault("param_eval", {})
+    if key not in cache:
+        f = None
+        src = None
+        ast = _entry_numeric_ast(e)
+        if ast is not None and "x" not in params:
+            if wrt is not None:
+                ast = _entry_derivative(e, wrt)[0]
+            try:
+                src = _evaluator_src(ast, params)
+                if src is not None:
+                    f = _exec_src(src)
+            except Exception:
+                f = None
+                src = None
+        cache[key] = f
+        e.setdefault("param_src", {})[key] = src
+    return cache[key]
+
+def eval_batch(expr, bindings, wrt=None):
+    """
+    Evaluates expr (or its derivative with respect to wrt) for a list of
+    bindings, each a dict with "x" and every parameter, e.g.
+    eval_batch("a*x^2+b", [{"x": 1, "a": 2, "b": 3}, ...]).
+    Returns a list of values, None where undefined or unbound.
+    """
+    params = expr_params(expr)
+    f = param_evaluator(expr, params, wrt)
+    if f is None:
+        return [None] * len(bindings)
+
+    rows = []
+    for bnd in bindings:
+        row = [bnd.get("x")]
+        for p in params:
+            row.append(bnd.get(p))
+        rows.append(row)
+
+    # whole batch in one pass; redo point by point only if something fails
+    try:
+        return [f(*row) for row in rows]
+    except Exception:
+        pass
+
+    out = []
+    for row in rows:
+        try:
+            out.append(f(*row))
+        except Exception:
+            out.append(None)
+    return out
+
+
+# ================================
+# Equivalence Checking
+# ================================
+
+# Grading: is a student's answer the same function as the reference?
+# First a canonical-form comparison of the simplified ASTs (sums and
+# products compared as unordered collections), then sampling at
+# pseudo-random points. A fixed-seed LCG (no random module on the TI)
+# makes every run check the same points.
+
+_EQUIV_SEED = 20250117
+_EQUIV_POINTS = 12
+_EQUIV_TOL = 1e-7
+_EQUIV_RANGE = 4.0
+
+def _canon_kind(n):
+    # nodes in the same +/- or * cluster are flattened together
+    t = n["t"]
+    if t == "un" or (t == "bin" and (n["op"] == "+" or n["op"] == "-")):
+        return "sum"
+    if t == "bin" and n["op"] == "*":
+        return "prod"
+    return None
+
+def _canon_key(root):
+    """
+    Canonical text for a simplified AST: terms of a sum and factors of a
+    product are sorted, so x*sin(x)+1 and 1+sin(x)*x get the same key.
+    Only cluster roots are keyed, so long sums stay linear.
+    """
+    order = _postorder(root)
+    needed = {id(root): True}
+    i = 0
+    while i < len(order):
+        n = order[i]
+        kind = _canon_kind(n)
+        kids = []
+        if n["t"] == "bin":
+            kids = [n["a"], n["b"]]
+        elif n["t"] == "un" or n["t"] == "fun":
+            kids = [n["a"]]
+        for c in kids:
+            if kind is None or _canon_kind(c) != kind:
+                needed[id(c)] = True
+        i += 1
+
+    keys = {}
+    i = 0
+    while i < len(order):
+        n = order[i]
+        i += 1
+        if id(n) not in needed:
+            continue
+        t = n["t"]
+        kind = _canon_kind(n)
+
+        if kind == "sum":
+            # signed terms, flattened through + - and unary minus
+            terms = []
+            stack = [(n, 1)]
+            while len(stack) > 0:
+                m, sign = stack.pop()
+                if _canon_kind(m) != "sum":
+                    terms.append(("+" if sign > 0 else "-") + keys[id(m)])
+                elif m["t"] == "un":
+                    stack.append((m["a"], -sign))
+                else:
+                    stack.append((m["a"], sign))
+                    stack.append((m["b"], -sign if m["op"] == "-" else sign))
+            terms.sort()
+            keys[id(n)] = "S[" + ",".join(terms) + "]"
+        elif kind == "prod":
+            factors = []
+            stack = [n]
+            while len(stack) > 0:
+                m = stack.pop()
+                if _canon_kind(m) != "prod":
+                    factors.append(keys[id(m)])
+                else:
+                    stack.append(m["a"])
+                    stack.append(m["b"])
+            factors.sort()
+            keys[id(n)] = "P[" + ",".join(factors) + "]"
+        elif t == "num":
+            keys[id(n)] = _q_str(n["q"])
+        elif t == "var":
+            keys[id(n)] = "x"
+        elif t == "name":
+            keys[id(n)] = "$" + n["v"]
+        elif t == "fun":
+            keys[id(n)] = n["fn"] + "(" + keys[id(n["a"])] + ")"
+        else:
+            keys[id(n)] = n["op"] + "(" + keys[id(n["a"])] + "," + keys[id(n["b"])] + ")"
+
+    return keys[id(root)]
+
+def _lcg_points(count, seed=_EQUIV_SEED):
+    # count reproducible pseudo-random floats in (-_EQUIV_RANGE, _EQUIV_RANGE)
+    out = []
+    state = seed
+    while len(out) < count:
+        state = (1103515245 * state + 12345) % 2147483648
+        out.append((2.0 * state / 2147483648.0 - 1.0) * _EQUIV_RANGE)
+    return out
+
+def _batch_values(f, rows):
+    # f(*row) for every row in one pass; None for rows that fail
+    try:
+        vals = [f(*row) for row in rows]
+    except Exception:
+        vals = []
+        for row in rows:
+            try:
+                vals.append(f(*row))
+            except Exception:
+                vals.append(None)
+    i = 0
+    while i < len(vals):
+        # complex results (e.g. (-2)^0.5) count as undefined
+        if isinstance(vals[i], complex):
+            vals[i] = None
+        i += 1
+    return vals
+
+def _close(a, b, tol):
+    return abs(a - b) <= tol * max(1.0, abs(a), abs(b))
+
+def equivalence_result(expr1, expr2, points=_EQUIV_POINTS, tol=_EQUIV_TOL):
+    """
+    Compares two expressions (in x, plus any parameters).
+    Returns a dict:
+    - equivalent: True, False, or None when no sample point is defined
+      for both
+    - method: "canonical" (same simplified form) or "sampled"
+    - points: number of sample points where both were defined
+    - counterexample: (x, value1, value2) for a mismatch, else None
+    """
+    res = {"equivalent": None, "method": "sampled", "points": 0, "counterexample": None}
+    e1 = _expr_entry(expr1)
+    e2 = _expr_entry(expr2)
+    parsed = _entry_numeric_ast(e1) is not None and _entry_numeric_ast(e2) is not None
+
+    if parsed:
+        for e in (e1, e2):
+            if "canon" not in e:
+                e["canon"] = _canon_key(_simplify_ast(_entry_ast(e)))
+        if e1["canon"] == e2["canon"]:
+            res["equivalent"] = True
+            res["method"] = "canonical"
+            return res
+
+    # parameters are sampled like x
+    names = []
+    if parsed:
+        names = expr_params(expr1)
+        for p in expr_params(expr2):
+            if p not in names:
+                names.append(p)
+        names.sort()
+
+    # extra candidates for points outside a domain (ln, sqrt, ...)
+    xs = _lcg_points(3 * points * (1 + len(names)))
+    rows = []
+    i = 0
+    while i + len(names) < len(xs):
+        rows.append(xs[i:i + 1 + len(names)])
+        i += 1 + len(names)
+
+    f1 = param_evaluator(expr1, names)
+    f2 = param_evaluator(expr2, names)
+    if f1 is None or f2 is None:
+        if len(names) > 0:
+            return res
+        # string evaluator (e.g. scientific notation)
+        f1 = lambda x: eval_expr(expr1, x)
+        f2 = lambda x: eval_expr(expr2, x)
+    v1 = _batch_values(f1, rows)
+    v2 = _batch_values(f2, rows)
+
+    checked = 0
+    i = 0
+    while i < len(rows) and checked < points:
+        a = v1[i]
+        b = v2[i]
+        if a is not None and b is not None:
+            checked += 1
+            if not _close(a, b, tol):
+                res["equivalent"] = False
+                res["points"] = checked
+                res["counterexample"] = (rows[i][0], a, b)
+                return res
+        i += 1
+
+    res["points"] = checked
+    if checked > 0:
+        res["equivalent"] = True
+    return res
+
+def equivalent(expr1, expr2):
+    # True when the two expressions agree (same form, or at every sample point)
+    return equivalence_result(expr1, expr2)["equivalent"] is True
+
+
+# ================================
+# Polynomial Fast Path
+# ================================
+
+# Dense coefficient lists: [c0, c1, ..., cn] means c0 + c1*x + ... + cn*x^n
+_POLY_MAX_DEGREE = 512
+
+def _num_value(r):
+    # exact rational -> int when whole, else float
+    if r[1] == 1:
+        return r[0]
+    return _q_float(r)
+
+def _poly_trim(p):
+    while len(p) > 1 and p[-1] == 0:
+        p.pop()
+    return p
+
+def _poly_add(p, q, sign):
+    out = []
+    i = 0
+    while i < len(p) or i < len(q):
+        a = p[i] if i < len(p) else 0
+        b = q[i] if i < len(q) else 0
+        out.append(a + sign * b)
+        i += 1
+    return _poly_trim(out)
+
+def _poly_mul(p, q):
+    if len(p) + len(q) - 2 > _POLY_MAX_DEGREE:
+        return None
+    out = [0] * (len(p) + len(q) - 1)
+    i = 0
+    while i < len(p):
+        if p[i] != 0:
+            j = 0
+            while j < len(q):
+                out[i + j] += p[i] * q[j]
+                j += 1
+        i += 1
+    return _poly_trim(out)
+
+def _poly_scale_div(p, c):
+    # divide every coefficient by constant c (exact for ints when it divides)
+    out = []
+    i = 0
+    while i < len(p):
+        v = p[i]
+        if isinstance(v, int) and isinstance(c, int) and v % c == 0:
+            out.append(v // c)
+        else:
+            out.append(v / c)
+        i += 1
+    return out
+
+def _poly_from_ast(node):
+    """
+    Converts a polynomial AST into a dense coefficient list.
+    Returns None if node is not a polynomial in x.
+    """
+    dep = {}
+    vals = {}
+    polys = {}
+    order = _postorder(node)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        i += 1
+        nid = id(n)
+        t = n["t"]
+
+        if t == "var":
+            d = True
+        elif t == "bin":
+            d = dep[id(n["a"])] or dep[id(n["b"])]
+        elif t == "un" or t == "fun":
+            d = dep[id(n["a"])]
+        else:
+            d = False
+        dep[nid] = d
+
+        if not d:
+            v = _const_step(n, vals)
+            vals[nid] = v
+            if t == "num":
+                polys[nid] = [_num_value(n["q"])]
+            elif isinstance(v, float):
+                polys[nid] = [v]
+            else:
+                polys[nid] = None
+            continue
+
+        polys[nid] = _poly_step(n, polys)
+
+    return polys[id(node)]
+
+def _poly_step(n, polys):
+    # Coefficients of an x-dependent node from its children's coefficients
+    t = n["t"]
+    if t == "var":
+        return [0, 1]
+    if t == "un":
+        p = polys[id(n["a"])]
+        if p is None:
+            return None
+        return [-c for c in p]
+    if t != "bin":
+        return None
+
+    op = n["op"]
+    p = polys[id(n["a"])]
+    q = polys[id(n["b"])]
+    if p is None or q is None:
+        return None
+
+    if op == "^":
+        e = _const_rational(n["b"])
+        if e is None or e[1] != 1:
+            return None
+        e = e[0]
+        if e < 0 or (len(p) - 1) * e > _POLY_MAX_DEGREE:
+            return None
+        out = [1]
+        while e > 0:
+            out = _poly_mul(out, p)
+            e -= 1
+        return out
+
+    if op == "/":
+        if len(q) != 1 or q[0] == 0:
+            return None
+        return _poly_scale_div(p, q[0])
+
+    if op == "+":
+        return _poly_add(p, q, 1)
+    if op == "-":
+        return _poly_add(p, q, -1)
+    if op == "*":
+        return _poly_mul(p, q)
+    return None
+
+def _poly_deriv(p):
+    # exact coefficient differentiation
+    if len(p) <= 1:
+        return [0]
+    out = []
+    k = 1
+    while k < len(p):
+        out.append(k * p[k])
+        k += 1
+    return _poly_trim(out)
+
+def _poly_fin(v):
+    # overflow (inf, or nan from inf - inf) raises, as x**n does
+    if v - v != 0:
+        raise OverflowError("polynomial overflow")
+    return v
+
+def _poly_eval(p, x):
+    # Horner's scheme
+    acc = 0
+    k = len(p) - 1
+    while k >= 0:
+        acc = acc * x + p[k]
+        k -= 1
+    return _poly_fin(acc)
+
+def _poly_use_horner(p):
+    # Horner beats x**n unless the polynomial is sparse (like x^100)
+    nonzero = 0
+    i = 0
+    while i < len(p):
+        if p[i] != 0:
+            nonzero += 1
+        i += 1
+    return len(p) - 1 <= 3 * nonzero
+
+def _poly_src(p):
+    # Horner source for small degrees; the loop for big ones (nesting limits).
+    # Coefficients are literals in the source, so it can be stored and rerun.
+    if len(p) > 60:
+        return "def _f(x, _p=" + repr(p) + "):\n    return _poly_eval(_p, x)\n"
+    src = repr(p[-1])
+    k = len(p) - 2
+    while k >= 0:
+        src = "(" + src + ")*x+" + "(" + repr(p[k]) + ")"
+        k -= 1
+    return "def _f(x):\n    return _poly_fin(" + src + ")\n"
+
+def _num_str(c):
+    # 3 -> "3", 3.0 -> "3", 2.5 -> "2.5"
+    if isinstance(c, float) and c == int(c) and abs(c) < 1e15:
+        return str(int(c))
+    return str(c)
+
+def _xh_piece(c, x_pow, h_pow):
+    # One term c*x^a*h^b, e.g. 3*x^2*h (|c| used; the caller writes the sign)
+    if x_pow == 0:
+        x_part = ""
+    elif x_pow == 1:
+        x_part = "x"
+    else:
+        x_part = "x^" + str(x_pow)
+
+    if h_pow == 0:
+        h_part = ""
+    elif h_pow == 1:
+        h_part = "h"
+    else:
+        h_part = "h^" + str(h_pow)
+
+    c = abs(c)
+    piece = ""
+    if c != 1:
+        piece += _num_str(c)
+        if x_part != "" or h_part != "":
+            piece += "*"
+
+    if x_part != "" and h_part != "":
+        piece += x_part + "*" + h_part
+    elif x_part != "":
+        piece += x_part
+    elif h_part != "":
+        piece += h_part
+    elif c == 1:
+        piece += "1"
+    return piece
+
+def _join_signed_terms(terms):
+    # terms: list of (coeff, piece) -> "a + b - c"
+    out = ""
+    i = 0
+    while i < len(terms):
+        c = terms[i][0]
+        piece = terms[i][1]
+        if i == 0:
+            if c < 0:
+                out += "-"
+            out += piece
+        elif c < 0:
+            out += " - " + piece
+        else:
+            out += " + " + piece
+        i += 1
+    if out == "":
+        return "0"
+    return out
+
+def _poly_to_str(p):
+    # highest power first: 3*x^2 - 2
+    terms = []
+    k = len(p) - 1
+    while k >= 0:
+        if p[k] != 0:
+            terms.append((p[k], _xh_piece(p[k], k, 0)))
+        k -= 1
+    return _join_signed_terms(terms)
+
+# Sparse polynomials in x and h for the definition of the derivative:
+# {(i, j): c} is the sum of c*x^i*h^j, with no zero coefficients.
+# Only terms that exist are stored, so x^50 + 1 shifted by h costs 51
+# terms, not a dense 51x51 table.
+
+def _xh_poly(p):
+    # dense f(x) -> {(i, 0): c}
+    out = {}
+    k = 0
+    while k < len(p):
+        if p[k] != 0:
+            out[(k, 0)] = p[k]
+        k += 1
+    return out
+
+def _xh_shift(p):
+    # f(x+h) for dense coefficients p: x^k -> sum C(k, j) x^(k-j) h^j
+    # row k of Pascal's triangle comes from row k-1 (additions only)
+    out = {}
+    row = [1]
+    k = 0
+    while k < len(p):
+        if k > 0:
+            nxt = [1]
+            j = 1
+            while j < k:
+                nxt.append(row[j - 1] + row[j])
+                j += 1
+            nxt.append(1)
+            row = nxt
+        if p[k] != 0:
+            j = 0
+            while j <= k:
+                key = (k - j, j)
+                out[key] = out.get(key, 0) + p[k] * row[j]
+                j += 1
+        k += 1
+    return _xh_trim(out)
+
+def _xh_trim(a):
+    for key in [key for key in a if a[key] == 0]:
+        del a[key]
+    return a
+
+def _xh_add(a, b, sign):
+    out = dict(a)
+    for key in b:
+        out[key] = out.get(key, 0) + sign * b[key]
+    return _xh_trim(out)
+
+def _xh_mul(a, b):
+    out = {}
+    for (i, j) in a:
+        c = a[(i, j)]
+        for (k, l) in b:
+            key = (i + k, j + l)
+            out[key] = out.get(key, 0) + c * b[(k, l)]
+    return _xh_trim(out)
+
+def _xh_div_h(a):
+    # a/h, None unless every term has a factor h
+    out = {}
+    for (i, j) in a:
+        if j == 0:
+            return None
+        out[(i, j - 1)] = a[(i, j)]
+    return out
+
+def _xh_at_h0(a):
+    # a with h = 0, as dense coefficients in x
+    n = 0
+    for (i, j) in a:
+        if j == 0 and i > n:
+            n = i
+    p = [0] * (n + 1)
+    for (i, j) in a:
+        if j == 0:
+            p[i] = a[(i, j)]
+    return p
+
+def _xh_terms(a):
+    # (c, i, j) in print order: lowest power of h first, then highest
+    # power of x: x^2 + 2*x*h + h^2
+    for (i, j) in sorted(a, key=lambda k: (k[1], -k[0])):
+        yield (a[(i, j)], i, j)
+
+def _xh_to_str(a):
+    terms = []
+    for (c, i, j) in _xh_terms(a):
+        terms.append((c, _xh_piece(c, i, j)))
+    return _join_signed_terms(terms)
+
+
+# ================================
+# Symbolic Limits
+# ================================
+
+# lim x->a by direct substitution, then L'Hopital's rule on a quotient,
+# then truncated Taylor series about a. Values are "mixed" numbers: an
+# exact rational (p, q) while the work stays rational, else a float.
+
+_LH_MAX_ROUNDS = 4
+_LH_MAX_NODES = 400       # stop differentiating once the trees are this big
+# switch to series once the quotient has grown by half (ln(x)/(1/x) only
+# gets longer under L'Hopital)
+_LH_GROWTH = 1.5
+_SERIES_TERMS = [6, 12]   # series lengths to try
+_M_ZERO_TOL = 1e-12
+
+# exact values at 0 (exp(0) = 1, sin(0) = 0, ...)
+_FUNC_AT_ZERO = {"sin": Q_ZERO, "cos": Q_ONE, "tan": Q_ZERO, "exp": Q_ONE,
+                 "sec": Q_ONE, "asin": Q_ZERO, "atan": Q_ZERO, "sinh": Q_ZERO,
+                 "cosh": Q_ONE, "tanh": Q_ZERO, "sqrt": Q_ZERO, "abs": Q_ZERO}
+
+def _q_root(r, n):
+    # exact n-th root of a rational >= 0, or None
+    if r[0] < 0:
+        return None
+    out = []
+    for v in (r[0], r[1]):
+        k = int(round(v ** (1.0 / n)))
+        while k ** n > v:
+            k -= 1
+        while (k + 1) ** n <= v:
+            k += 1
+        if k ** n != v:
+            return None
+        out.append(k)
+    return (out[0], out[1])
+
+def _m_float(v):
+    if isinstance(v, tuple):
+        return _q_float(v)
+    return v
+
+def _m_zero(v):
+    if isinstance(v, tuple):
+        return v[0] == 0
+    return abs(v) < _M_ZERO_TOL
+
+def _m_int(v):
+    # v as an int if it is a whole number, else None
+    if isinstance(v, tuple):
+        if v[1] == 1:
+            return v[0]
+        return None
+    if v == int(v):
+        return int(v)
+    return None
+
+def _m_str(v):
+    if isinstance(v, tuple):
+        return _q_str(v)
+    if _m_zero(v):
+        return "0"
+    return str(round(v, 6))
+
+def _m_binop(op, a, b):
+    # a op b, exact when both are rational; raises when undefined
+    if op == "^" and _m_zero(a) and _m_zero(b):
+        raise ValueError("0^0")
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        r = _q_binop(op, a, b)
+        if r is not None:
+            return r
+        if op == "/":
+            raise ZeroDivisionError("division by zero")
+        if op == "^" and b[1] > 1 and b[1] <= 6 and a[0] >= 0:
+            root = _q_root(a, b[1])
+            if root is not None:
+                r = _q_binop("^", root, (b[0], 1))
+                if r is not None:
+                    return r
+    a = _m_float(a)
+    b = _m_float(b)
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if op == "/":
+        return a / b
+    if a < 0 and b != int(b):
+        raise ValueError("root of a negative number")
+    return a ** b
+
+def _m_fun(fn, v):
+    # fn(v), exact at the special points
+    if isinstance(v, tuple):
+        if v[0] == 0 and fn in _FUNC_AT_ZERO:
+            return _FUNC_AT_ZERO[fn]
+        if v == Q_ONE and (fn == "ln" or fn == "log"):
+            return Q_ZERO
+        if fn == "abs":
+            return (abs(v[0]), v[1])
+        if fn == "sqrt":
+            r = _q_root(v, 2)
+            if r is not None:
+                return r
+    f = _m_float(v)
+    if not _in_domain(fn, f):
+        raise ValueError("outside domain of " + fn)
+    return _FUNCS[fn]["f"](f)
+
+def _m_eval(node, a):
+    # Mixed value of node at x = a, or None if undefined there
+    vals = {}
+    order = _postorder(node)
+    try:
+        for n in order:
+            t = n["t"]
+            if t == "num":
+                v = n["q"]
+            elif t == "var":
+                v = a
+            elif t == "name":
+                v = _CONST_VALUES[n["v"]]
+            elif t == "un":
+                v = _m_binop("-", Q_ZERO, vals[id(n["a"])])
+            elif t == "fun":
+                v = _m_fun(n["fn"], vals[id(n["a"])])
+            else:
+                v = _m_binop(n["op"], vals[id(n["a"])], vals[id(n["b"])])
+            vals[id(n)] = v
+    except (ValueError, ZeroDivisionError, OverflowError, KeyError):
+        return None
+    return vals[id(node)]
+
+def _subst_x_text(s, repl):
+    """
+    s with every variable x replaced by repl, kept as the user wrote it
+    (3x -> 3(x+h), 2x -> 2(1.5)). Letter runs are read as function names first, so the
+    x in exp is left alone while xsin(x) still has two x's.
+    """
+    out = []
+    i = 0
+    n = len(s)
+    while i < n:
+        o = ord(s[i])
+        if not ((65 <= o <= 90) or (97 <= o <= 122)):
+            out.append(s[i])
+            i += 1
+            continue
+        j = i
+        while j < n and ((65 <= ord(s[j]) <= 90) or (97 <= ord(s[j]) <= 122)):
+            j += 1
+        word = s[i:j]
+        k = 0
+        while k < len(word):
+            name = ""
+            for f in _FUNCS:
+                if len(f) > len(name) and word[k:k + len(f)] == f:
+                    name = f
+            if name == "" and word[k:k + 2] == "pi":
+                name = "pi"
+            if name != "":
+                out.append(name)
+                k += len(name)
+            elif word[k] == "x":
+                r = repl
+                if r[:1] != "(" and out and out[-1][-1:] in "0123456789.)":
+                    r = "(" + r + ")"
+                out.append(r)
+                k += 1
+            else:
+                out.append(word[k])
+                k += 1
+        i = j
+    return "".join(out)
+
+def _subst_at(node, a):
+    # node with x = a, constants folded (sin(0) -> 0, 2^0 -> 1, ...)
+    if isinstance(a, tuple):
+        xa = N_rat(a)
+    else:
+        xa = N_num(str(a))
+    done = {}
+    for n in _postorder(node):
+        t = n["t"]
+        if t == "var":
+            r = xa
+        elif t == "un":
+            r = _neg_node(done[id(n["a"])])
+        elif t == "fun":
+            r = N_fun(n["fn"], done[id(n["a"])])
+            if r["a"]["t"] == "num":
+                try:
+                    v = _m_fun(n["fn"], r["a"]["q"])
+                except (ValueError, ZeroDivisionError, OverflowError):
+                    v = None
+                if isinstance(v, tuple):
+                    r = N_rat(v)
+        elif t == "bin":
+            r = _simplify_bin(n["op"], done[id(n["a"])], done[id(n["b"])])
+        else:
+            r = n
+        done[id(n)] = r
+    return done[id(node)]
+
+# Truncated Taylor series about x = a, in t = x - a: (s, c) stands for
+# t^s * (c[0] + c[1]*t + ... ) with len(c) coefficients known.
+# Failures raise ValueError / ZeroDivisionError. With pos set only t > 0
+# matters, so (t^-2)^(1/2) = t^-1 and abs(t) = t are allowed.
+
+def _s_coef(u, k):
+    i = k - u[0]
+    if i < 0:
+        return Q_ZERO
+    return u[1][i]
+
+def _s_trim(u):
+    # Moves leading zero coefficients into the shift; None if all are zero
+    s, c = u
+    i = 0
+    while i < len(c) and _m_zero(c[i]):
+        i += 1
+    if i == len(c):
+        return None
+    return (s + i, c[i:])
+
+def _s_at0(u):
+    # Coefficients from t^0 up; fails if u has a pole at a
+    s, c = u
+    if s < 0:
+        u = _s_trim(u)
+        if u is None or u[0] < 0:
+            raise ValueError("pole")
+        s, c = u
+    return [Q_ZERO] * s + c
+
+def _s_add(u, v, op):
+    s = min(u[0], v[0])
+    top = min(u[0] + len(u[1]), v[0] + len(v[1]))
+    c = []
+    k = s
+    while k < top:
+        c.append(_m_binop(op, _s_coef(u, k), _s_coef(v, k)))
+        k += 1
+    return (s, c)
+
+def _s_mul(u, v):
+    a = u[1]
+    b = v[1]
+    n = min(len(a), len(b))
+    c = []
+    k = 0
+    while k < n:
+        acc = Q_ZERO
+        j = 0
+        while j <= k:
+            acc = _m_binop("+", acc, _m_binop("*", a[j], b[k - j]))
+            j += 1
+        c.append(acc)
+        k += 1
+    return (u[0] + v[0], c)
+
+def _s_div(u, v):
+    v = _s_trim(v)
+    if v is None:
+        raise ZeroDivisionError("series division by zero")
+    a = u[1]
+    b = v[1]
+    n = min(len(a), len(b))
+    c = []
+    k = 0
+    while k < n:
+        acc = a[k]
+        j = 1
+        while j <= k:
+            acc = _m_binop("-", acc, _m_binop("*", b[j], c[k - j]))
+            j += 1
+        c.append(_m_binop("/", acc, b[0]))
+        k += 1
+    return (u[0] - v[0], c)
+
+def _s_scale(u, m):
+    return (u[0], [_m_binop("*", v, m) for v in u[1]])
+
+def _s_exp(c):
+    # w = exp(u): w' = u'*w
+    w = [_m_fun("exp", c[0])]
+    k = 1
+    while k < len(c):
+        acc = Q_ZERO
+        j = 1
+        while j <= k:
+            acc = _m_binop("+", acc, _m_binop("*", (j, 1), _m_binop("*", c[j], w[k - j])))
+            j += 1
+        w.append(_m_binop("/", acc, (k, 1)))
+        k += 1
+    return (0, w)
+
+def _s_ln(c):
+    # w = ln(u): u*w' = u'
+    w = [_m_fun("ln", c[0])]
+    k = 1
+    while k < len(c):
+        acc = Q_ZERO
+        j = 1
+        while j < k:
+            acc = _m_binop("+", acc, _m_binop("*", (j, 1), _m_binop("*", w[j], c[k - j])))
+            j += 1
+        acc = _m_binop("-", c[k], _m_binop("/", acc, (k, 1)))
+        w.append(_m_binop("/", acc, c[0]))
+        k += 1
+    return (0, w)
+
+def _s_sincos(c):
+    # sin(u) and cos(u) together: sin' = cos*u', cos' = -sin*u'
+    sn = [_m_fun("sin", c[0])]
+    cs = [_m_fun("cos", c[0])]
+    k = 1
+    while k < len(c):
+        a = Q_ZERO
+        b = Q_ZERO
+        j = 1
+        while j <= k:
+            ju = _m_binop("*", (j, 1), c[j])
+            a = _m_binop("+", a, _m_binop("*", ju, cs[k - j]))
+            b = _m_binop("-", b, _m_binop("*", ju, sn[k - j]))
+            j += 1
+        sn.append(_m_binop("/", a, (k, 1)))
+        cs.append(_m_binop("/", b, (k, 1)))
+        k += 1
+    return (0, sn), (0, cs)
+
+def _s_pow(u, r, pos=False):
+    # w = u^r for a constant r: u*w' = r*u'*w
+    u = _s_trim(u)
+    if u is None:
+        raise ValueError("power of zero series")
+    s, c = u
+    ri = _m_int(r)
+    if ri is not None:
+        shift = s * ri
+    elif s == 0:
+        shift = 0
+    else:
+        shift = None
+        if pos:
+            shift = _m_int(_m_binop("*", (s, 1), r))
+        if shift is None:
+            raise ValueError("not analytic")
+    w = [_m_binop("^", c[0], r)]
+    k = 1
+    while k < len(c):
+        acc = Q_ZERO
+        j = 1
+        while j <= k:
+            m = _m_binop("-", _m_binop("*", _m_binop("+", r, Q_ONE), (j, 1)), (k, 1))
+            acc = _m_binop("+", acc, _m_binop("*", m, _m_binop("*", c[j], w[k - j])))
+            j += 1
+        w.append(_m_binop("/", acc, _m_binop("*", (k, 1), c[0])))
+        k += 1
+    return (shift, w)
+
+def _s_integ(c, g, w0):
+    # w with w(a) = w0 and w' = g*u' (asin, acos, atan)
+    g = _s_at0(g)
+    w = [w0]
+    n = min(len(c), len(g) + 1)
+    k = 1
+    while k < n:
+        acc = Q_ZERO
+        j = 1
+        while j <= k:
+            acc = _m_binop("+", acc, _m_binop("*", (j, 1), _m_binop("*", c[j], g[k - j])))
+            j += 1
+        w.append(_m_binop("/", acc, (k, 1)))
+        k += 1
+    return (0, w)
+
+def _s_fun(fn, u, pos=False):
+    if fn == "sqrt":
+        return _s_pow(u, (1, 2), pos)
+    if fn == "abs":
+        v = _s_trim(u)
+        if v is None or (v[0] != 0 and not pos):
+            raise ValueError("abs of a zero")
+        if _m_float(v[1][0]) < 0:
+            return _s_scale(u, (-1, 1))
+        return u
+    c = _s_at0(u)
+    if fn == "exp":
+        return _s_exp(c)
+    if fn == "ln" or fn == "log":
+        w = _s_ln(c)
+        if fn == "log":
+            w = _s_scale(w, 1.0 / math.log(10.0))
+        return w
+    if fn in ("sin", "cos", "tan", "sec", "csc", "cot"):
+        sn, cs = _s_sincos(c)
+        if fn == "sin":
+            return sn
+        if fn == "cos":
+            return cs
+        if fn == "tan":
+            return _s_div(sn, cs)
+        if fn == "cot":
+            return _s_div(cs, sn)
+        one = (0, [Q_ONE] + [Q_ZERO] * (len(c) - 1))
+        if fn == "sec":
+            return _s_div(one, cs)
+        return _s_div(one, sn)
+    if fn in ("sinh", "cosh", "tanh"):
+        ep = _s_exp(c)
+        em = _s_exp([_m_binop("-", Q_ZERO, v) for v in c])
+        sh = _s_scale(_s_add(ep, em, "-"), (1, 2))
+        ch = _s_scale(_s_add(ep, em, "+"), (1, 2))
+        if fn == "sinh":
+            return sh
+        if fn == "cosh":
+            return ch
+        return _s_div(sh, ch)
+    one = (0, [Q_ONE] + [Q_ZERO] * (len(c) - 1))
+    sq = _s_mul((0, c), (0, c))
+    if fn == "atan":
+        return _s_integ(c, _s_div(one, _s_add(one, sq, "+")), _m_fun("atan", c[0]))
+    if fn == "asin" or fn == "acos":
+        g = _s_pow(_s_add(one, sq, "-"), (-1, 2))
+        if fn == "acos":
+            g = _s_scale(g, (-1, 1))
+        return _s_integ(c, g, _m_fun(fn, c[0]))
+    raise ValueError("no series for " + fn)
+
+def _series(node, a, n, pos=False):
+    # Taylor series of node about x = a with n coefficients
+    zeros = [Q_ZERO] * (n - 1)
+    vals = {}
+    for nd in _postorder(node):
+        t = nd["t"]
+        if t == "num":
+            u = (0, [nd["q"]] + zeros)
+        elif t == "var":
+            u = (0, [a, Q_ONE] + zeros[1:])
+        elif t == "name":
+            u = (0, [_CONST_VALUES[nd["v"]]] + zeros)
+        elif t == "un":
+            u = _s_scale(vals[id(nd["a"])], (-1, 1))
+        elif t == "fun":
+            u = _s_fun(nd["fn"], vals[id(nd["a"])], pos)
+        else:
+            op = nd["op"]
+            p = vals[id(nd["a"])]
+            q = vals[id(nd["b"])]
+            if op == "+" or op == "-":
+                u = _s_add(p, q, op)
+            elif op == "*":
+                u = _s_mul(p, q)
+            elif op == "/":
+                u = _s_div(p, q)
+            elif nd["a"]["t"] == "name" and nd["a"]["v"] == "e":
+                u = _s_exp(_s_at0(q))
+            else:
+                const = q[0] == 0
+                i = 1
+                while const and i < len(q[1]):
+                    const = _m_zero(q[1][i]) and isinstance(q[1][i], tuple)
+                    i += 1
+                if const:
+                    u = _s_pow(p, q[1][0], pos)
+                else:
+                    # u^v = exp(v*ln(u))
+                    u = _s_exp(_s_at0(_s_mul(q, _s_fun("ln", p, pos))))
+        vals[id(nd)] = u
+    return vals[id(node)]
+
+def _series_lead(node, a, pos=False):
+    # Leading term (power, coefficient) of node's series about a, or None
+    for n in _SERIES_TERMS:
+        try:
+            u = _s_trim(_series(node, a, n, pos))
+        except (ValueError, ZeroDivisionError, OverflowError, KeyError):
+            return None
+        if u is not None:
+            return u[0], u[1][0]
+    return None
+
+def _sided_growth(node, a):
+    # "inf" if |node| blows up as x -> a from a side where it is defined
+    grows = False
+    for side in (1.0, -1.0):
+        try:
+            y1 = abs(_eval_node(node, a + side * 1e-4))
+            y2 = abs(_eval_node(node, a + side * 1e-8))
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            continue
+        if isinstance(y1, complex) or isinstance(y2, complex):
+            continue
+        if y2 > 10.0 and y2 > 2.0 * y1:
+            grows = True
+        else:
+            return None
+    if grows:
+        return "inf"
+    return None
+
+def _limit_kind(node, a):
+    # ("zero" | "finite" | "inf" | None, mixed value at a)
+    v = _m_eval(node, a)
+    if v is not None:
+        if _m_zero(v):
+            return "zero", v
+        return "finite", v
+    return _sided_growth(node, _m_float(a)), None
+
+def _infinite_limit(node, a):
+    # "+inf", "-inf" or "DNE" (sides disagree) for a limit that blows up
+    signs = []
+    for side in (1.0, -1.0):
+        try:
+            y = _eval_node(node, _m_float(a) + side * 1e-9)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            continue
+        if not isinstance(y, complex):
+            signs.append(y > 0)
+    if len(signs) == 0:
+        return "DNE"
+    if len(signs) == 2 and signs[0] != signs[1]:
+        return "DNE"
+    if signs[0]:
+        return "+inf"
+    return "-inf"
+
+def _matches_sides(node, a, v):
+    # f(a) agrees with f just left and right of a (a float point like pi,
+    # where rounding turns 0/0 into 0 or c/0 into 1e16)
+    af = _m_float(a)
+    vf = _m_float(v)
+    d = 1e-10 * max(1.0, abs(af))
+    for side in (1.0, -1.0):
+        try:
+            y = _eval_node(node, af + side * d)
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            continue
+        if isinstance(y, complex):
+            continue
+        if abs(y - vf) > 1e-4 * max(1.0, abs(vf)):
+            return False
+    return True
+
+def _limit_point(a):
+    # x -> a as a mixed value: ints and short decimals like 0.5 become
+    # exact, other floats (pi) stay floats; None if a is not a finite number
+    if isinstance(a, bool):
+        return None
+    if isinstance(a, int):
+        return (a, 1)
+    if isinstance(a, tuple):
+        return a
+    if not isinstance(a, float) or a != a or a in (float("inf"), float("-inf")):
+        return None
+    qa = _q_from_str(str(a))
+    if qa is not None and qa[1] <= 1000000:
+        return qa
+    return a
+
+def _limit_text(node, a, v):
+    # Exact answer text: rational, else the folded expression at a
+    if isinstance(v, tuple):
+        return _q_str(v)
+    if isinstance(a, tuple):
+        s = _simplify_str(_to_str(_subst_at(node, a)))
+        if len(s) <= 40 and s.find("x") < 0:
+            return s
+    return str(round(v, 10))
+
+def limit_result(expr, a):
+    """
+    Exact lim x->a f(x) without sampling.
+    Returns a dict:
+    - error: None, "tokenize", "parse", "point" (a is not a number)
+      or "unknown" (no method applied)
+    - limit: mixed value (rational tuple or float), None if infinite/DNE
+    - inf: None, "+inf", "-inf" or "DNE"
+    - text: the answer as written ("3", "ln(2)", "+inf", ...)
+    - method: "direct", "lhopital" or "series"
+    - form: "0/0", "inf/inf" or None
+    - rounds: L'Hopital rounds used
+    - steps: hand steps, in order
+    """
+    if isinstance(a, float) and (a == float("inf") or a == float("-inf")):
+        return limit_at_infinity_result(expr, 1 if a > 0 else -1)
+
+    res = {"error": None, "limit": None, "inf": None, "text": None,
+           "method": None, "form": None, "rounds": 0, "steps": []}
+    steps = res["steps"]
+
+    e = _expr_entry(expr)
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+    f = _entry_ast(e)
+    if f is None:
+        res["error"] = "parse"
+        return res
+
+    a = _limit_point(a)
+    if a is None:
+        res["error"] = "point"
+        return res
+    a_str = _m_str(a)
+
+    top = None
+    bot = None
+    if f["t"] == "bin" and f["op"] == "/":
+        top = f["a"]
+        bot = f["b"]
+
+    v = _m_eval(f, a)
+    if v is not None and not isinstance(a, tuple):
+        # a is a float: a zero or pole shows up only as a tiny or huge
+        # value, so check the sides before trusting direct substitution
+        if top is not None:
+            kt = _limit_kind(top, a)[0]
+            kb = _limit_kind(bot, a)[0]
+            if kb == "zero" or kt == "inf" or kb == "inf":
+                v = None
+        if v is not None and _sided_growth(f, _m_float(a)) == "inf":
+            res["method"] = "direct"
+            res["inf"] = _infinite_limit(f, a)
+            res["text"] = res["inf"]
+            steps.append("Substitute x = " + a_str + ": f blows up (|f| -> inf)")
+            steps.append("Limit = " + res["text"])
+            return res
+        if v is not None and not _matches_sides(f, a, v):
+            v = None
+    if v is not None:
+        res["method"] = "direct"
+        res["limit"] = v
+        res["text"] = _limit_text(f, a, v)
+        steps.append("Substitute x = " + a_str + ": f(" + a_str + ") = " + res["text"])
+        return res
+
+    rounds = 0
+    size0 = 0
+    if top is not None:
+        size0 = len(_postorder(f))
+    while top is not None:
+        kt, vt = _limit_kind(top, a)
+        kb, vb = _limit_kind(bot, a)
+        if kt is None or kb is None:
+            break
+
+        st = "0"
+        if kt == "inf":
+            st = "inf"
+        elif kt == "finite":
+            st = _m_str(vt)
+        sb = "0"
+        if kb == "inf":
+            sb = "inf"
+        elif kb == "finite":
+            sb = _m_str(vb)
+        steps.append("Substitute x = " + a_str + ": top -> " + st + ", bottom -> " + sb)
+
+        quot = N_bin("/", top, bot)
+        if kt == kb and kt != "finite":
+            form = st + "/" + sb
+            size = len(_postorder(quot))
+            if rounds == _LH_MAX_ROUNDS or size > _LH_MAX_NODES:
+                break
+            if rounds > 0 and size >= _LH_GROWTH * size0:
+                break
+            if res["form"] is None:
+                res["form"] = form
+            rounds += 1
+            steps.append(form + " is indeterminate: L'Hopital (round " + str(rounds) + ")")
+            top = _simplify_ast(_d(top, []))
+            bot = _simplify_ast(_d(bot, []))
+            steps.append("top' = " + _simplify_str(_to_str(top)))
+            steps.append("bottom' = " + _simplify_str(_to_str(bot)))
+            continue
+
+        res["method"] = "direct"
+        if rounds > 0:
+            res["method"] = "lhopital"
+        res["rounds"] = rounds
+        if kb == "finite" and kt != "inf":
+            if kt == "zero":
+                v = Q_ZERO
+            else:
+                v = _m_binop("/", vt, vb)
+            res["limit"] = v
+            res["text"] = _limit_text(quot, a, v)
+        elif kb == "inf":
+            res["limit"] = Q_ZERO
+            res["text"] = "0"
+        else:
+            res["inf"] = _infinite_limit(quot, a)
+            res["text"] = res["inf"]
+        steps.append("Limit = " + res["text"])
+        return res
+
+    # Taylor series: the leading term decides
+    node = f
+    if top is not None and rounds > 0:
+        node = N_bin("/", top, bot)
+    lead = _series_lead(node, a)
+    if lead is None and node is not f:
+        node = f
+        lead = _series_lead(f, a)
+    if lead is None:
+        res["error"] = "unknown"
+        return res
+
+    power, coef = lead
+    res["method"] = "series"
+    res["rounds"] = rounds
+    t = "t"
+    if _m_zero(a):
+        t = "x"
+    term = _m_str(coef)
+    if power != 0:
+        if power != 1:
+            t = t + "^" + _paren_if_compound(str(power))
+        if coef == Q_ONE:
+            term = t
+        elif coef == (-1, 1):
+            term = "-" + t
+        else:
+            term = _paren_if_compound(term) + "*" + t
+    if not _m_zero(a):
+        steps.append("Series about x = " + a_str + " (t = x - " + a_str + "): f = " + term + " + ...")
+    else:
+        steps.append("Series about x = 0: f = " + term + " + ...")
+    if power > 0:
+        res["limit"] = Q_ZERO
+        res["text"] = "0"
+    elif power == 0:
+        res["limit"] = coef
+        res["text"] = _m_str(coef)
+        if not isinstance(coef, tuple):
+            res["text"] = str(round(coef, 10))
+    elif power % 2 == 0:
+        res["inf"] = "+inf"
+        if _m_float(coef) < 0:
+            res["inf"] = "-inf"
+        res["text"] = res["inf"]
+    else:
+        res["inf"] = "DNE"
+        res["text"] = "DNE"
+    steps.append("Limit = " + res["text"])
+    return res
+
+
+# ================================
+# Factor and Cancel
+# ================================
+
+# Removable 0/0 limits the way they are done by hand: rationalize a
+# sqrt binomial with its conjugate, cancel the polynomial GCD of top
+# and bottom, then substitute. Polynomials here are dense lists of
+# exact rationals, lowest power first.
+
+def _qp_trim(p):
+    while len(p) > 1 and p[-1][0] == 0:
+        p.pop()
+    return p
+
+def _qp_is_zero(p):
+    return len(p) == 1 and p[0][0] == 0
+
+def _qp_add(p, q, op):
+    out = []
+    i = 0
+    while i < len(p) or i < len(q):
+        a = p[i] if i < len(p) else Q_ZERO
+        b = q[i] if i < len(q) else Q_ZERO
+        out.append(_q_binop(op, a, b))
+        i += 1
+    return _qp_trim(out)
+
+def _qp_mul(p, q):
+    if len(p) + len(q) - 2 > _POLY_MAX_DEGREE:
+        return None
+    out = [Q_ZERO] * (len(p) + len(q) - 1)
+    i = 0
+    while i < len(p):
+        if p[i][0] != 0:
+            j = 0
+            while j < len(q):
+                out[i + j] = _q_add(out[i + j], _q_mul(p[i], q[j]))
+                j += 1
+        i += 1
+    return _qp_trim(out)
+
+def _qp_divmod(p, d):
+    # p = quot*d + rem, deg rem < deg d (d not zero)
+    rem = list(p)
+    nd = len(d) - 1
+    if len(rem) - 1 < nd:
+        return [Q_ZERO], _qp_trim(rem)
+    quot = [Q_ZERO] * (len(rem) - nd)
+    k = len(rem) - 1
+    while k >= nd:
+        c = _q_div(rem[k], d[nd])
+        quot[k - nd] = c
+        if c[0] != 0:
+            j = 0
+            while j <= nd:
+                rem[k - nd + j] = _q_sub(rem[k - nd + j], _q_mul(c, d[j]))
+                j += 1
+        k -= 1
+    return _qp_trim(quot), _qp_trim(rem[:max(nd, 1)])
+
+def _qp_monic(p):
+    lead = p[-1]
+    return [_q_div(c, lead) for c in p]
+
+def _qp_gcd(p, q):
+    # Monic greatest common divisor (Euclid)
+    while not _qp_is_zero(q):
+        p, q = q, _qp_divmod(p, q)[1]
+    if _qp_is_zero(p):
+        return [Q_ONE]
+    return _qp_monic(p)
+
+def _qp_from_ast(node):
+    # Exact coefficients of a polynomial AST, or None
+    polys = {}
+    for n in _postorder(node):
+        t = n["t"]
+        p = None
+        if t == "num":
+            p = [n["q"]]
+        elif t == "var":
+            p = [Q_ZERO, Q_ONE]
+        elif t == "un":
+            a = polys[id(n["a"])]
+            if a is not None:
+                p = [_q_neg(c) for c in a]
+        elif t == "bin":
+            a = polys[id(n["a"])]
+            b = polys[id(n["b"])]
+            op = n["op"]
+            if a is None or b is None:
+                p = None
+            elif op == "+" or op == "-":
+                p = _qp_add(a, b, op)
+            elif op == "*":
+                p = _qp_mul(a, b)
+            elif op == "/":
+                if len(b) == 1 and b[0][0] != 0:
+                    p = [_q_div(c, b[0]) for c in a]
+            elif len(b) == 1 and b[0][1] == 1 and b[0][0] >= 0:
+                e = b[0][0]
+                if (len(a) - 1) * e <= _POLY_MAX_DEGREE:
+                    p = [Q_ONE]
+                    while e > 0:
+                        p = _qp_mul(p, a)
+                        e -= 1
+        polys[id(n)] = p
+    return polys[id(node)]
+
+def _qp_to_node(p):
+    # c0 + c1*x + ... as an AST (highest power first)
+    node = None
+    k = len(p) - 1
+    while k >= 0:
+        c = p[k]
+        if c[0] != 0 or (node is None and k == 0):
+            if k == 0:
+                term = N_rat(c)
+            else:
+                term = N_var()
+                if k > 1:
+                    term = N_bin("^", term, N_rat((k, 1)))
+                if c != Q_ONE:
+                    term = N_bin("*", N_rat(c), term)
+            if node is None:
+                node = term
+            else:
+                node = N_bin("+", node, term)
+        k -= 1
+    return _simplify_ast(node)
+
+def _qp_to_str(p):
+    return _to_str(_qp_to_node(p))
+
+def _paren_sum(s):
+    # "x+1" -> "(x+1)" for use as a factor
+    i = 1
+    while i < len(s):
+        if s[i] == "+" or s[i] == "-":
+            return "(" + s + ")"
+        i += 1
+    return s
+
+def _root_factor_str(a, k):
+    # (x - a)^k
+    if a[0] == 0:
+        s = "x"
+    elif a[0] > 0:
+        s = "(x-" + _q_str(a) + ")"
+    else:
+        s = "(x+" + _q_str(_q_neg(a)) + ")"
+    if k > 1:
+        s += "^" + str(k)
+    return s
+
+def _factor_str(p, a):
+    # p as (x - a)^k * rest, for the factor step
+    k = 0
+    lin = [_q_neg(a), Q_ONE]
+    while len(p) > 1:
+        quot, rem = _qp_divmod(p, lin)
+        if not _qp_is_zero(rem):
+            break
+        p = quot
+        k += 1
+    if k == 0:
+        return _paren_sum(_qp_to_str(p))
+    s = _root_factor_str(a, k)
+    if len(p) > 1 or p[0] != Q_ONE:
+        s += "*" + _paren_sum(_qp_to_str(p))
+    return s
+
+def _times_str(factor, p):
+    # "factor*(p)", or just factor when p is 1
+    if len(p) == 1 and p[0] == Q_ONE:
+        return factor
+    return factor + "*" + _paren_sum(_qp_to_str(p))
+
+def _sqrt_binomial(node):
+    """
+    u + v or u - v where u or v is sqrt(P) and the other is a polynomial
+    or another sqrt: returns (conjugate node, u^2 - v^2), else None.
+    """
+    if node["t"] != "bin" or (node["op"] != "+" and node["op"] != "-"):
+        return None
+    squares = []
+    has_root = False
+    for side in (node["a"], node["b"]):
+        if side["t"] == "fun" and side["fn"] == "sqrt":
+            sq = _qp_from_ast(side["a"])
+            has_root = True
+        else:
+            sq = _qp_from_ast(side)
+            if sq is not None:
+                sq = _qp_mul(sq, sq)
+        if sq is None:
+            return None
+        squares.append(sq)
+    if not has_root:
+        return None
+    flip = "+"
+    if node["op"] == "+":
+        flip = "-"
+    return N_bin(flip, node["a"], node["b"]), _qp_add(squares[0], squares[1], "-")
+
+def algebraic_limit_result(expr, a):
+    """
+    lim x->a of a quotient by conjugates, factoring and cancelling.
+    Returns a dict:
+    - error: None, "tokenize", "parse", "point" (a is not rational)
+      or "form" (not a quotient of polynomials / sqrt binomials)
+    - limit: exact rational or float, None if infinite/DNE
+    - inf: None, "+inf", "-inf" or "DNE"
+    - text: the answer as written
+    - form: "0/0" when substitution first gives 0/0, else None
+    - simplified: the cancelled expression as a string
+    - steps: hand steps, in order
+    """
+    res = {"error": None, "limit": None, "inf": None, "text": None,
+           "form": None, "simplified": None, "steps": []}
+    steps = res["steps"]
+
+    e = _expr_entry(expr)
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+    f = _entry_ast(e)
+    if f is None:
+        res["error"] = "parse"
+        return res
+
+    a = _limit_point(a)
+    if not isinstance(a, tuple):
+        res["error"] = "point"
+        return res
+    a_str = _q_str(a)
+
+    if f["t"] != "bin" or f["op"] != "/":
+        v = _m_eval(f, a)
+        if v is None:
+            res["error"] = "form"
+            return res
+        res["limit"] = v
+        res["text"] = _limit_text(f, a, v)
+        res["simplified"] = _to_str(f)
+        steps.append("Substitute x = " + a_str + ": f(" + a_str + ") = " + res["text"])
+        return res
+    top = f["a"]
+    bot = f["b"]
+
+    vt = _m_eval(top, a)
+    vb = _m_eval(bot, a)
+    if vt is None or vb is None:
+        res["error"] = "form"
+        return res
+    steps.append("Substitute x = " + a_str + ": top = " + _m_str(vt) + ", bottom = " + _m_str(vb))
+    if not (_m_zero(vt) and _m_zero(vb)):
+        if not _m_zero(vb):
+            v = _m_binop("/", vt, vb)
+            res["limit"] = v
+            res["text"] = _limit_text(f, a, v)
+        else:
+            res["inf"] = _infinite_limit(f, a)
+            res["text"] = res["inf"]
+        res["simplified"] = _to_str(f)
+        steps.append("Limit = " + res["text"])
+        return res
+    res["form"] = "0/0"
+    steps[-1] += " (0/0)"
+
+    # Rationalize: (u - v)(u + v) = u^2 - v^2
+    extra_top = None
+    extra_bot = None
+    tp = _qp_from_ast(top)
+    bp = _qp_from_ast(bot)
+    if tp is None:
+        conj = _sqrt_binomial(top)
+        if conj is not None:
+            extra_bot, tp = conj
+            steps.append("Multiply top and bottom by the conjugate " + _to_str(extra_bot))
+            steps.append("Top: (" + _to_str(top) + ")*(" + _to_str(extra_bot) + ") = "
+                         + _qp_to_str(tp))
+    if bp is None:
+        conj = _sqrt_binomial(bot)
+        if conj is not None:
+            extra_top, bp = conj
+            steps.append("Multiply top and bottom by the conjugate " + _to_str(extra_top))
+            steps.append("Bottom: (" + _to_str(bot) + ")*(" + _to_str(extra_top) + ") = "
+                         + _qp_to_str(bp))
+    if tp is None or bp is None or _qp_is_zero(bp):
+        res["error"] = "form"
+        return res
+
+    # Factor and cancel the common polynomial factor
+    g = _qp_gcd(tp, bp)
+    if len(g) > 1:
+        tq = _qp_divmod(tp, g)[0]
+        bq = _qp_divmod(bp, g)[0]
+        gs = _factor_str(g, a)
+        for (name, p, q) in (("top", tp, tq), ("bottom", bp, bq)):
+            ps = _qp_to_str(p)
+            fs = _times_str(gs, q)
+            # skip "x-3 = (x-3)"
+            if fs != ps and fs != "(" + ps + ")":
+                steps.append("Factor " + name + ": " + ps + " = " + fs)
+        steps.append("Cancel " + gs)
+        tp = tq
+        bp = bq
+
+    num = _qp_to_node(tp)
+    if extra_top is not None:
+        num = N_bin("*", num, extra_top)
+    den = _qp_to_node(bp)
+    if extra_bot is not None:
+        den = N_bin("*", den, extra_bot)
+    g_node = _simplify_ast(N_bin("/", num, den))
+    res["simplified"] = _to_str(g_node)
+    steps.append("Simplified: f(x) = " + res["simplified"])
+
+    vt = _m_eval(num, a)
+    vb = _m_eval(den, a)
+    if vt is None or vb is None:
+        res["error"] = "form"
+        return res
+    steps.append("Substitute x = " + a_str + ": top = " + _m_str(vt) + ", bottom = " + _m_str(vb))
+    if _m_zero(vb):
+        if _m_zero(vt):
+            res["error"] = "form"
+            return res
+        res["inf"] = _infinite_limit(g_node, a)
+        res["text"] = res["inf"]
+    else:
+        v = _m_binop("/", vt, vb)
+        res["limit"] = v
+        res["text"] = _limit_text(g_node, a, v)
+    steps.append("Limit = " + res["text"])
+    return res
+
+
+# ================================
+# Limits at Infinity
+# ================================
+
+# x -> +inf / -inf and sequences n -> inf. Rational functions compare
+# leading terms; anything else is rewritten with x = 1/t (x = -1/t) and
+# expanded as t -> 0+. Only then are values sampled at x = 2^k, and the
+# samples are sped up with Wynn's epsilon algorithm instead of probing
+# ever larger x (which overflows).
+
+_INF_SAMPLE_POWERS = 24     # x = 2^4 .. 2^(4+_INF_SAMPLE_POWERS-1)
+_INF_TOL = 1e-6
+
+def _inf_str(sign):
+    if sign > 0:
+        return "+inf"
+    return "-inf"
+
+def _name_to_var(root, name):
+    # root with every name node `name` replaced by x
+    done = {}
+    for n in _postorder(root):
+        t = n["t"]
+        if t == "name" and n["v"] == name:
+            r = N_var()
+        elif t == "un":
+            r = N_un(n["op"], done[id(n["a"])])
+        elif t == "fun":
+            r = N_fun(n["fn"], done[id(n["a"])])
+        elif t == "bin":
+            r = N_bin(n["op"], done[id(n["a"])], done[id(n["b"])])
+        else:
+            r = n
+        done[id(n)] = r
+    return done[id(root)]
+
+def _wynn(seq):
+    """
+    Wynn's epsilon algorithm: the last entry of the highest even column.
+    Its second column is Aitken's delta-squared.
+    """
+    prev = [0.0] * (len(seq) + 1)
+    cur = list(seq)
+    best = seq[-1]
+    k = 0
+    while len(cur) > 1:
+        nxt = []
+        i = 0
+        while i < len(cur) - 1:
+            d = cur[i + 1] - cur[i]
+            if d == 0:
+                if k % 2 == 0:
+                    return cur[i + 1]
+                return best
+            nxt.append(prev[i + 1] + 1.0 / d)
+            i += 1
+        prev = cur
+        cur = nxt
+        k += 1
+        if k % 2 == 0:
+            best = cur[-1]
+    return best
+
+def _accelerated_limit(f, xs):
+    """
+    Limit of f along the points xs (growing), or ("inf", sign) if the
+    values blow up. Returns (kind, value, samples) with kind "limit",
+    "inf" or None (no sign of settling down).
+    """
+    samples = []
+    for x in xs:
+        try:
+            y = f(x)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            continue
+        if isinstance(y, complex) or y != y or y in (float("inf"), float("-inf")):
+            continue
+        samples.append((x, y))
+    if len(samples) < 6:
+        return None, None, samples
+
+    ys = [y for (x, y) in samples]
+    last = ys[-4:]
+    growing = abs(last[-1]) > 1e6
+    i = 1
+    while growing and i < len(last):
+        if abs(last[i]) < 1.2 * abs(last[i - 1]) or (last[i] > 0) != (last[0] > 0):
+            growing = False
+        i += 1
+    if growing:
+        return "inf", 1 if last[-1] > 0 else -1, samples
+
+    # direction of the last few steps
+    steps = []
+    i = len(ys) - 6
+    while i < len(ys) - 1:
+        steps.append(ys[i + 1] - ys[i])
+        i += 1
+    up = True
+    down = True
+    for d in steps:
+        up = up and d > 0
+        down = down and d < 0
+
+    e1 = _wynn(ys)
+    e2 = _wynn(ys[:-1])
+    if abs(e1 - e2) <= _INF_TOL * max(1.0, abs(e1)):
+        # an increasing sequence cannot settle below its last value
+        # (Wynn maps a diverging geometric sequence to a false limit)
+        tol = _INF_TOL * max(1.0, abs(ys[-1]))
+        if not (up and e1 < ys[-1] - tol) and not (down and e1 > ys[-1] + tol):
+            if abs(e1) < _INF_TOL:
+                e1 = 0.0
+            return "limit", e1, samples
+
+    # slow but steady growth, like ln(x): same-sign steps that do not shrink
+    away = abs(ys[-1]) > abs(ys[-6]) and ((up and ys[-1] > 0) or (down and ys[-1] < 0))
+    if away and abs(steps[-1]) >= 0.9 * abs(steps[0]):
+        return "inf", 1 if up else -1, samples
+    return None, None, samples
+
+def _infinity_limit(f, sign, var, res, numeric_points):
+    # Shared work of limit_at_infinity_result / sequence_limit_result
+    steps = res["steps"]
+    to = var + " -> " + _inf_str(sign)
+    if var == "n":
+        to = "n -> inf"
+
+    top = f
+    bot = None
+    if f["t"] == "bin" and f["op"] == "/":
+        top = f["a"]
+        bot = f["b"]
+    tp = _qp_from_ast(top)
+    bp = [Q_ONE]
+    if bot is not None:
+        bp = _qp_from_ast(bot)
+
+    # Rational function: leading terms decide
+    if tp is not None and bp is not None and not _qp_is_zero(bp):
+        res["method"] = "rational"
+        dt = len(tp) - 1
+        db = len(bp) - 1
+        ct = tp[-1]
+        cb = bp[-1]
+        if _qp_is_zero(tp):
+            res["limit"] = Q_ZERO
+            res["text"] = "0"
+            steps.append("Limit = 0")
+            return res
+        lt = _qp_to_str([Q_ZERO] * dt + [ct]).replace("x", var)
+        lb = _qp_to_str([Q_ZERO] * db + [cb]).replace("x", var)
+        if bot is not None:
+            steps.append("Leading terms: top " + lt + ", bottom " + lb)
+            if db > 0:
+                k = var
+                if db > 1:
+                    k = var + "^" + str(db)
+                steps.append("Divide top and bottom by " + k)
+        else:
+            steps.append("Leading term: " + lt)
+        r = _q_div(ct, cb)
+        if dt < db:
+            res["limit"] = Q_ZERO
+            res["text"] = "0"
+            steps.append("Bottom has the higher power: " + to + " gives 0")
+        elif dt == db:
+            res["limit"] = r
+            res["text"] = _q_str(r)
+            steps.append("Same power: ratio of leading coefficients " + _q_str(r))
+        else:
+            s = 1 if r[0] > 0 else -1
+            if sign < 0 and (dt - db) % 2 == 1:
+                s = -s
+            res["inf"] = _inf_str(s)
+            res["text"] = res["inf"]
+            steps.append("Top has the higher power: " + to + " gives " + res["text"])
+        return res
+
+    # x = 1/t (x = -1/t for -inf), t -> 0+
+    t_of_x = N_bin("/", N_num("1"), N_var())
+    if sign < 0:
+        t_of_x = N_un("-", t_of_x)
+    g = _simplify_ast(_subst_var(f, t_of_x))
+    lead = _series_lead(g, Q_ZERO, True)
+    if lead is not None:
+        power, coef = lead
+        res["method"] = "series"
+        x_is = "1/t"
+        if sign < 0:
+            x_is = "-1/t"
+        term = _m_str(coef)
+        if power != 0:
+            tt = "t"
+            if power != 1:
+                tt = "t^" + _paren_if_compound(str(power))
+            term = _paren_if_compound(term) + "*" + tt
+        steps.append("Let " + var + " = " + x_is + ", t -> 0+: f = " + term + " + ...")
+        if power > 0:
+            res["limit"] = Q_ZERO
+            res["text"] = "0"
+        elif power == 0:
+            res["limit"] = coef
+            res["text"] = _m_str(coef)
+            if not isinstance(coef, tuple):
+                res["text"] = str(round(coef, 10))
+        else:
+            res["inf"] = _inf_str(1 if _m_float(coef) > 0 else -1)
+            res["text"] = res["inf"]
+        steps.append("Limit = " + res["text"])
+        return res
+
+    # Numeric: samples along x = 2^k, accelerated
+    if numeric_points is None:
+        res["error"] = "unknown"
+        return res
+    fx = _compile_ast(f)
+    if fx is None:
+        res["error"] = "unknown"
+        return res
+    runs = []
+    for xs in numeric_points:
+        kind, v, samples = _accelerated_limit(fx, xs)
+        if kind is None:
+            res["samples"] = samples
+            res["error"] = "unknown"
+            return res
+        runs.append((kind, v, samples))
+    kind, v, samples = runs[0]
+    res["samples"] = samples
+    res["method"] = "numeric"
+    for run in runs[1:]:
+        if kind == "inf":
+            same = run[0] == "inf" and run[1] == v
+        else:
+            same = run[0] == "limit" and abs(run[1] - v) <= 1e-4 * max(1.0, abs(v))
+        if not same:
+            # even and odd n settle differently, like (-1)^n
+            res["inf"] = "DNE"
+            res["text"] = "DNE"
+            steps.append("Even and odd terms approach different values")
+            steps.append("Limit = DNE")
+            return res
+
+    for (x, y) in samples[-3:]:
+        steps.append(var + " = " + _num_str(x) + ": f = " + str(round(y, 8)))
+    if kind == "inf":
+        res["inf"] = _inf_str(v)
+        res["text"] = res["inf"]
+        steps.append("Values keep growing: Limit = " + res["text"])
+    else:
+        res["limit"] = v
+        res["text"] = _num_str(round(v, 8))
+        steps.append("Wynn epsilon (accelerated) estimate: " + res["text"])
+    return res
+
+def _subst_var(root, repl):
+    # root with x replaced by the tree repl
+    done = {}
+    for n in _postorder(root):
+        t = n["t"]
+        if t == "var":
+            r = repl
+        elif t == "un":
+            r = N_un(n["op"], done[id(n["a"])])
+        elif t == "fun":
+            r = N_fun(n["fn"], done[id(n["a"])])
+        elif t == "bin":
+            r = N_bin(n["op"], done[id(n["a"])], done[id(n["b"])])
+        else:
+            r = n
+        done[id(n)] = r
+    return done[id(root)]
+
+def _inf_result():
+    return {"error": None, "limit": None, "inf": None, "text": None,
+            "method": None, "form": None, "rounds": 0, "steps": [], "samples": []}
+
+def limit_at_infinity_result(expr, sign):
+    """
+    lim x->+inf (sign > 0) or x->-inf (sign < 0) of f(x).
+    Same dict as limit_result, with method "rational", "series" or
+    "numeric" and samples: the (x, f(x)) points used by "numeric".
+    """
+    res = _inf_result()
+    e = _expr_entry(expr)
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+    f = _entry_ast(e)
+    if f is None:
+        res["error"] = "parse"
+        return res
+    xs = []
+    k = 4
+    while k < 4 + _INF_SAMPLE_POWERS:
+        xs.append(sign * 2.0 ** k)
+        k += 1
+    return _infinity_limit(f, sign, "x", res, [xs])
+
+def sequence_limit_result(expr):
+    """
+    lim n->inf of a sequence a_n written in n (like n/(2n+1) or (1+1/n)^n).
+    Same dict as limit_at_infinity_result. When sampled, even and odd n
+    are checked separately, so (-1)^n gives DNE.
+    """
+    res = _inf_result()
+    e = _expr_entry(expr)
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+    f = _entry_ast(e)
+    if f is None:
+        res["error"] = "parse"
+        return res
+    f = _name_to_var(f, "n")
+    evens = []
+    odds = []
+    k = 4
+    while k < 4 + _INF_SAMPLE_POWERS:
+        evens.append(2.0 ** k)
+        odds.append(2.0 ** k + 1.0)
+        k += 1
+    return _infinity_limit(f, 1, "n", res, [evens, odds])
+
+
+# ================================
+# Extended Precision
+# ================================
+
+# Differences like f(a+h) - f(a-h) cancel most of their digits. Values
+# come from the usual float evaluators; a second walk of the AST bounds
+# their rounding error. Only when that bound is too big for the answer
+# is the work redone in decimal arithmetic, at rising precision until two
+# precisions agree. The decimal module is imported on first use and is
+# missing on the handheld, where the float answer is kept.
+
+_EPS = 2.220446049250313e-16
+_PREC_DIGITS = 6          # decimals the tools show
+_PREC_REL = 1e-10         # enough for large values
+_DEC_PRECS = [30, 60, 120]
+
+_DEC = []
+_DEC_PI = {}
+_FUNC_SLOPES = {}
+
+def _decimal():
+    # the decimal module, or None where it is missing
+    if len(_DEC) == 0:
+        try:
+            import decimal
+            _DEC.append(decimal)
+        except ImportError:
+            _DEC.append(None)
+    return _DEC[0]
+
+def _precision_tol(scale):
+    # error allowed in a value that is printed after dividing by scale
+    return 0.5 * 10.0 ** -_PREC_DIGITS * scale
+
+def _func_slope(fn, u):
+    # |fn'(u)| from the rule table, None where it is undefined
+    if fn not in _FUNC_SLOPES:
+        _FUNC_SLOPES[fn] = _FUNCS[fn]["d"](N_var())
+    s = _m_eval(_FUNC_SLOPES[fn], u)
+    if s is None:
+        return None
+    return abs(_m_float(s))
+
+def _err_eval(node, x):
+    """
+    f(x) in floats with a running bound on its rounding error
+    (x itself counts as rounded). Returns (value, error), or None
+    where f is undefined.
+    """
+    vals = {}
+    try:
+        for n in _postorder(node):
+            t = n["t"]
+            if t == "num":
+                v = _m_float(n["q"])
+                e = 0.0
+                if n["q"][1] != 1:
+                    e = _EPS * abs(v)
+            elif t == "var":
+                v = x
+                e = _EPS * abs(x)
+            elif t == "name":
+                v = _CONST_VALUES[n["v"]]
+                e = _EPS * abs(v)
+            elif t == "un":
+                v, e = vals[id(n["a"])]
+                v = -v
+            elif t == "fun":
+                u, eu = vals[id(n["a"])]
+                if not _in_domain(n["fn"], u):
+                    raise ValueError("outside domain")
+                v = _FUNCS[n["fn"]]["f"](u)
+                e = _EPS * abs(v)
+                if eu > 0:
+                    s = _func_slope(n["fn"], u)
+                    if s is None:
+                        e = float("inf")
+                    else:
+                        e += s * eu
+            else:
+                a, ea = vals[id(n["a"])]
+                b, eb = vals[id(n["b"])]
+                op = n["op"]
+                v = _m_float(_m_binop(op, a, b))
+                if op == "+" or op == "-":
+                    e = ea + eb
+                elif op == "*":
+                    e = abs(a) * eb + abs(b) * ea
+                elif op == "/":
+                    e = (ea + abs(v) * eb) / abs(b)
+                else:
+                    e = 0.0
+                    if ea > 0:
+                        if a != 0:
+                            e += abs(b * v / a) * ea
+                        elif b > 0:
+                            e += ea ** b
+                        else:
+                            e = float("inf")
+                    if eb > 0 and a > 0:
+                        e += abs(v * math.log(a)) * eb
+                e += _EPS * abs(v)
+            vals[id(n)] = (v, e)
+    except (ValueError, ZeroDivisionError, OverflowError, KeyError, TypeError):
+        return None
+    return vals[id(node)]
+
+def _dec_atan_series(x, dec):
+    # atan(x) for small |x|: x - x^3/3 + x^5/5 - ...
+    eps = dec.Decimal(10) ** -(dec.getcontext().prec + 2)
+    x2 = x * x
+    term = x
+    total = x
+    k = 1
+    while abs(term) > eps:
+        term = -term * x2
+        total += term / (2 * k + 1)
+        k += 1
+    return total
+
+def _dec_pi(dec):
+    # pi = 16*atan(1/5) - 4*atan(1/239) (Machin), cached per precision
+    prec = dec.getcontext().prec
+    if prec not in _DEC_PI:
+        with dec.localcontext() as ctx:
+            ctx.prec = prec + 5
+            one = dec.Decimal(1)
+            p = 16 * _dec_atan_series(one / 5, dec) - 4 * _dec_atan_series(one / 239, dec)
+        _DEC_PI[prec] = +p
+    return _DEC_PI[prec]
+
+def _dec_atan(v, dec):
+    if v < 0:
+        return -_dec_atan(-v, dec)
+    if v > 1:
+        return _dec_pi(dec) / 2 - _dec_atan(1 / v, dec)
+    # halve the angle twice: atan(v) = 2*atan(v / (1 + sqrt(1 + v^2)))
+    k = 0
+    while k < 2:
+        v = v / (1 + (1 + v * v).sqrt())
+        k += 1
+    return 4 * _dec_atan_series(v, dec)
+
+def _dec_sincos(v, dec):
+    # (sin(v), cos(v)): reduce mod 2*pi, then both Taylor series at once
+    with dec.localcontext() as ctx:
+        ctx.prec += max(0, v.adjusted()) + 5
+        two_pi = 2 * _dec_pi(dec)
+        r = v - two_pi * (v / two_pi).to_integral_value()
+        eps = dec.Decimal(10) ** -ctx.prec
+        r2 = r * r
+        s = r
+        c = dec.Decimal(1)
+        st = r
+        ct = dec.Decimal(1)
+        k = 1
+        while abs(st) > eps or abs(ct) > eps:
+            ct = -ct * r2 / ((2 * k - 1) * (2 * k))
+            st = -st * r2 / ((2 * k) * (2 * k + 1))
+            c += ct
+            s += st
+            k += 1
+    return +s, +c
+
+def _dec_fun(fn, v, dec):
+    if not _in_domain(fn, v):
+        raise ValueError("outside domain of " + fn)
+    if fn == "sqrt":
+        r = v.sqrt()
+    elif fn == "exp":
+        r = v.exp()
+    elif fn == "ln":
+        r = v.ln()
+    elif fn == "log":
+        r = v.log10()
+    elif fn == "abs":
+        r = abs(v)
+    elif fn == "atan":
+        r = _dec_atan(v, dec)
+    elif fn == "asin" or fn == "acos":
+        if abs(v) == 1:
+            r = v * _dec_pi(dec) / 2
+        else:
+            r = _dec_atan(v / (1 - v * v).sqrt(), dec)
+        if fn == "acos":
+            r = _dec_pi(dec) / 2 - r
+    elif fn == "sinh" or fn == "cosh" or fn == "tanh":
+        ev = v.exp()
+        sh = (ev - 1 / ev) / 2
+        ch = (ev + 1 / ev) / 2
+        if fn == "sinh":
+            r = sh
+        elif fn == "cosh":
+            r = ch
+        else:
+            r = sh / ch
+    else:
+        s, c = _dec_sincos(v, dec)
+        if fn == "sin":
+            r = s
+        elif fn == "cos":
+            r = c
+        elif fn == "tan":
+            r = s / c
+        elif fn == "sec":
+            r = 1 / c
+        elif fn == "csc":
+            r = 1 / s
+        elif fn == "cot":
+            r = c / s
+        else:
+            raise ValueError("no decimal " + fn)
+    if not r.is_finite():
+        raise ValueError(fn + " overflow")
+    return r
+
+def _dec_eval(node, x, dec):
+    # Value of node at the Decimal x, in the current decimal context
+    vals = {}
+    for n in _postorder(node):
+        t = n["t"]
+        if t == "num":
+            v = dec.Decimal(n["q"][0]) / n["q"][1]
+        elif t == "var":
+            v = x
+        elif t == "name":
+            if n["v"] == "pi":
+                v = _dec_pi(dec)
+            else:
+                v = dec.Decimal(1).exp()
+        elif t == "un":
+            v = -vals[id(n["a"])]
+        elif t == "fun":
+            v = _dec_fun(n["fn"], vals[id(n["a"])], dec)
+        else:
+            a = vals[id(n["a"])]
+            b = vals[id(n["b"])]
+            op = n["op"]
+            if op == "+":
+                v = a + b
+            elif op == "-":
+                v = a - b
+            elif op == "*":
+                v = a * b
+            elif op == "/":
+                v = a / b
+            elif b == b.to_integral_value():
+                v = a ** int(b)
+            elif a > 0:
+                v = (b * a.ln()).exp()
+            elif a == 0 and b > 0:
+                v = dec.Decimal(0)
+            else:
+                raise ValueError("root of a negative number")
+        vals[id(n)] = v
+    return vals[id(node)]
+
+def _dec_sum(node, pts, tol):
+    # precise_sum in decimal arithmetic: (total, values) or None
+    dec = _decimal()
+    if dec is None:
+        return None
+    prev = None
+    for prec in _DEC_PRECS:
+        with dec.localcontext() as ctx:
+            ctx.prec = prec
+            try:
+                ys = []
+                total = dec.Decimal(0)
+                for (a, dx, w) in pts:
+                    # the point as typed: 0.1 + 0.0001, not its binary neighbour
+                    y = _dec_eval(node, dec.Decimal(repr(a)) + dec.Decimal(repr(dx)), dec)
+                    ys.append(y)
+                    total += dec.Decimal(repr(w)) * y
+            except (ArithmeticError, ValueError, KeyError):
+                return None
+            if prev is not None and abs(total - prev) <= tol:
+                return float(total), [float(y) for y in ys]
+        prev = total
+    return None
+
+def precise_sum(expr, pts, tol):
+    """
+    Sum of w*f(a+dx) over pts = [(a, dx, w), ...] to within about tol
+    (or 1e-10 relative, whichever is larger).
+    Returns (total, values, precise): values are the f(a+dx), precise is
+    True when decimal arithmetic was needed. None if f is undefined at
+    one of the points.
+    """
+    node = _entry_numeric_ast(_expr_entry(expr))
+    total = 0.0
+    values = []
+    err = 0.0
+    for (a, dx, w) in pts:
+        y = eval_expr(expr, a + dx)
+        if y is None:
+            return None
+        values.append(y)
+        total += w * y
+        if node is not None:
+            r = _err_eval(node, a + dx)
+            if r is not None:
+                err += abs(w) * r[1]
+    err += _EPS * abs(total) * len(pts)
 
-        # kill (1) factors
-        s = s.replace("*(1)", "")
-        s = s.replace("(1)*", "")
-        s = s.replace("*1", "")
-        s = s.replace("1*", "")
+    if node is None or err <= max(tol, _PREC_REL * abs(total)):
+        return total, values, False
 
-        # remove standalone +0 and -0 terms safely
-        s = _strip_standalone_zero_terms(s)
+    better = _dec_sum(node, pts, tol)
+    if better is None:
+        return total, values, False
+    return better[0], better[1], True
 
-        # collapse 0*something and something*0 (only the safe/common forms you emit)
-        s = s.replace("0*x", "0")
-        s = s.replace("x*0", "0")
-        s = s.replace("0*pi", "0")
-        s = s.replace("pi*0", "0")
-        s = s.replace("0*e", "0")
-        s = s.replace("e*0", "0")
 
-        # parenthesized versions your generator emits
-        s = s.replace("(0)*x", "0")
-        s = s.replace("x*(0)", "0")
-        s = s.replace("(0)*pi", "0")
-        s = s.replace("pi*(0)", "0")
+# ================================
+# Newton's Method
+# ================================
 
-        # clean double signs
-        s = s.replace("+-", "-")
-        s = s.replace("--", "+")
+# x_(n+1) = x_n - f(x_n)/f'(x_n): the zero of the tangent line
+# (linearization) at x_n. Every starting point advances one step per
+# round, all with the same compiled f and f' (f' from _d), so a problem
+# set with hundreds of starts parses and differentiates once.
 
-        # cosmetic: (x) -> x
-        s = s.replace("(x)", "x")
+_NEWTON_MAX_ITER = 40
+_NEWTON_TOL = 1e-12       # relative step size that counts as converged
+_NEWTON_BLOWUP = 1e12     # |x| beyond this counts as diverged
+_NEWTON_FLAT = 1e-14      # |f'(x)| below this: the tangent is flat
 
-        # SAFE exponent cosmetics (never do a global "^1" replace)
-        s = s.replace("x^1", "x")
-        s = s.replace("(x)^1", "x")
-        s = s.replace("x^0", "1")
+def _derivative_funcs(expr):
+    """
+    (f, df, d_text): compiled f and f' for the numeric tools. df is the
+    symbolic f' when _d handles f, else the difference quotient in
+    derivative_at (d_text is then None).
+    """
+    e = _expr_entry(expr)
+    f = _compiled_evaluator(expr)
+    if f is None:
+        f = lambda x: eval_expr(expr, x)
+    df = _compiled_derivative(expr)
+    d_text = None
+    if df is None:
+        df = lambda x: derivative_at(expr, x)
+    else:
+        d_text = _to_str(_entry_derivative(e)[0])
+    return f, df, d_text
 
-    return s
+def _real_at(g, x):
+    # g(x) as a real float, or None
+    try:
+        y = g(x)
+    except Exception:
+        return None
+    if y is None or isinstance(y, complex):
+        return None
+    if y != y or abs(y) == float("inf"):
+        return None
+    return y
 
-def _extract_chain_layers(node):
+def newton_result(expr, starts, max_iter=_NEWTON_MAX_ITER):
     """
-    Returns list of layers from OUTER to INNER.
-    Each layer is a tuple ("fun", fn) or ("pow", n_str)
-    Only extracts when it's a clean single chain (composition).
-    If expression is a sum/product at the top, returns [].
+    Newton's method from every start in starts.
+    Returns a dict:
+    - error: None, "tokenize" or "parse"
+    - d: printed f'(x) (None when f' is numeric)
+    - runs: one per start, in order: {"start", "status", "root",
+      "steps", "table"}; table rows are (n, x_n, f(x_n), f'(x_n))
+      status: "converged", "diverged", "flat" (f' = 0), "undefined",
+      "cycle" (x_n returns to an earlier value) or "slow" (max_iter used)
+    - roots: distinct roots found, sorted
     """
-    layers = []
-    cur = node
+    res = {"error": None, "d": None, "runs": [], "roots": []}
+    e = _expr_entry(expr)
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+    if _entry_ast(e) is None:
+        res["error"] = "parse"
+        return res
+
+    f, df, res["d"] = _derivative_funcs(expr)
+    # x -> (f(x), f'(x)); starts that meet on the same x share the work
+    seen = {}
+
+    runs = []
+    active = []
+    for x0 in starts:
+        runs.append({"start": x0, "status": None, "root": None,
+                     "steps": 0, "table": [], "x": float(x0)})
+        active.append(len(runs) - 1)
+
+    n = 0
+    while len(active) > 0 and n <= max_iter:
+        still = []
+        for i in active:
+            run = runs[i]
+            x = run["x"]
+            if x not in seen:
+                seen[x] = (_real_at(f, x), _real_at(df, x))
+            y, dy = seen[x]
+            run["table"].append((n, x, y, dy))
+
+            # a root first: abs(x) has no f' at its root 0
+            if y is not None and y == 0:
+                run["status"] = "converged"
+                continue
+            if y is None or dy is None:
+                run["status"] = "undefined"
+                continue
+            if abs(dy) < _NEWTON_FLAT:
+                # f' fading while |x_n| keeps growing (atan(x)) is running off
+                t = run["table"]
+                if n >= 2 and abs(x) > abs(t[n - 1][1]) > abs(t[n - 2][1]):
+                    run["status"] = "diverged"
+                else:
+                    run["status"] = "flat"
+                continue
+            if n == max_iter:
+                run["status"] = "slow"
+                continue
 
-    while True:
-        if cur is None:
-            return []
+            x1 = x - y / dy
+            run["x"] = x1
+            run["steps"] = n + 1
+            if abs(x1) > _NEWTON_BLOWUP:
+                run["status"] = "diverged"
+                run["table"].append((n + 1, x1, None, None))
+                continue
+            if abs(x1 - x) <= _NEWTON_TOL * max(1.0, abs(x)):
+                run["status"] = "converged"
+                run["table"].append((n + 1, x1, _real_at(f, x1), None))
+                continue
+            # 2-cycles (x^(1/3), some cubics) never settle
+            if n >= 1 and abs(x1 - run["table"][n - 1][1]) <= _NEWTON_TOL * max(1.0, abs(x1)):
+                run["status"] = "cycle"
+                continue
+            still.append(i)
+        active = still
+        n += 1
+
+    roots = []
+    for run in runs:
+        if run["status"] == "converged":
+            run["root"] = run["x"]
+            known = False
+            for r in roots:
+                if abs(r - run["x"]) <= 1e-9 * max(1.0, abs(r)):
+                    known = True
+                    break
+            if not known:
+                roots.append(run["x"])
+        del run["x"]
+    roots.sort()
+    res["runs"] = runs
+    res["roots"] = roots
+    return res
 
-        t = cur.get("t")
 
-        # Function layer: sin(u), ln(u), sqrt(u), exp(u), etc.
-        if t == "fun":
-            layers.append(("fun", cur.get("fn")))
-            cur = cur.get("a")
-            continue
+# ================================
+# Curve Sketching
+# ================================
 
-        # Power layer: (g)^n with numeric exponent
-        if t == "bin" and cur.get("op") == "^":
-            a = cur.get("a")
-            b = cur.get("b")
-            if b is not None and b.get("t") == "num":
-                layers.append(("pow", b.get("v")))
-                cur = a
-                continue
-            else:
-                return []
+# Everything a sketch needs from one grid of samples: f, f' and f''
+# (f' and f'' from _d, compiled once) are evaluated at each grid point
+# once, and every question (monotonicity, extrema, concavity, vertical
+# asymptotes) is answered from those arrays, refining between two grid
+# points only where a sign changes. Asymptotes at +-inf come from the
+# limits-at-infinity engine.
 
-        # Stop when no longer a clean single outer wrapper
-        break
+_CURVE_SAMPLES = 240
+_CURVE_TOUCH = 1e-12      # |g| at a dip this small counts as a zero
 
-    return layers
+def _bisect(g, a, b, ga):
+    # narrows a sign change of g on [a, b] (ga = g(a)); None if g breaks
+    k = 0
+    while k < 200:
+        m = 0.5 * (a + b)
+        if m <= a or m >= b:
+            break
+        gm = _real_at(g, m)
+        if gm is None:
+            return None
+        if gm == 0:
+            return m
+        if (gm < 0) == (ga < 0):
+            a = m
+            ga = gm
+        else:
+            b = m
+        k += 1
+    return 0.5 * (a + b)
 
-def _format_layer_apply(layer, inner_str):
-    kind = layer[0]
-    if kind == "fun":
-        fn = layer[1]
-        return fn + "(" + inner_str + ")"
-    if kind == "pow":
-        n = layer[1]
-        return "(" + inner_str + ")^" + n
-    return inner_str
+def _dip(g, a, b):
+    # where |g| is smallest on [a, b] (ternary search); None if g breaks
+    k = 0
+    while k < 100:
+        m1 = a + (b - a) / 3.0
+        m2 = b - (b - a) / 3.0
+        v1 = _real_at(g, m1)
+        v2 = _real_at(g, m2)
+        if v1 is None or v2 is None:
+            return None
+        if abs(v1) < abs(v2):
+            b = m2
+        else:
+            a = m1
+        k += 1
+    return 0.5 * (a + b)
 
-def _print_exam_chain_work(ast):
-    layers = _extract_chain_layers(ast)
+def _grid_zeros(g, xs, ys):
+    """
+    Zeros of g from its samples ys at xs (None where undefined): exact
+    hits, sign changes (bisected) and dips that touch 0 like x^2.
+    Sign changes across a pole are found too; callers filter them.
+    Runs of exact zeros are not zeros one by one (see _zero_runs).
+    """
+    out = []
+    n = len(xs)
+    i = 0
+    while i < n:
+        y = ys[i]
+        if y is None:
+            i += 1
+            continue
+        if y == 0:
+            if not ((i > 0 and ys[i - 1] == 0) or (i + 1 < n and ys[i + 1] == 0)):
+                out.append(xs[i])
+        elif i + 1 < n and ys[i + 1] is not None and ys[i + 1] != 0 and (y < 0) != (ys[i + 1] < 0):
+            c = _bisect(g, xs[i], xs[i + 1], y)
+            if c is not None:
+                out.append(c)
+        elif 0 < i < n - 1 and ys[i - 1] is not None and ys[i + 1] is not None:
+            if (ys[i - 1] < 0) == (y < 0) and (ys[i + 1] < 0) == (y < 0):
+                if abs(y) < abs(ys[i - 1]) and abs(y) <= abs(ys[i + 1]):
+                    c = _dip(g, xs[i - 1], xs[i + 1])
+                    if c is not None:
+                        v = _real_at(g, c)
+                        if v is not None and abs(v) < _CURVE_TOUCH:
+                            out.append(c)
+        i += 1
+    return out
 
-    if len(layers) == 0:
-        print("This one is not a single clean chain (has +, -, *, / at top).")
-        print("Use product/quotient rules plus chain rule where needed.")
-        return
+def _zero_runs(xs, ys):
+    # (a, b) for each run of two or more samples where g is exactly 0
+    out = []
+    n = len(xs)
+    i = 0
+    while i < n:
+        j = i
+        while j < n and ys[j] is not None and ys[j] == 0:
+            j += 1
+        if j - i >= 2:
+            out.append((xs[i], xs[j - 1]))
+        i = max(j, i + 1)
+    return out
 
-    # Build u_k (deepest) first
-    # inner-most expression:
-    # Walk down to get deepest node by re-traversing layers
-    cur = ast
+def _blows_up(f, c):
+    # True if |f| grows without bound as x -> c, from each side where f is defined
+    grows = False
+    for side in (1.0, -1.0):
+        ys = []
+        for d in (1e-4, 1e-8, 1e-12):
+            y = _real_at(f, c + side * d * max(1.0, abs(c)))
+            if y is None:
+                break
+            ys.append(abs(y))
+        if len(ys) < 3:
+            continue
+        # x^-1 grows by 1e4 per step, ln(x) by a constant step
+        if ys[2] > 10.0 and ys[2] > ys[1] > ys[0] and ys[2] - ys[1] >= 0.5 * (ys[1] - ys[0]):
+            grows = True
+        else:
+            return False
+    return grows
+
+def _singular_parts(node):
+    # sub-expressions whose zeros may be poles of node
+    out = []
+    for n in _postorder(node):
+        if n["t"] == "bin":
+            if n["op"] == "/":
+                out.append(n["b"])
+            elif n["op"] == "^" and n["b"]["t"] == "num" and n["b"]["q"][0] < 0:
+                out.append(n["a"])
+            elif n["op"] == "^" and n["b"]["t"] == "un" and n["b"]["a"]["t"] == "num":
+                out.append(n["a"])
+        elif n["t"] == "fun":
+            fn = n["fn"]
+            if fn == "ln" or fn == "log":
+                out.append(n["a"])
+            elif fn == "tan" or fn == "sec":
+                out.append(N_fun("cos", n["a"]))
+            elif fn == "cot" or fn == "csc":
+                out.append(N_fun("sin", n["a"]))
+    return out
+
+def _point_memo(g, xs, ys):
+    """
+    g through a dict x -> g(x) (real float or None), seeded with the
+    samples ys at xs, so no point is evaluated twice in one analysis.
+    """
+    memo = {}
     i = 0
-    while i < len(layers):
-        if cur.get("t") == "fun":
-            cur = cur.get("a")
-        elif cur.get("t") == "bin" and cur.get("op") == "^":
-            cur = cur.get("a")
+    while i < len(xs):
+        memo[xs[i]] = ys[i]
         i += 1
-        pause()
+    def at(x):
+        if x not in memo:
+            memo[x] = _real_at(g, x)
+        return memo[x]
+    return at
+
+def _near(v, vals):
+    for w in vals:
+        if abs(v - w) <= 1e-9 * max(1.0, abs(w)):
+            return True
+    return False
 
-    deepest_str = _to_str(cur)
+def _sign_intervals(f, g, cuts, xs, ys, lo, hi):
+    """
+    Splits [lo, hi] at cuts and reports the sign of g on each piece:
+    (a, b, "+" or "-"), from a sample inside (the midpoint if none).
+    Pieces where f or g is undefined are left out.
+    """
+    pts = [lo] + cuts + [hi]
+    out = []
+    j = 0
+    i = 0
+    while i + 1 < len(pts):
+        a = pts[i]
+        b = pts[i + 1]
+        y = None
+        while j < len(xs) and xs[j] <= a:
+            j += 1
+        k = j
+        best = None
+        while k < len(xs) and xs[k] < b:
+            if ys[k] is not None and ys[k] != 0:
+                if best is None or abs(xs[k] - 0.5 * (a + b)) < abs(xs[best] - 0.5 * (a + b)):
+                    best = k
+            k += 1
+        if best is not None:
+            y = ys[best]
+        elif b > a and _real_at(f, 0.5 * (a + b)) is not None:
+            y = _real_at(g, 0.5 * (a + b))
+        if y is not None and y != 0:
+            if y > 0:
+                out.append((a, b, "+"))
+            else:
+                out.append((a, b, "-"))
+        i += 1
+    return out
 
-    # Print variable chain
-    print("\n--- SHOW WORK (CHAIN OF VARIABLES) ---")
-    k = len(layers)
-    print("Let u" + str(k) + " = " + deepest_str)
-    pause()
+def _join_intervals(pieces, keep):
+    # joins neighbouring pieces with the same sign unless their cut is in keep
+    out = []
+    for p in pieces:
+        if len(out) > 0 and out[-1][2] == p[2] and out[-1][1] == p[0] and not _near(p[0], keep):
+            out[-1] = (out[-1][0], p[1], p[2])
+        else:
+            out.append(p)
+    return out
 
-    # Now build outward
-    # u_{k-1} = layer_{k-1}(u_k), ..., u0 = layer_0(u1)
-    idx = k - 1
-    while idx >= 0:
-        u_in = "u" + str(idx + 1)
-        u_out = "u" + str(idx)
-        expr_out = _format_layer_apply(layers[idx], u_in)
-        print("Let " + u_out + " = " + expr_out)
-        idx -= 1
-        pause()
+def curve_result(expr, lo, hi, n=_CURVE_SAMPLES):
+    """
+    One-pass curve analysis of f on [lo, hi].
+    Returns a dict:
+    - error: None, "tokenize", "parse" or "undefined" (no sample defined)
+    - d, d2: printed f'(x), f''(x) (None when numeric)
+    - domain: pieces (a, b) of [lo, hi] where f is defined
+    - critical: (x, f(x), kind) with kind "local max", "local min" or
+      "neither"
+    - flat: pieces (a, b) where every sample of f' is exactly 0 (f is
+      constant there, or f' underflows); no critical points inside
+    - increasing, decreasing, concave_up, concave_down: lists of (a, b)
+    - inflection: (x, f(x)) where f'' changes sign
+    - vertical: x values of vertical asymptotes in [lo, hi]
+    - horizontal: (side, text) with side "+inf" or "-inf"
+    - slant: (side, m_text, b_text) for y = m*x + b
+    - abs_max, abs_min: (x, f(x)) on [lo, hi], None when f is unbounded
+      or undefined somewhere on it
+    """
+    res = {"error": None, "d": None, "d2": None, "domain": [], "critical": [],
+           "flat": [], "increasing": [], "decreasing": [], "concave_up": [], "concave_down": [],
+           "inflection": [], "vertical": [], "horizontal": [], "slant": [],
+           "abs_max": None, "abs_min": None}
+    e = _expr_entry(expr)
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+    node = _entry_ast(e)
+    if node is None:
+        res["error"] = "parse"
+        return res
+
+    f, df, res["d"] = _derivative_funcs(expr)
+    if res["d"] is not None:
+        # f'' is the derivative of the printed f' (cached in the registry)
+        d2f = _derivative_funcs(res["d"])[1]
+        res["d2"] = _to_str(_entry_derivative(_expr_entry(res["d"]))[0])
+    else:
+        d2f = lambda x: derivative_at(expr, x + 1e-4) - derivative_at(expr, x - 1e-4)
 
-    print("Then y = u0")
+    # the shared samples
+    xs = []
+    fs = []
+    d1 = []
+    d2 = []
+    i = 0
+    while i <= n:
+        x = lo + (hi - lo) * i / float(n)
+        xs.append(x)
+        y = _real_at(f, x)
+        fs.append(y)
+        if y is None:
+            d1.append(None)
+            d2.append(None)
+        else:
+            d1.append(_real_at(df, x))
+            d2.append(_real_at(d2f, x))
+        i += 1
+    # f again at samples, edges, critical points and extrema: from the memo
+    f = _point_memo(f, xs, fs)
 
-    # Leibniz derivatives
-    print("\n--- LEIBNIZ FACTORS ---")
-    idx = 0
-    while idx < k:
-        layer = layers[idx]
-        if layer[0] == "fun":
-            fn = layer[1]
-            if fn == "sin":
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = cos(u" + str(idx + 1) + ")")
-            elif fn == "cos":
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = -sin(u" + str(idx + 1) + ")")
-            elif fn == "tan":
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = 1/(cos(u" + str(idx + 1) + ")^2)")
-            elif fn == "ln":
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = 1/u" + str(idx + 1))
-            elif fn == "sqrt":
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = 1/(2*sqrt(u" + str(idx + 1) + "))")
-            elif fn == "exp":
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = exp(u" + str(idx + 1) + ")")
-            else:
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = (unsupported)")
-        elif layer[0] == "pow":
-            n = layer[1]
-            if _is_int_str(n):
-                nm1 = _int_str_dec(n)
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = " + n + "*(u" + str(idx + 1) + "^" + nm1 + ")")
-            else:
-                print("du" + str(idx) + "/du" + str(idx + 1) + " = " + n + "*(u" + str(idx + 1) + "^(" + n + "-1))")
+    # domain pieces, edges narrowed between samples
+    i = 0
+    while i <= n:
+        if fs[i] is None:
+            i += 1
+            continue
+        a = xs[i]
+        if i > 0:
+            a = _domain_edge(f, xs[i - 1], xs[i])
+        while i + 1 <= n and fs[i + 1] is not None:
+            i += 1
+        b = xs[i]
+        if i < n:
+            b = _domain_edge(f, xs[i + 1], xs[i])
+        res["domain"].append((a, b))
+        i += 1
+    if len(res["domain"]) == 0:
+        res["error"] = "undefined"
+        return res
+
+    # vertical asymptotes: zeros of denominators, log arguments, cos in tan, ...
+    vertical = []
+    for g_node in _singular_parts(node):
+        g = _compile_ast(g_node)
+        if g is None:
+            continue
+        gs = [_real_at(g, x) for x in xs]
+        for c in _grid_zeros(g, xs, gs):
+            if lo <= c <= hi and not _near(c, vertical) and _blows_up(f, c):
+                vertical.append(c)
+    vertical.sort()
+    res["vertical"] = vertical
+    # a domain edge at an asymptote is the asymptote
+    dom = []
+    for (a, b) in res["domain"]:
+        for c in vertical:
+            if _near(a, [c]):
+                a = c
+            if _near(b, [c]):
+                b = c
+        dom.append((a, b))
+    res["domain"] = dom
+
+    # cuts every interval list shares: asymptotes and gaps in the domain
+    breaks = list(vertical)
+    for (a, b) in res["domain"]:
+        for v in (a, b):
+            if lo < v < hi and not _near(v, breaks):
+                breaks.append(v)
+
+    # critical points: f' = 0 or f' undefined where f is defined;
+    # a run of f' = 0 samples is one flat piece, not a point per sample
+    res["flat"] = _zero_runs(xs, d1)
+    crit = []
+    for c in _grid_zeros(df, xs, d1):
+        if not _near(c, breaks) and not _near(c, crit) and _real_at(f, c) is not None and not _blows_up(f, c):
+            crit.append(c)
+    i = 0
+    while i <= n:
+        if fs[i] is not None and d1[i] is None and lo < xs[i] < hi and not _near(xs[i], crit + breaks):
+            crit.append(xs[i])
+        i += 1
+    crit.sort()
+
+    cuts = sorted(crit + breaks)
+    mono = _sign_intervals(f, df, cuts, xs, d1, lo, hi)
+    for c in crit:
+        left = None
+        right = None
+        for (a, b, sg) in mono:
+            if _near(b, [c]):
+                left = sg
+            if _near(a, [c]):
+                right = sg
+        kind = "neither"
+        if left == "+" and right == "-":
+            kind = "local max"
+        elif left == "-" and right == "+":
+            kind = "local min"
+        res["critical"].append((c, _real_at(f, c), kind))
+    for (a, b, sg) in _join_intervals(mono, breaks):
+        if sg == "+":
+            res["increasing"].append((a, b))
+        else:
+            res["decreasing"].append((a, b))
+
+    # concavity and inflection points from f''
+    infl = []
+    for c in _grid_zeros(d2f, xs, d2):
+        if not _near(c, breaks) and not _near(c, infl) and _real_at(f, c) is not None and not _blows_up(f, c):
+            infl.append(c)
+    infl.sort()
+    conc = _sign_intervals(f, d2f, sorted(infl + breaks), xs, d2, lo, hi)
+    for c in infl:
+        signs = []
+        for (a, b, sg) in conc:
+            if _near(b, [c]) or _near(a, [c]):
+                signs.append(sg)
+        if len(signs) == 2 and signs[0] != signs[1]:
+            res["inflection"].append((c, _real_at(f, c)))
+    for (a, b, sg) in _join_intervals(conc, breaks):
+        if sg == "+":
+            res["concave_up"].append((a, b))
+        else:
+            res["concave_down"].append((a, b))
+
+    # absolute extrema need f bounded on one closed piece of domain
+    ends = res["domain"][0]
+    closed = _real_at(f, ends[0]) is not None and _real_at(f, ends[1]) is not None
+    if len(vertical) == 0 and len(res["domain"]) == 1 and closed:
+        best_hi = None
+        best_lo = None
+        for x in list(res["domain"][0]) + crit:
+            y = _real_at(f, x)
+            if y is None:
+                continue
+            if best_hi is None or y > best_hi[1]:
+                best_hi = (x, y)
+            if best_lo is None or y < best_lo[1]:
+                best_lo = (x, y)
+        res["abs_max"] = best_hi
+        res["abs_min"] = best_lo
+
+    # horizontal asymptotes, else slant ones y = m*x + b
+    for sign in (1, -1):
+        side = _inf_str(sign)
+        r = limit_at_infinity_result(expr, sign)
+        if r["limit"] is not None:
+            res["horizontal"].append((side, r["text"]))
+        elif r["inf"] == "+inf" or r["inf"] == "-inf":
+            m = limit_at_infinity_result("(" + expr + ")/x", sign)
+            if m["limit"] is not None and not _m_zero(m["limit"]):
+                b = limit_at_infinity_result("(" + expr + ")-(" + m["text"] + ")*x", sign)
+                if b["limit"] is not None:
+                    res["slant"].append((side, m["text"], b["text"]))
+    return res
+
+def _domain_edge(f, out_x, in_x):
+    # boundary of f's domain between an undefined and a defined point
+    k = 0
+    while k < 200:
+        m = 0.5 * (out_x + in_x)
+        if m == out_x or m == in_x:
+            break
+        if _real_at(f, m) is None:
+            out_x = m
+        else:
+            in_x = m
+        k += 1
+    return _snap_edge(in_x)
 
-        pause()
-        idx += 1
+def _snap_edge(x):
+    # x with the fewest decimals within 1e-10 (relative): a bisected edge
+    # like 5.2e-63 or 1.9999999999999998 is really 0 or 2
+    tol = 1e-10 * max(1.0, abs(x))
+    k = 0
+    while k <= 15:
+        r = round(x, k)
+        if abs(r - x) <= tol:
+            return r + 0.0    # no -0.0
+        k += 1
+    return x
 
-    # Last derivative du_k/dx
-    print("du" + str(k) + "/dx = d/dx(" + deepest_str + ")")
-    print("du" + str(k) + "/dx = " + _to_str(_d(cur, [])))
 
-    print("\nMultiply:")
-    print("dy/dx = (du0/du1)(du1/du2)...(duk/dx)\n")
+# ================================
+# Worksheets
+# ================================
+
+# A tool's result as data, built by the *_worksheet functions:
+#   {"tool": name, "values": {...}, "pages": [page, ...]}
+# values holds the numbers a caller needs; pages is the paper-ready text,
+# one list of lines per screen (a pause() sits between pages).
+# A line is a tuple of parts, only joined when the worksheet is shown:
+#   "text"          literal
+#   ("r", v, nd)    str(round(v, nd))
+#   ("x", expr, v)  expr with x replaced by v (_subst_x_text)
+#   anything else   str(part)
+
+def _ws_new(tool):
+    return {"tool": tool, "values": {}, "pages": [[]]}
+
+def _ws_line(ws, *parts):
+    ws["pages"][-1].append(parts)
+
+def _ws_pause(ws):
+    ws["pages"].append([])
+
+def _ws_part_str(part):
+    if isinstance(part, str):
+        return part
+    if isinstance(part, tuple):
+        if part[0] == "r":
+            return str(round(part[1], part[2]))
+        if part[0] == "x":
+            v = str(part[2])
+            if v[:1] == "-":
+                v = "(" + v + ")"
+            return _subst_x_text(part[1], v)
+    return str(part)
+
+def worksheet_text(ws):
+    # Pages as lists of formatted lines
+    pages = []
+    for page in ws["pages"]:
+        lines = []
+        for line in page:
+            lines.append("".join([_ws_part_str(p) for p in line]))
+        pages.append(lines)
+    return pages
+
+def show_worksheet(ws):
+    pages = worksheet_text(ws)
+    i = 0
+    while i < len(pages):
+        for line in pages[i]:
+            print(line)
+        if i < len(pages) - 1:
+            pause()
+        i += 1
 
 
 # ================================
@@ -1324,6 +5881,8 @@ def _self_check():
         "eval_expr",
         "derivative_definition_guided",
         "chain_rule_tool",
+        "implicit_tool",
+        "show_worksheet",
         "_normalize_expr_for_symbolic",
         "_tokenize",
         "_Parser",
@@ -1401,272 +5960,694 @@ def limit_from_graph_guide():
 
     pause()
 
-def limit_tool():
-    print("\nLIMIT: lim x->a")
-    expr = input("Enter expression in x: ")
-
-    try:
-        a = float(input("Enter a: "))
-    except:
-        print("Invalid a.")
-        pause()
-        return
-
+def limit_samples(expr, a):
+    """
+    Samples f(a - dx) and f(a + dx) for decreasing dx.
+    Returns (left_vals, right_vals), each a list of (dx, y) pairs.
+    Undefined or huge values are skipped.
+    """
     dx_values = [0.1, 0.01, 0.001, 0.0001]
+    tol = _precision_tol(1.0)
 
     left_vals = []
     right_vals = []
 
     for dx in dx_values:
-        xl = a - dx
-        xr = a + dx
-
-        yl = eval_expr(expr, xl)
-        yr = eval_expr(expr, xr)
+        # each value good to the 6 decimals shown (see precise_sum)
+        yl = precise_sum(expr, [(a, -dx, 1.0)], tol)
+        yr = precise_sum(expr, [(a, dx, 1.0)], tol)
+        if yl is not None:
+            yl = yl[0]
+        if yr is not None:
+            yr = yr[0]
 
         if yl is not None and abs(yl) < 1e10:
             left_vals.append((dx, yl))
         if yr is not None and abs(yr) < 1e10:
             right_vals.append((dx, yr))
 
-    print("\n--- STEP-BY-STEP ---")
-    print("Step 1: f(x) =", expr)
-    print("Step 2: x approaches", a)
+    return left_vals, right_vals
+
+def limit_worksheet(expr, a):
+    """
+    Numeric estimate of lim x->a f(x).
+    values: left, right (samples), side ("both", "left", "right" or
+    None when undefined near a), L, R (closest values), limit (None
+    for DNE) and diverges ("+inf", "-inf" or None).
+    """
+    if a == float("inf") or a == float("-inf"):
+        return infinity_limit_worksheet(expr, 1 if a > 0 else -1)
+
+    left_vals, right_vals = limit_samples(expr, a)
+
+    ws = _ws_new("limit")
+    v = ws["values"]
+    v["left"] = left_vals
+    v["right"] = right_vals
+    v["side"] = None
+    v["L"] = None
+    v["R"] = None
+    v["limit"] = None
+    v["diverges"] = None
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr)
+    _ws_line(ws, "Step 2: x approaches ", a)
 
     if len(left_vals) == 0 and len(right_vals) > 0:
-        print("\nStep 3: Function is undefined on the LEFT of a.")
-        print("This suggests a RIGHT-HAND limit.")
-        print("Consider evaluating lim x->a+.")
-        pause()
-        return
-    
-    if len(right_vals) == 0 and len(left_vals) > 0:
-        print("\nStep 3: Function is undefined on the RIGHT of a.")
-        print("This suggests a LEFT-HAND limit.")
-        print("Consider evaluating lim x->a-.")
-        pause()
-        return
-    
-    if len(left_vals) == 0 and len(right_vals) == 0:
-        print("\nStep 3: Function is undefined on BOTH sides of a.")
-        print("Conclusion: Cannot estimate this limit.")
-        pause()
-        return
+        v["side"] = "right"
+        _ws_line(ws, "\nStep 3: Function is undefined on the LEFT of a.")
+        _ws_line(ws, "This suggests a RIGHT-HAND limit.")
+        _ws_line(ws, "Consider evaluating lim x->a+.")
+        _ws_pause(ws)
+        return ws
 
+    if len(right_vals) == 0 and len(left_vals) > 0:
+        v["side"] = "left"
+        _ws_line(ws, "\nStep 3: Function is undefined on the RIGHT of a.")
+        _ws_line(ws, "This suggests a LEFT-HAND limit.")
+        _ws_line(ws, "Consider evaluating lim x->a-.")
+        _ws_pause(ws)
+        return ws
 
+    if len(left_vals) == 0 and len(right_vals) == 0:
+        _ws_line(ws, "\nStep 3: Function is undefined on BOTH sides of a.")
+        _ws_line(ws, "Conclusion: Cannot estimate this limit.")
+        _ws_pause(ws)
+        return ws
 
     # Use closest dx that worked
     Ldx, L = left_vals[-1][0], left_vals[-1][1]
     Rdx, R = right_vals[-1][0], right_vals[-1][1]
+    v["side"] = "both"
+    v["L"] = L
+    v["R"] = R
 
-    print("\nStep 3: Closest checks")
-    print("Left : x =", a - Ldx, " f(x) =", round(L, 6))
-    print("Right: x =", a + Rdx, " f(x) =", round(R, 6))
-    pause()
+    _ws_line(ws, "\nStep 3: Closest checks")
+    _ws_line(ws, "Left : x = ", a - Ldx, "  f(x) = ", ("r", L, 6))
+    _ws_line(ws, "Right: x = ", a + Rdx, "  f(x) = ", ("r", R, 6))
+    _ws_pause(ws)
 
     # Paper-ready work lines
-    print("\nWRITE THIS:")
+    _ws_line(ws, "\nWRITE THIS:")
 
-    print("Let dx = " + str(Ldx) + " (left) and dx = " + str(Rdx) + " (right)")
-    print("Left-hand:  f(a - dx) = f(" + str(round(a - Ldx, 6)) + ") approx " + str(round(L, 6)))
-    print("Right-hand: f(a + dx) = f(" + str(round(a + Rdx, 6)) + ") approx " + str(round(R, 6)))
+    _ws_line(ws, "Let dx = ", Ldx, " (left) and dx = ", Rdx, " (right)")
+    _ws_line(ws, "Left-hand:  f(a - dx) = f(", ("r", a - Ldx, 6), ") approx ", ("r", L, 6))
+    _ws_line(ws, "Right-hand: f(a + dx) = f(", ("r", a + Rdx, 6), ") approx ", ("r", R, 6))
 
     if abs(L - R) < 0.05:
         limit_val = (L + R) / 2.0
-        print("Since left approx right, the limit exists.")
-        print("lim x->" + str(a) + " f(x) approx " + str(round(limit_val, 6)))
+        _ws_line(ws, "Since left approx right, the limit exists.")
+        _ws_line(ws, "lim x->", a, " f(x) approx ", ("r", limit_val, 6))
     else:
-        print("Since left != right, the limit does not exist (DNE).")
-    pause()
-
-
+        _ws_line(ws, "Since left != right, the limit does not exist (DNE).")
+    _ws_pause(ws)
 
     BIG = 1e6
-    print("\nStep 4: Conclusion")
+    _ws_line(ws, "\nStep 4: Conclusion")
 
     if abs(L) > BIG and abs(R) > BIG:
         if L > 0 and R > 0:
-            print("Limit diverges to +infinity (DNE).")
+            v["diverges"] = "+inf"
+            _ws_line(ws, "Limit diverges to +infinity (DNE).")
         elif L < 0 and R < 0:
-            print("Limit diverges to -infinity (DNE).")
+            v["diverges"] = "-inf"
+            _ws_line(ws, "Limit diverges to -infinity (DNE).")
         else:
-            print("Left and right behaviors differ (DNE).")
+            _ws_line(ws, "Left and right behaviors differ (DNE).")
 
     elif abs(L - R) < 0.05:
         limit_val = (L + R) / 2.0
-        print("Limit exists.")
-        print("lim x->", a, "=", round(limit_val, 6))
+        v["limit"] = limit_val
+        _ws_line(ws, "Limit exists.")
+        _ws_line(ws, "lim x-> ", a, " = ", ("r", limit_val, 6))
 
     else:
-        print("Left and right do not match closely (DNE).")
+        _ws_line(ws, "Left and right do not match closely (DNE).")
+
+    _ws_pause(ws)
+    return ws
+
+def _infinity_worksheet(tool, res, expr, var, to):
+    # Shared layout of infinity_limit_worksheet / sequence_limit_worksheet
+    ws = _ws_new(tool)
+    value = None
+    if res["limit"] is not None:
+        value = _m_float(res["limit"])
+    ws["values"] = {"error": res["error"], "text": res["text"], "value": value,
+                    "inf": res["inf"], "method": res["method"],
+                    "steps": res["steps"], "samples": res["samples"]}
+
+    if res["error"] == "tokenize":
+        _ws_line(ws, "Tokenizer failed. Check your input.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "parse":
+        _ws_line(ws, "Parse failed. Check parentheses and spelling.")
+        _ws_pause(ws)
+        return ws
+
+    name = "f(x)"
+    if var == "n":
+        name = "a_n"
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: ", name, " = ", expr)
+    _ws_line(ws, "Step 2: ", to)
+
+    if res["error"] == "unknown":
+        _ws_line(ws, "Could not find this limit.")
+        _ws_line(ws, "Values do not settle (they may oscillate).")
+        _ws_pause(ws)
+        return ws
+
+    steps = res["steps"]
+    i = 0
+    while i < len(steps):
+        _ws_line(ws, str(i + 3), ") ", steps[i])
+        i += 1
+    _ws_pause(ws)
 
-    pause()
+    _ws_line(ws, "\nWRITE THIS:")
+    if res["method"] == "rational":
+        _ws_line(ws, "Divide top and bottom by the highest power of ", var, " in the bottom")
+    elif res["method"] == "series":
+        _ws_line(ws, "Substitute ", var, " = 1/t and let t -> 0+")
+    else:
+        _ws_line(ws, "Values at ", var, " = 2^k, sped up with Wynn's epsilon method")
+    _ws_line(ws, "lim ", to, " ", name, " = ", res["text"])
+    if value is not None and var == "x":
+        _ws_line(ws, "Horizontal asymptote: y = ", res["text"])
 
-def velocity_tool():
-    print("\nVELOCITY / INSTANTANEOUS RATE OF CHANGE")
-    print("Definition: lim h->0 [f(a+h) - f(a)] / h")
+    _ws_pause(ws)
+    return ws
 
-    expr = input("Enter function f(x): ")
+def infinity_limit_worksheet(expr, sign):
+    """
+    lim x->+inf (sign > 0) or x->-inf of f(x) (see limit_at_infinity_result).
+    values: error, text, value (float, None if infinite), inf, method,
+    steps and samples.
+    """
+    res = limit_at_infinity_result(expr, sign)
+    return _infinity_worksheet("infinity_limit", res, expr, "x", "x->" + _inf_str(sign))
+
+def sequence_limit_worksheet(expr):
+    # lim n->inf of a_n (see sequence_limit_result); values as infinity_limit_worksheet
+    res = sequence_limit_result(expr)
+    return _infinity_worksheet("sequence_limit", res, expr, "n", "n->inf")
+
+def sequence_limit_tool():
+    print("\nSEQUENCE LIMIT: lim n->inf a_n")
+    expr = input("Enter a_n in n: ")
+    show_worksheet(sequence_limit_worksheet(expr))
+
+def limit_tool():
+    print("\nLIMIT: lim x->a")
+    expr = input("Enter expression in x: ")
 
     try:
-        a = float(input("Enter the point a: "))
+        a = float(input("Enter a (or inf, -inf): "))
     except:
         print("Invalid a.")
         pause()
         return
 
-    fa = eval_expr(expr, a)
-    if fa is None:
-        print("Error: f(a) is undefined.")
+    show_worksheet(limit_worksheet(expr, a))
+
+def exact_limit_worksheet(expr, a):
+    """
+    lim x->a f(x) found symbolically (see limit_result).
+    values: error, text, value (float, None if infinite), inf,
+    method, form, rounds and steps.
+    """
+    if a == float("inf") or a == float("-inf"):
+        return infinity_limit_worksheet(expr, 1 if a > 0 else -1)
+
+    res = limit_result(expr, a)
+    ws = _ws_new("exact_limit")
+    value = None
+    if res["limit"] is not None:
+        value = _m_float(res["limit"])
+    ws["values"] = {"error": res["error"], "text": res["text"], "value": value,
+                    "inf": res["inf"], "method": res["method"], "form": res["form"],
+                    "rounds": res["rounds"], "steps": res["steps"]}
+
+    if res["error"] == "tokenize":
+        _ws_line(ws, "Tokenizer failed. Check your input.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "parse":
+        _ws_line(ws, "Parse failed. Check parentheses and spelling.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "point":
+        _ws_line(ws, "a must be a number.")
+        _ws_pause(ws)
+        return ws
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr)
+
+    if res["error"] == "unknown":
+        _ws_line(ws, "Could not find this limit exactly.")
+        _ws_line(ws, "Use the Limit Calculator (numeric check).")
+        _ws_pause(ws)
+        return ws
+
+    steps = res["steps"]
+    i = 0
+    while i < len(steps):
+        _ws_line(ws, str(i + 2), ") ", steps[i])
+        i += 1
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nWRITE THIS:")
+    if res["form"] is not None:
+        _ws_line(ws, "Substituting x = ", a, " gives ", res["form"], " (indeterminate)")
+    if res["rounds"] > 0:
+        _ws_line(ws, "L'Hopital's rule (", res["rounds"], "x): lim f/g = lim f'/g'")
+    if res["method"] == "series":
+        _ws_line(ws, "Taylor series about x = ", a, ": the leading term decides")
+    _ws_line(ws, "lim x->", a, " f(x) = ", res["text"])
+
+    _ws_pause(ws)
+    return ws
+
+def exact_limit_tool():
+    print("\nEXACT LIMIT: lim x->a (L'Hopital / series)")
+    expr = input("Enter expression in x: ")
+
+    try:
+        a = float(input("Enter a (or inf, -inf): "))
+    except:
+        print("Invalid a.")
         pause()
         return
 
+    show_worksheet(exact_limit_worksheet(expr, a))
+
+def velocity_worksheet(expr, a):
+    """
+    Average-rate slopes [f(a+h) - f(a)] / h for shrinking h.
+    values: fa, slopes (list of (h, slope or None)) and rate (slope
+    at the smallest h that worked, None if none did).
+    """
+    ws = _ws_new("velocity")
+    v = ws["values"]
+    v["fa"] = None
+    v["slopes"] = []
+    v["rate"] = None
+
+    fa = eval_expr(expr, a)
+    if fa is None:
+        _ws_line(ws, "Error: f(a) is undefined.")
+        _ws_pause(ws)
+        return ws
+    v["fa"] = fa
+
     hs = [0.1, 0.01, 0.001, 0.0001]
     last_slope = None
+    f_ah = None
 
-    print("\nSlopes near a =", a)
+    _ws_line(ws, "\nSlopes near a = ", a)
     for h in hs:
         f_ah = eval_expr(expr, a + h)
         if f_ah is None:
-            print("h =", h, " slope = undefined")
+            v["slopes"].append((h, None))
+            _ws_line(ws, "h = ", h, "  slope = undefined")
             continue
         slope = (f_ah - fa) / h
         last_slope = slope
-        print("h =", h, " slope ~= ", round(slope, 6))
-    pause()
+        v["slopes"].append((h, slope))
+        _ws_line(ws, "h = ", h, "  slope ~=  ", ("r", slope, 6))
+    _ws_pause(ws)
 
-    print("\nConclusion:")
+    _ws_line(ws, "\nConclusion:")
     if last_slope is None:
-        print("Not enough data to estimate the limit.")
+        _ws_line(ws, "Not enough data to estimate the limit.")
     else:
-        print("Instantaneous rate at a ~= " + str(round(last_slope, 6)))
+        v["rate"] = last_slope
+        _ws_line(ws, "Instantaneous rate at a ~= ", ("r", last_slope, 6))
 
-        # Paper-ready work using smallest h
+        # Paper-ready work using smallest h (f_ah is from the last h)
         h = hs[-1]
-        f_ah = eval_expr(expr, a + h)
         if f_ah is not None:
-            print("\nWRITE THIS:")
-            print("Velocity at a approx [f(a+h) - f(a)] / h")
-            print("a = " + str(a) + ", h = " + str(h))
-            expr_ah = expr.replace("x", str(a + h))
-            expr_a  = expr.replace("x", str(a))
-            print("f(a+h) = f(" + str(a + h) + ") = " + expr_ah)
-            print("f(a)   = f(" + str(a) + ") = " + expr_a)
-            print("f(a+h) approx " + str(round(f_ah, 10)))
-            print("f(a)   approx " + str(round(fa, 10)))
-            print("f(a+h) - f(a) approx " + str(round(f_ah - fa, 10)))
-            print("Velocity approx (" + str(round(f_ah - fa, 10)) + ") / (" + str(h) + ")")
-            print("Velocity approx " + str(round((f_ah - fa) / h, 10)))
+            _ws_line(ws, "\nWRITE THIS:")
+            _ws_line(ws, "Velocity at a approx [f(a+h) - f(a)] / h")
+            _ws_line(ws, "a = ", a, ", h = ", h)
+            _ws_line(ws, "f(a+h) = f(", a + h, ") = ", ("x", expr, a + h))
+            _ws_line(ws, "f(a)   = f(", a, ") = ", ("x", expr, a))
+            _ws_line(ws, "f(a+h) approx ", ("r", f_ah, 10))
+            _ws_line(ws, "f(a)   approx ", ("r", fa, 10))
+            _ws_line(ws, "f(a+h) - f(a) approx ", ("r", f_ah - fa, 10))
+            _ws_line(ws, "Velocity approx (", ("r", f_ah - fa, 10), ") / (", h, ")")
+            _ws_line(ws, "Velocity approx ", ("r", (f_ah - fa) / h, 10))
+
+    _ws_pause(ws)
+    return ws
 
+def velocity_tool():
+    print("\nVELOCITY / INSTANTANEOUS RATE OF CHANGE")
+    print("Definition: lim h->0 [f(a+h) - f(a)] / h")
 
-    pause()
-
-def derivative_definition_guided():
-    print("\nDERIVATIVE f'(x) USING DEFINITION (GUIDED)")
-    print("Use when asked for f'(x), not at a single point.\n")
-    print("\nNOTE:")
-    print("Only use this tool if the problem EXPLICITLY says:")
-    print("'Use the definition of the derivative'.")
-    pause()
+    expr = input("Enter function f(x): ")
 
+    try:
+        a = float(input("Enter the point a: "))
+    except:
+        print("Invalid a.")
+        pause()
+        return
 
-    expr = input("Enter f(x): ").strip()
-    expr_clean = expr.replace(" ", "")
+    show_worksheet(velocity_worksheet(expr, a))
+
+def _definition_poly_steps(ws, p):
+    # Steps 3-7 of the definition for any polynomial f (coefficients p);
+    # returns f'(x) as text. Long sums wrap, _STREAM_TERMS terms per line.
+    shifted = _xh_shift(p)
+    f_str = _poly_to_str(p)
+
+    # Step 3: Expand f(x+h)
+    _ws_line(ws, "\nWRITE THIS (Step 3):")
+    _ws_terms(ws, "f(x+h) = ", _xh_terms(shifted))
+    _ws_line(ws, "So numerator becomes:")
+    _ws_terms(ws, "(", _xh_terms(shifted), ") - (" + f_str + ")")
+    _ws_pause(ws)
+
+    # Step 4: The h^0 terms are exactly f(x), so they cancel
+    diff = _xh_add(shifted, _xh_poly(p), -1)
+    _ws_line(ws, "\nWRITE THIS (Step 4):")
+    _ws_line(ws, "Combine like terms with -(" + f_str + "):")
+    _ws_terms(ws, "f(x+h) - f(x) = ", _xh_terms(diff))
+    _ws_pause(ws)
+
+    # Step 5: Every remaining term has h
+    inside = _xh_div_h(diff)
+    _ws_line(ws, "\nWRITE THIS (Step 5):")
+    _ws_line(ws, "Factor out h:")
+    _ws_terms(ws, "f(x+h) - f(x) = h(", _xh_terms(inside), ")")
+    _ws_pause(ws)
+
+    # Step 6: Cancel h
+    _ws_line(ws, "\nWRITE THIS (Step 6):")
+    _ws_terms(ws, "f'(x) = lim h->0 [ h(", _xh_terms(inside), ") ] / h")
+    _ws_terms(ws, "f'(x) = lim h->0 ( ", _xh_terms(inside), " )")
+    _ws_pause(ws)
+
+    # Step 7: Plug in h = 0 (only the h^0 terms survive)
+    final = _xh_poly(_poly_deriv(p))
+    _ws_line(ws, "\nWRITE THIS (Step 7):")
+    _ws_line(ws, "Plug in h = 0:")
+    _ws_terms(ws, "f'(x) = ", _xh_terms(final))
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nFINAL:")
+    _ws_terms(ws, "f'(x) = ", _xh_terms(final))
+    _ws_pause(ws)
+    return _poly_to_str(_poly_deriv(p))
+
+def _product_str(a, b):
+    # "(a)(b)", leaving out a factor 1
+    if a == "1":
+        return "(" + b + ")"
+    if b == "1":
+        return "(" + a + ")"
+    return "(" + a + ")(" + b + ")"
+
+def _definition_rational_steps(ws, top, bot):
+    # Steps 3-7 of the definition for f = top/bot (dense coefficients);
+    # returns f'(x) as text
+    t_str = _poly_to_str(top)
+    b_str = _poly_to_str(bot)
+    t_shift = _xh_shift(top)
+    b_shift = _xh_shift(bot)
+    txh = _xh_to_str(t_shift)
+    bxh = _xh_to_str(b_shift)
+
+    # Step 3: One fraction over the common denominator
+    _ws_line(ws, "\nWRITE THIS (Step 3):")
+    _ws_line(ws, "Common denominator:")
+    _ws_line(ws, "f(x+h) - f(x) = [ " + _product_str(txh, b_str) + " - " + _product_str(t_str, bxh) + " ]")
+    _ws_line(ws, "                / [ (" + bxh + ")(" + b_str + ") ]")
+    _ws_pause(ws)
+
+    # Step 4: Expand the top; the h^0 terms cancel
+    num = _xh_add(_xh_mul(t_shift, _xh_poly(bot)), _xh_mul(_xh_poly(top), b_shift), -1)
+    _ws_line(ws, "\nWRITE THIS (Step 4):")
+    _ws_line(ws, "Expand and combine the top:")
+    _ws_line(ws, "top = " + _xh_to_str(num))
+    _ws_pause(ws)
+
+    # Step 5: Every remaining term has h
+    inside = _xh_div_h(num)
+    if inside is None:
+        inside = {}
+    inside_str = _xh_to_str(inside)
+    den = "(" + bxh + ")(" + b_str + ")"
+    _ws_line(ws, "\nWRITE THIS (Step 5):")
+    _ws_line(ws, "Factor out h:")
+    _ws_line(ws, "top = h(" + inside_str + ")")
+    _ws_pause(ws)
+
+    # Step 6: Cancel h against the /h of the definition
+    _ws_line(ws, "\nWRITE THIS (Step 6):")
+    _ws_line(ws, "f'(x) = lim h->0 [ h(" + inside_str + ") ] / [ h" + den + " ]")
+    _ws_line(ws, "f'(x) = lim h->0 (" + inside_str + ") / [ " + den + " ]")
+    _ws_pause(ws)
+
+    # Step 7: Plug in h = 0; the bottom becomes (bot)^2
+    final_top = _poly_to_str(_xh_at_h0(inside))
+    if b_str == "x":
+        final_bot = "x^2"
+    else:
+        final_bot = "(" + b_str + ")^2"
+    final = _paren_sum(final_top) + "/" + final_bot
+    _ws_line(ws, "\nWRITE THIS (Step 7):")
+    _ws_line(ws, "Plug in h = 0:")
+    _ws_line(ws, "f'(x) = " + final)
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nFINAL:")
+    _ws_line(ws, "f'(x) = " + final)
+    _ws_pause(ws)
+    return final
+
+def derivative_definition_worksheet(expr):
+    """
+    Derivative from the definition, f'(x) = lim h->0 [f(x+h) - f(x)] / h,
+    as a worksheet. The algebra is done for x^n, polynomials and
+    quotients of polynomials; anything else gets the outline.
+    values: method ("power", "poly", "rational" or "outline") and d
+    (f'(x) as text, None for the outline).
+    """
+    ws = _ws_new("definition")
+    v = ws["values"]
+    v["method"] = "outline"
+    v["d"] = None
+    expr_clean = expr.strip().replace(" ", "")
 
     # Step 1
-    print("\nWRITE THIS (Step 1):")
-    print("f'(x) = lim h->0 [ f(x+h) - f(x) ] / h")
-    pause()
+    _ws_line(ws, "\nWRITE THIS (Step 1):")
+    _ws_line(ws, "f'(x) = lim h->0 [ f(x+h) - f(x) ] / h")
+    _ws_pause(ws)
 
-    # Step 2
-    sub = expr_clean.replace("x", "(x+h)")
-    print("\nWRITE THIS (Step 2):")
-    print("f'(x) = lim h->0 [ (" + sub + ") - (" + expr_clean + ") ] / h")
-    pause()
+    # Step 2 (the x in exp is not a variable)
+    sub = _subst_x_text(expr_clean, "(x+h)")
+    _ws_line(ws, "\nWRITE THIS (Step 2):")
+    _ws_line(ws, "f'(x) = lim h->0 [ (" + sub + ") - (" + expr_clean + ") ] / h")
+    _ws_pause(ws)
 
     # If it's x^n, do the real algebra steps
     n = _try_power_of_x(expr_clean)
     if n is not None:
-        # Step 3: Expand (x+h)^n
-        expanded = _binomial_expand_xh(n)
-        print("\nWRITE THIS (Step 3):")
-        print("(x+h)^" + str(n) + " = " + expanded)
-        print("So numerator becomes:")
-        print("(" + expanded + ") - (x^" + str(n) + ")")
-        pause()
-
-        # Step 4: Combine like terms (cancel x^n)
-        # For x^n, this is always: (expanded) - x^n -> remaining terms
-        # We can show it explicitly as: everything except the first x^n term
-        # expanded starts with x^n (because k=0 term is x^n)
-        # so combined is: expanded - x^n = (expanded without leading x^n)
-        # We'll build a clean combined string using the known factored-form inside
-        inside = _poly_diff_factored_form_power(n)  # equals ( (x+h)^n - x^n ) / h
-        print("\nWRITE THIS (Step 4):")
-        print("Combine like terms with -x^" + str(n) + ":")
-        print("(x+h)^" + str(n) + " - x^" + str(n) + " = h(" + inside + ")")
-        pause()
+        xn = "x^" + str(n)
+        diff = "(x+h)^" + str(n) + " - " + xn + " = h("
+
+        # Step 3: Expand (x+h)^n (binomial theorem, written as it goes)
+        _ws_line(ws, "\nWRITE THIS (Step 3):")
+        _ws_terms(ws, "(x+h)^" + str(n) + " = ", _binomial_terms(n))
+        _ws_line(ws, "So numerator becomes:")
+        _ws_terms(ws, "(", _binomial_terms(n), ") - (" + xn + ")")
+        _ws_pause(ws)
+
+        # Step 4: Combine like terms: only the leading x^n cancels, and
+        # every other term has at least one h
+        _ws_line(ws, "\nWRITE THIS (Step 4):")
+        _ws_line(ws, "Combine like terms with -" + xn + ":")
+        _ws_terms(ws, diff, _binomial_terms(n, 1, 1, 1, 1), ")")
+        _ws_pause(ws)
 
         # Step 5: Factor out h (already shown, but label it cleanly)
-        print("\nWRITE THIS (Step 5):")
-        print("Factor out h:")
-        print("(x+h)^" + str(n) + " - x^" + str(n) + " = h(" + inside + ")")
-        pause()
+        _ws_line(ws, "\nWRITE THIS (Step 5):")
+        _ws_line(ws, "Factor out h:")
+        _ws_terms(ws, diff, _binomial_terms(n, 1, 1, 1, 1), ")")
+        _ws_pause(ws)
 
         # Step 6: Cancel h in the REAL equation
-        print("\nWRITE THIS (Step 6):")
-        print("f'(x) = lim h->0 [ h(" + inside + ") ] / h")
-        print("f'(x) = lim h->0 ( " + inside + " )")
-        pause()
+        _ws_line(ws, "\nWRITE THIS (Step 6):")
+        _ws_terms(ws, "f'(x) = lim h->0 [ h(", _binomial_terms(n, 1, 1, 1, 1), ") ] / h")
+        _ws_terms(ws, "f'(x) = lim h->0 ( ", _binomial_terms(n, 1, 1, 1, 1), " )")
+        _ws_pause(ws)
 
         # Step 7: Plug in h = 0
-        print("\nWRITE THIS (Step 7):")
-        print("Plug in h = 0:")
+        _ws_line(ws, "\nWRITE THIS (Step 7):")
+        _ws_line(ws, "Plug in h = 0:")
         # inside has h terms, but we can state the result cleanly for power rule:
         final = _power_simple_derivative_str(n)
-        print("f'(x) = " + final)
-        pause()
+        _ws_line(ws, "f'(x) = " + final)
+        _ws_pause(ws)
 
-        print("\nFINAL:")
-        print("f'(x) = " + final)
+        _ws_line(ws, "\nFINAL:")
+        _ws_line(ws, "f'(x) = " + final)
 
         # keep your confidence booster behavior, but now it matches the real output
-        pause()
-        return
+        _ws_pause(ws)
+        v["method"] = "power"
+        v["d"] = final
+        return ws
+
+    # Any other polynomial: expand f(x+h) from its coefficients
+    ast = _parse_expr(expr_clean)
+    poly = None
+    if ast is not None:
+        poly = _poly_from_ast(ast)
+    if poly is not None and len(poly) > 1:
+        v["method"] = "poly"
+        v["d"] = _definition_poly_steps(ws, poly)
+        return ws
+
+    # A quotient of polynomials: one fraction, then the same algebra
+    if ast is not None and ast["t"] == "bin" and ast["op"] == "/":
+        top = _poly_from_ast(ast["a"])
+        bot = _poly_from_ast(ast["b"])
+        if top is not None and bot is not None and len(bot) > 1:
+            v["method"] = "rational"
+            v["d"] = _definition_rational_steps(ws, top, bot)
+            return ws
 
     # Otherwise: general guidance, but paged, step-by-step
-    print("\nWRITE THIS (Step 3):")
-    print("Expand ONLY the (x+h) parts that need expanding")
-    pause()
+    _ws_line(ws, "\nWRITE THIS (Step 3):")
+    _ws_line(ws, "Expand ONLY the (x+h) parts that need expanding")
+    _ws_pause(ws)
 
-    print("\nWRITE THIS (Step 4):")
-    print("Combine like terms")
-    pause()
+    _ws_line(ws, "\nWRITE THIS (Step 4):")
+    _ws_line(ws, "Combine like terms")
+    _ws_pause(ws)
 
-    print("\nWRITE THIS (Step 5):")
-    print("Factor out h (every term should have h)")
-    pause()
+    _ws_line(ws, "\nWRITE THIS (Step 5):")
+    _ws_line(ws, "Factor out h (every term should have h)")
+    _ws_pause(ws)
 
-    print("\nWRITE THIS (Step 6):")
-    print("Cancel h")
-    pause()
+    _ws_line(ws, "\nWRITE THIS (Step 6):")
+    _ws_line(ws, "Cancel h")
+    _ws_pause(ws)
 
-    print("\nWRITE THIS (Step 7):")
-    print("Plug in h = 0")
-    pause()
+    _ws_line(ws, "\nWRITE THIS (Step 7):")
+    _ws_line(ws, "Plug in h = 0")
+    _ws_pause(ws)
 
     # Quick confidence boosters
     if expr_clean == "x^2":
-        print("\nCommon result: f'(x) = 2x")
+        _ws_line(ws, "\nCommon result: f'(x) = 2x")
     elif expr_clean == "x^3":
-        print("\nCommon result: f'(x) = 3x^2")
+        _ws_line(ws, "\nCommon result: f'(x) = 3x^2")
     elif expr_clean == "sqrt(x)":
-        print("\nCommon result: f'(x) = 1/(2*sqrt(x))")
+        _ws_line(ws, "\nCommon result: f'(x) = 1/(2*sqrt(x))")
     elif expr_clean == "1/x":
-        print("\nCommon result: f'(x) = -1/x^2")
+        _ws_line(ws, "\nCommon result: f'(x) = -1/x^2")
+
+    _ws_pause(ws)
+    return ws
 
+def derivative_definition_guided():
+    print("\nDERIVATIVE f'(x) USING DEFINITION (GUIDED)")
+    print("Use when asked for f'(x), not at a single point.\n")
+    print("\nNOTE:")
+    print("Only use this tool if the problem EXPLICITLY says:")
+    print("'Use the definition of the derivative'.")
     pause()
 
+
+    expr = input("Enter f(x): ")
+    show_worksheet(derivative_definition_worksheet(expr))
+
+def chain_rule_result(raw):
+    """
+    Non-interactive core of the Chain Rule Solver.
+    Returns a dict:
+    - normalized: cleaned expression string
+    - error: None, "tokenize" or "parse"
+    - ast: parsed tree (None on error)
+    - f, d: printed f(x) and simplified f'(x) strings
+    - steps: rule steps used, in order
+    """
+    e = _expr_entry(raw)
+    res = {"normalized": e["normalized"], "error": None,
+           "ast": None, "f": None, "d": None, "steps": []}
+
+    if e["tokens"] is None:
+        res["error"] = "tokenize"
+        return res
+
+    ast = _entry_ast(e)
+    if ast is None:
+        res["error"] = "parse"
+        return res
+
+    d_ast, steps = _entry_derivative(e)
+
+    res["ast"] = ast
+    res["steps"] = list(steps)
+    res["f"] = _to_str(ast)
+    res["d"] = _simplify_str(_to_str(d_ast))
+    return res
+
+def chain_rule_worksheet(raw):
+    """
+    Chain Rule Solver work as a worksheet.
+    values: normalized, error, f, d and steps (as in chain_rule_result).
+    """
+    res = chain_rule_result(raw)
+    ws = _ws_new("chain")
+    ws["values"] = {"normalized": res["normalized"], "error": res["error"],
+                    "f": res["f"], "d": res["d"], "steps": res["steps"]}
+
+    _ws_line(ws, "Normalized: ", res["normalized"])
+
+    if res["error"] == "tokenize":
+        _ws_line(ws, "Tokenizer failed. Check your input.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "parse":
+        _ws_line(ws, "Parse failed. Check parentheses and spelling.")
+        _ws_pause(ws)
+        return ws
+
+    steps = res["steps"]
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "f(x) = ", res["f"])
+    _exam_chain_work(ws, res["ast"])
+    _ws_pause(ws)
+    if len(steps) == 0:
+        _ws_line(ws, "No special rules triggered.")
+        _ws_pause(ws)
+    else:
+        i = 0
+        while i < len(steps):
+            _ws_line(ws, str(i + 1), ") ", steps[i])
+            i += 1
+            _ws_pause(ws)
+    _ws_line(ws, "\nWRITE THIS:")
+    _ws_line(ws, "f(x)  = ", res["f"])
+    _ws_line(ws, "f'(x) = ", res["d"])
+
+    _ws_pause(ws)
+    return ws
+
 def chain_rule_tool():
     print("\nCHAIN RULE SOLVER (SYMBOLIC + STEPS)")
     #print("Supported: + - * / ^, sin cos tan ln sqrt exp, constants e pi, variable x")
@@ -1676,127 +6657,355 @@ def chain_rule_tool():
     print("Use this unless definition is explicitly required")
     pause()
 
+    raw = input("Enter function in x: ")
+    show_worksheet(chain_rule_worksheet(raw))
+
+def _split_xy_names(s):
+    """
+    Implicit multiplication inside names made only of x, y and digits:
+    yx -> y*x, xy2 -> x*y*2. The symbolic normalizer already splits
+    names that start with x, but would keep yx as one unknown name.
+    """
+    out = ""
+    i = 0
+    n = len(s)
+    while i < n:
+        ch = s[i]
+        if not _is_alnum_or_underscore(ch) or (48 <= ord(ch) <= 57):
+            # operators, and number literals (2.5 stays whole)
+            j = i + 1
+            if 48 <= ord(ch) <= 57 or ch == ".":
+                while j < n and (48 <= ord(s[j]) <= 57 or s[j] == "."):
+                    j += 1
+            out += s[i:j]
+            i = j
+            continue
+        j = i
+        only_xy = True
+        while j < n and _is_alnum_or_underscore(s[j]):
+            if s[j] not in "xy0123456789":
+                only_xy = False
+            j += 1
+        word = s[i:j]
+        if only_xy and len(word) > 1:
+            parts = []
+            k = 0
+            while k < len(word):
+                # keep digit runs together: y12 -> y*12
+                m = k + 1
+                if 48 <= ord(word[k]) <= 57:
+                    while m < len(word) and 48 <= ord(word[m]) <= 57:
+                        m += 1
+                parts.append(word[k:m])
+                k = m
+            word = "*".join(parts)
+        out += word
+        i = j
+    return out
+
+def _other_names(node):
+    # names other than y and the constants pi, e (sorted, no repeats)
+    found = []
+    order = _postorder(node)
+    i = 0
+    while i < len(order):
+        n = order[i]
+        if n["t"] == "name" and n["v"] != "y" and n["v"] not in _CONST_VALUES:
+            if n["v"] not in found:
+                found.append(n["v"])
+        i += 1
+    found.sort()
+    return found
 
+def implicit_result(raw):
+    """
+    Implicit differentiation of an equation in x and y, with y = y(x).
+    Writing F = LHS - RHS, differentiating both sides gives
+    F_x + F_y*dy/dx = 0, so dy/dx = -F_x/F_y.
+    Returns a dict:
+    - error: None, "equation" (needs exactly one =), "tokenize",
+      "parse", "names" (a name other than x, y, pi, e; listed in
+      res["names"]) or "noy" (F_y is 0, so y is not really in the equation)
+    - lhs, rhs: normalized sides
+    - sides: for each side, (d/dx part, d/dy part) as strings
+    - Fx, Fy, dydx: strings; steps: rule steps used
+    """
+    res = {"error": None, "lhs": None, "rhs": None, "sides": [], "names": [],
+           "Fx": None, "Fy": None, "dydx": None, "steps": []}
 
-    raw = input("Enter function in x: ")
-    s = _normalize_expr_for_symbolic(raw)
+    parts = raw.split("=")
+    if len(parts) != 2 or parts[0].strip() == "" or parts[1].strip() == "":
+        res["error"] = "equation"
+        return res
 
-    print("Normalized:", s)
+    entries = [_expr_entry(_split_xy_names(parts[0].replace(" ", ""))),
+               _expr_entry(_split_xy_names(parts[1].replace(" ", "")))]
+    res["lhs"] = entries[0]["normalized"]
+    res["rhs"] = entries[1]["normalized"]
 
-    toks = _tokenize(s)
-    if toks is None:
+    grads = []
+    i = 0
+    while i < 2:
+        e = entries[i]
+        if e["tokens"] is None:
+            res["error"] = "tokenize"
+            return res
+        if _entry_ast(e) is None:
+            res["error"] = "parse"
+            return res
+        res["names"] = res["names"] + _other_names(_entry_ast(e))
+        i += 1
+    if len(res["names"]) > 0:
+        res["error"] = "names"
+        return res
+
+    i = 0
+    while i < 2:
+        e = entries[i]
+        gx, steps_x = _entry_derivative(e, "x")
+        gy, steps_y = _entry_derivative(e, "y")
+        grads.append((gx, gy))
+        res["sides"].append((_simplify_str(_to_str(gx)), _simplify_str(_to_str(gy))))
+        res["steps"] = res["steps"] + steps_x + steps_y
+        i += 1
+
+    fx = _simplify_ast(N_bin("-", grads[0][0], grads[1][0]))
+    fy = _simplify_ast(N_bin("-", grads[0][1], grads[1][1]))
+    res["Fx"] = _simplify_str(_to_str(fx))
+    res["Fy"] = _simplify_str(_to_str(fy))
+
+    if fy["t"] == "num" and fy["q"][0] == 0:
+        res["error"] = "noy"
+        return res
+
+    res["dydx"] = _simplify_str(_to_str(_simplify_ast(N_un("-", N_bin("/", fx, fy)))))
+    return res
+
+def implicit_slopes(raw, points):
+    """
+    dy/dx of an implicit curve at each (x, y) in points, from one compiled
+    evaluator. Returns a list of values (None where undefined), or None
+    when the equation cannot be differentiated.
+    """
+    res = implicit_result(raw)
+    if res["error"] is not None:
+        return None
+    f = param_evaluator(res["dydx"], ["y"])
+    if f is None:
+        return None
+
+    try:
+        return [f(x, y) for (x, y) in points]
+    except Exception:
+        pass
+
+    out = []
+    for (x, y) in points:
+        try:
+            out.append(f(x, y))
+        except Exception:
+            out.append(None)
+    return out
+
+def implicit_tool():
+    print("\nIMPLICIT DIFFERENTIATION (x AND y)")
+    print("Example: x^2+y^2=25  (y is treated as y(x))")
+    raw = input("Enter equation: ")
+    res = implicit_result(raw)
+
+    if res["error"] == "equation":
+        print("Enter one equation with exactly one = sign.")
+        pause()
+        return
+    if res["error"] == "tokenize":
         print("Tokenizer failed. Check your input.")
         pause()
         return
-
-    p = _Parser(toks)
-    ast = p.parse()
-    if ast is None:
+    if res["error"] == "parse":
         print("Parse failed. Check parentheses and spelling.")
+        print("Write products with y as y*(...) or x*y.")
+        pause()
+        return
+    if res["error"] == "names":
+        print("Unknown name(s): " + ", ".join(res["names"]))
+        print("Use only x, y, pi and e (products like x*y).")
         pause()
         return
 
-    steps = []
-    d_ast = _d(ast, steps)
+    print("Normalized: " + res["lhs"] + " = " + res["rhs"])
 
-    f_str = _to_str(ast)
-    d_str = _to_str(d_ast)
-    d_str = _simplify_str(d_str)
+    print("\n--- STEP-BY-STEP ---")
+    print("Step 1: Differentiate both sides, y = y(x)")
+    print("        (chain rule: d/dx(y^n) = n*y^(n-1)*dy/dx)")
+    names = ["LHS", "RHS"]
+    i = 0
+    while i < 2:
+        gx, gy = res["sides"][i]
+        if gy == "0":
+            print("d/dx(" + names[i] + ") = " + gx)
+        else:
+            print("d/dx(" + names[i] + ") = " + gx + " + (" + gy + ")*dy/dx")
+        i += 1
+    pause()
 
+    if res["error"] == "noy":
+        print("No y terms survive, so dy/dx cannot be solved for.")
+        pause()
+        return
 
+    print("\nStep 2: Move dy/dx terms to one side")
+    print("(" + res["Fy"] + ")*dy/dx = -(" + res["Fx"] + ")")
+    pause()
 
-    print("\n--- STEP-BY-STEP ---")
-    print("f(x) = " + f_str)
-    _print_exam_chain_work(ast)
+    print("\nStep 3: Divide")
+    print("dy/dx = " + res["dydx"])
     pause()
-    if len(steps) == 0:
-        print("No special rules triggered.")
-        pause()
-    else:
-        i = 0
-        while i < len(steps):
-            print(str(i + 1) + ") " + steps[i])
-            i += 1
+
+    xs = input("\nSlope at a point? Enter x (ENTER to skip): ").strip()
+    if xs != "":
+        try:
+            x0 = float(xs)
+            y0 = float(input("Enter y: "))
+        except:
+            print("Invalid point.")
             pause()
-    print("\nWRITE THIS:")
-    print("f(x)  = " + f_str)
-    print("f'(x) = " + d_str)
+            return
 
+        m = implicit_slopes(raw, [(x0, y0)])
+        if m is None or m[0] is None or isinstance(m[0], complex):
+            print("dy/dx is undefined at (" + str(x0) + ", " + str(y0) + ")")
+            print("(vertical tangent or outside the domain)")
+        else:
+            m = m[0]
+            # warn if the point is not on the curve
+            lv = eval_batch(res["lhs"], [{"x": x0, "y": y0}])[0]
+            rv = eval_batch(res["rhs"], [{"x": x0, "y": y0}])[0]
+            if lv is not None and rv is not None and abs(lv - rv) > 1e-6 * max(1.0, abs(lv), abs(rv)):
+                print("NOTE: (" + str(x0) + ", " + str(y0) + ") is not on the curve.")
+            print("dy/dx at (" + str(x0) + ", " + str(y0) + ") = " + str(round(m, 6)))
+            print("Tangent: y - " + str(y0) + " = " + str(round(m, 6)) + "(x - " + str(x0) + ")")
+        pause()
 
+    print("\nWRITE THIS:")
+    print(res["lhs"] + " = " + res["rhs"])
+    print("dy/dx = " + res["dydx"])
     pause()
 
-def derivative_tool():
-    print("\nDERIVATIVE: f'(a) (numeric estimate)")
-    expr = input("Enter expression in x: ")
-
-    try:
-        a = float(input("Enter a: "))
-    except:
-        print("Invalid a.")
+def check_answer_tool():
+    print("\nCHECK MY DERIVATIVE")
+    expr = input("Enter f(x): ")
+    res = chain_rule_result(expr)
+    if res["error"] is not None:
+        print("Could not read f(x). Check your input.")
         pause()
         return
 
-    print("\n--- STEP-BY-STEP ---")
-    print("Step 1: f(x) =", expr)
-    print("Step 2: f'(a) = lim h->0 [f(a+h) - f(a-h)] / (2h)")
-    print("Step 3: Slopes near a =", a)
+    answer = input("Your f'(x): ")
+    if answer.strip() == "":
+        return
+
+    check = equivalence_result(answer, res["d"])
+    print("")
+    if check["equivalent"] is True:
+        if check["method"] == "canonical":
+            print("CORRECT (same expression after simplifying)")
+        else:
+            print("CORRECT (agrees at " + str(check["points"]) + " test points)")
+    elif check["equivalent"] is False:
+        x, yours, expected = check["counterexample"]
+        print("NOT EQUIVALENT")
+        print("At x = " + str(round(x, 6)) + ":")
+        print("  yours    = " + str(round(yours, 6)))
+        print("  expected = " + str(round(expected, 6)))
+    else:
+        print("Could not compare (no test point where both are defined).")
+    pause()
+
+    print("\nWRITE THIS:")
+    print("f(x)  = " + res["f"])
+    print("f'(x) = " + res["d"])
+    pause()
+
+def derivative_worksheet(expr, a):
+    """
+    Central-difference estimate of f'(a).
+    values: slopes (list of (h, slope or None)), deriv (slope at the
+    smallest h that worked, None if none did) and precise (True if
+    f(a+h) - f(a-h) needed extended precision).
+    """
+    ws = _ws_new("derivative")
+    v = ws["values"]
+    v["slopes"] = []
+    v["deriv"] = None
+    v["precise"] = False
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr)
+    _ws_line(ws, "Step 2: f'(a) = lim h->0 [f(a+h) - f(a-h)] / (2h)")
+    _ws_line(ws, "Step 3: Slopes near a = ", a)
 
     hs = [0.1, 0.01, 0.001, 0.0001]
     last_good = None
+    f_plus = None
+    f_minus = None
+    num = None
 
     for h in hs:
-        f_plus = eval_expr(expr, a + h)
-        f_minus = eval_expr(expr, a - h)
-
-        if f_plus is None or f_minus is None:
-            print("h =", h, " slope = undefined")
+        r = precise_sum(expr, [(a, h, 1.0), (a, -h, -1.0)], _precision_tol(2.0 * h))
+        if r is None:
+            f_plus = None
+            f_minus = None
+            v["slopes"].append((h, None))
+            _ws_line(ws, "h = ", h, "  slope = undefined")
             continue
 
-        slope = (f_plus - f_minus) / (2.0 * h)
+        num = r[0]
+        f_plus = r[1][0]
+        f_minus = r[1][1]
+        if r[2]:
+            v["precise"] = True
+        slope = num / (2.0 * h)
         last_good = slope
-        print("h =", h, " slope ~= ", round(slope, 6))
-    pause()
+        v["slopes"].append((h, slope))
+        _ws_line(ws, "h = ", h, "  slope ~=  ", ("r", slope, 6))
+    if v["precise"]:
+        _ws_line(ws, "(f(a+h) - f(a-h) cancels digits: extra precision used)")
+    _ws_pause(ws)
 
-    print("\nConclusion:")
+    _ws_line(ws, "\nConclusion:")
     if last_good is None:
-        print("Not enough data to estimate derivative.")
+        _ws_line(ws, "Not enough data to estimate derivative.")
     else:
-        print("f'(" + str(a) + ") ~= " + str(round(last_good, 6)))
-        
-    if last_good is not None:
-        # Paper-ready line using the smallest h
-        h = hs[-1]
-        f_plus = eval_expr(expr, a + h)
-        f_minus = eval_expr(expr, a - h)
-    
-        if f_plus is not None and f_minus is not None:
-            print("\nWRITE THIS:")
-            print("f'(a) approx [f(a+h) - f(a-h)] / (2h)")
-            print("a = " + str(a) + ", h = " + str(h))
-    
-            # Option A: show substitution in terms of the original expression
-            print("f(a+h) = (" + expr + ") with x = " + str(a + h))
-            print("f(a-h) = (" + expr + ") with x = " + str(a - h))
-            pause()
+        v["deriv"] = last_good
+        _ws_line(ws, "f'(", a, ") ~= ", ("r", last_good, 6))
 
-            # Then show evaluated values
-            print("f(a+h) approx " + str(round(f_plus, 6)))
-            print("f(a-h) approx " + str(round(f_minus, 6)))
-    
-            num = f_plus - f_minus
-            den = 2.0 * h
-            pause()
+    # Paper-ready line using the smallest h (f_plus, f_minus are from it)
+    if last_good is not None and f_plus is not None and f_minus is not None:
+        h = hs[-1]
+        _ws_line(ws, "\nWRITE THIS:")
+        _ws_line(ws, "f'(a) approx [f(a+h) - f(a-h)] / (2h)")
+        _ws_line(ws, "a = ", a, ", h = ", h)
 
-            print("f'(a) approx (" + str(round(num, 6)) + ") / (" + str(den) + ")")
-            print("f'(" + str(a) + ") approx " + str(round(num / den, 6)))
+        # Option A: show substitution in terms of the original expression
+        _ws_line(ws, "f(a+h) = (", expr, ") with x = ", a + h)
+        _ws_line(ws, "f(a-h) = (", expr, ") with x = ", a - h)
+        _ws_pause(ws)
 
+        # Then show evaluated values
+        _ws_line(ws, "f(a+h) approx ", ("r", f_plus, 6))
+        _ws_line(ws, "f(a-h) approx ", ("r", f_minus, 6))
 
+        den = 2.0 * h
+        _ws_pause(ws)
 
+        _ws_line(ws, "f'(a) approx (", ("r", num, 6), ") / (", den, ")")
+        _ws_line(ws, "f'(", a, ") approx ", ("r", num / den, 6))
 
-    pause()
+    _ws_pause(ws)
+    return ws
 
-def tangent_line_tool():
-    print("\nTANGENT LINE at x = a")
+def derivative_tool():
+    print("\nDERIVATIVE: f'(a) (numeric estimate)")
     expr = input("Enter expression in x: ")
 
     try:
@@ -1806,43 +7015,324 @@ def tangent_line_tool():
         pause()
         return
 
+    show_worksheet(derivative_worksheet(expr, a))
+
+def tangent_line_values(expr, a):
+    # Point, slope and intercept of the tangent line at x = a (None if undefined)
     y = function_value(expr, a)
     m = derivative_at(expr, a)
 
     if y is None or m is None:
-        print("Error: Could not compute tangent line.")
+        return None
+
+    return {"y": y, "m": m, "b": y - m * a}
+
+def tangent_line_worksheet(expr, a):
+    # Tangent line at x = a; values are tangent_line_values (empty if undefined)
+    ws = _ws_new("tangent")
+    vals = tangent_line_values(expr, a)
+    if vals is None:
+        _ws_line(ws, "Error: Could not compute tangent line.")
+        _ws_pause(ws)
+        return ws
+
+    ws["values"] = vals
+    y = vals["y"]
+    m = vals["m"]
+    b = vals["b"]
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr)
+    _ws_line(ws, "Step 2: Point is (", a, ", ", ("r", y, 6), ")")
+    _ws_line(ws, "Step 3: Slope m = f'(a) ~= ", ("r", m, 6))
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nPoint-slope form:")
+    _ws_line(ws, "y - ", ("r", y, 6), " = ", ("r", m, 6), "(x - ", a, ")")
+
+    _ws_line(ws, "\nSlope-intercept form:")
+    if b < 0:
+        _ws_line(ws, "y = ", ("r", m, 6), "x - ", ("r", abs(b), 6))
+    else:
+        _ws_line(ws, "y = ", ("r", m, 6), "x + ", ("r", b, 6))
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nWRITE THIS:")
+    _ws_line(ws, "1) f(a) = ", ("r", y, 6))
+    _ws_line(ws, "2) f'(a) ~= ", ("r", m, 6))
+    _ws_pause(ws)
+
+    _ws_line(ws, "3) Point: (", a, ", ", ("r", y, 6), ")")
+    _ws_line(ws, "4) Tangent line formula: y - f(a) = f'(a)(x - a)")
+    _ws_line(ws, "   y - ", ("r", y, 6), " = ", ("r", m, 6), "(x - ", a, ")")
+
+    _ws_pause(ws)
+    return ws
+
+def tangent_line_tool():
+    print("\nTANGENT LINE at x = a")
+    expr = input("Enter expression in x: ")
+
+    try:
+        a = float(input("Enter a: "))
+    except:
+        print("Invalid a.")
         pause()
         return
 
-    b = y - m * a
+    show_worksheet(tangent_line_worksheet(expr, a))
+
+_NEWTON_TABLES = 3        # starts whose iteration tables are shown
+
+def _newton_status_text(run):
+    st = run["status"]
+    if st == "converged":
+        return ["Converged: x = ", ("r", run["root"], 10), " after ", run["steps"], " steps"]
+    if st == "diverged":
+        return ["Diverged: |x| passed ", _NEWTON_BLOWUP]
+    if st == "flat":
+        return ["Stopped: f'(x) = 0, the tangent line is flat"]
+    if st == "undefined":
+        return ["Stopped: f or f' is undefined at x = ", ("r", run["table"][-1][1], 10)]
+    if st == "cycle":
+        return ["Stopped: x_n repeats (a cycle), no root from here"]
+    return ["Stopped: no convergence in ", _NEWTON_MAX_ITER, " steps"]
+
+def newton_worksheet(expr, starts):
+    """
+    Newton's method from each start in starts (see newton_result).
+    values: error, d, runs and roots.
+    """
+    res = newton_result(expr, starts)
+    ws = _ws_new("newton")
+    ws["values"] = res
+
+    if res["error"] == "tokenize":
+        _ws_line(ws, "Tokenizer failed. Check your input.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "parse":
+        _ws_line(ws, "Parse failed. Check parentheses and spelling.")
+        _ws_pause(ws)
+        return ws
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr)
+    if res["d"] is None:
+        _ws_line(ws, "Step 2: f'(x) by difference quotient (numeric)")
+    else:
+        _ws_line(ws, "Step 2: f'(x) = ", res["d"])
+    _ws_line(ws, "Step 3: x_(n+1) = x_n - f(x_n)/f'(x_n)")
+    _ws_pause(ws)
 
-    print("\n--- STEP-BY-STEP ---")
-    print("Step 1: f(x) =", expr)
-    print("Step 2: Point is (" + str(a) + ", " + str(round(y, 6)) + ")")
-    print("Step 3: Slope m = f'(a) ~= " + str(round(m, 6)))
-    pause()
+    runs = res["runs"]
+    i = 0
+    while i < len(runs) and i < _NEWTON_TABLES:
+        run = runs[i]
+        _ws_line(ws, "\nStart x0 = ", run["start"])
+        _ws_line(ws, "n   x_n   f(x_n)")
+        for row in run["table"]:
+            n = row[0]
+            x = row[1]
+            y = row[2]
+            if y is None:
+                _ws_line(ws, n, "   ", ("r", x, 10), "   undefined")
+            else:
+                _ws_line(ws, n, "   ", ("r", x, 10), "   ", ("r", y, 6))
+        _ws_line(ws, *_newton_status_text(run))
+        _ws_pause(ws)
+        i += 1
 
-    print("\nPoint-slope form:")
-    print("y - " + str(round(y, 6)) + " = " + str(round(m, 6)) + "(x - " + str(a) + ")")
+    if len(runs) > _NEWTON_TABLES:
+        _ws_line(ws, "\n", len(runs) - _NEWTON_TABLES, " more starts:")
+        counts = {}
+        while i < len(runs):
+            st = runs[i]["status"]
+            counts[st] = counts.get(st, 0) + 1
+            i += 1
+        for st in ("converged", "diverged", "flat", "undefined", "cycle", "slow"):
+            if st in counts:
+                _ws_line(ws, "  ", st, ": ", counts[st])
 
-    print("\nSlope-intercept form:")
-    if b < 0:
-        print("y = " + str(round(m, 6)) + "x - " + str(round(abs(b), 6)))
+    if len(res["roots"]) == 0:
+        _ws_line(ws, "\nNo roots found.")
     else:
-        print("y = " + str(round(m, 6)) + "x + " + str(round(b, 6)))
-    pause()
+        _ws_line(ws, "\nRoots found:")
+        for r in res["roots"]:
+            _ws_line(ws, "  x = ", ("r", r, 10))
+    _ws_pause(ws)
+
+    # Paper-ready first step: the tangent line (linearization) and its zero
+    for run in runs:
+        if run["steps"] == 0:
+            continue
+        n, x0, y0, m0 = run["table"][0]
+        x1 = run["table"][1][1]
+        _ws_line(ws, "\nWRITE THIS:")
+        _ws_line(ws, "Linearization at x0 = ", x0, ":")
+        _ws_line(ws, "L(x) = f(x0) + f'(x0)(x - x0)")
+        if x0 < 0:
+            _ws_line(ws, "L(x) = ", ("r", y0, 6), " + ", ("r", m0, 6), "(x + ", -x0, ")")
+        else:
+            _ws_line(ws, "L(x) = ", ("r", y0, 6), " + ", ("r", m0, 6), "(x - ", x0, ")")
+        _ws_line(ws, "Set L(x) = 0: x1 = x0 - f(x0)/f'(x0)")
+        _ws_line(ws, "x1 = ", x0, " - (", ("r", y0, 6), ")/(", ("r", m0, 6), ") = ", ("r", x1, 10))
+        if run["status"] == "converged":
+            _ws_line(ws, "Repeat until x_n stops changing: x = ", ("r", run["root"], 10))
+        _ws_pause(ws)
+        break
 
-    print("\nWRITE THIS:")
-    print("1) f(a) = " + str(round(y, 6)))
-    print("2) f'(a) ~= " + str(round(m, 6)))
-    pause()
+    return ws
+
+def newton_tool():
+    print("\nNEWTON'S METHOD: roots from tangent lines")
+    expr = input("Enter f(x): ")
+
+    raw = input("Enter starting x0 (or several, comma separated): ")
+    starts = []
+    try:
+        for part in raw.split(","):
+            if part.strip() != "":
+                starts.append(float(part))
+    except:
+        print("Invalid starting point.")
+        pause()
+        return
+    if len(starts) == 0:
+        print("Invalid starting point.")
+        pause()
+        return
+
+    show_worksheet(newton_worksheet(expr, starts))
+
+def _curve_num(v):
+    return _num_str(round(v, 6))
+
+def _interval_list(ivs):
+    if len(ivs) == 0:
+        return "none"
+    parts = []
+    for (a, b) in ivs:
+        parts.append("(" + _curve_num(a) + ", " + _curve_num(b) + ")")
+    return ", ".join(parts)
+
+def _point_list(pts):
+    if len(pts) == 0:
+        return "none"
+    parts = []
+    for p in pts:
+        parts.append("(" + _curve_num(p[0]) + ", " + _curve_num(p[1]) + ")")
+    return ", ".join(parts)
+
+def _line_text(m, b):
+    # "y = m*x + b" from exact or decimal texts
+    out = "y = "
+    if m == "1":
+        out += "x"
+    elif m == "-1":
+        out += "-x"
+    else:
+        out += m + "*x"
+    if b == "0":
+        return out
+    if b[0] == "-":
+        return out + " - " + b[1:]
+    return out + " + " + b
+
+def curve_worksheet(expr, lo, hi):
+    # Curve sketching of f on [lo, hi]; values are curve_result
+    res = curve_result(expr, lo, hi)
+    ws = _ws_new("curve")
+    ws["values"] = res
+
+    if res["error"] == "tokenize":
+        _ws_line(ws, "Tokenizer failed. Check your input.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "parse":
+        _ws_line(ws, "Parse failed. Check parentheses and spelling.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "undefined":
+        _ws_line(ws, "f is undefined everywhere on [", lo, ", ", hi, "].")
+        _ws_pause(ws)
+        return ws
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr, " on [", lo, ", ", hi, "]")
+    if res["d"] is None:
+        _ws_line(ws, "Step 2: f'(x) by difference quotient (numeric)")
+    else:
+        _ws_line(ws, "Step 2: f'(x) = ", res["d"])
+        _ws_line(ws, "Step 3: f''(x) = ", res["d2"])
+    if len(res["domain"]) != 1 or res["domain"][0] != (lo, hi):
+        _ws_line(ws, "f is defined on ", _interval_list(res["domain"]))
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nFirst derivative test:")
+    for (a, b) in res["flat"]:
+        _ws_line(ws, "f' = 0 on [", _curve_num(a), ", ", _curve_num(b), "] (f is flat)")
+    if len(res["critical"]) == 0 and len(res["flat"]) == 0:
+        _ws_line(ws, "No critical points (f' is never 0 or undefined)")
+    for (c, y, kind) in res["critical"]:
+        _ws_line(ws, "Critical x = ", _curve_num(c), ": ", kind, ", f = ", _curve_num(y))
+    _ws_line(ws, "f' > 0 (increasing): ", _interval_list(res["increasing"]))
+    _ws_line(ws, "f' < 0 (decreasing): ", _interval_list(res["decreasing"]))
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nSecond derivative:")
+    _ws_line(ws, "f'' > 0 (concave up): ", _interval_list(res["concave_up"]))
+    _ws_line(ws, "f'' < 0 (concave down): ", _interval_list(res["concave_down"]))
+    _ws_line(ws, "Inflection points: ", _point_list(res["inflection"]))
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nAsymptotes:")
+    if len(res["vertical"]) + len(res["horizontal"]) + len(res["slant"]) == 0:
+        _ws_line(ws, "none")
+    for c in res["vertical"]:
+        _ws_line(ws, "Vertical: x = ", _curve_num(c))
+    for (side, text) in res["horizontal"]:
+        _ws_line(ws, "Horizontal: y = ", text, " as x->", side)
+    for (side, m, b) in res["slant"]:
+        _ws_line(ws, "Slant: ", _line_text(m, b), " as x->", side)
+    _ws_pause(ws)
+
+    _ws_line(ws, "\nWRITE THIS:")
+    _ws_line(ws, "Increasing: ", _interval_list(res["increasing"]))
+    _ws_line(ws, "Decreasing: ", _interval_list(res["decreasing"]))
+    for (c, y, kind) in res["critical"]:
+        if kind != "neither":
+            _ws_line(ws, kind[0].upper(), kind[1:], ": (", _curve_num(c), ", ", _curve_num(y), ")")
+    _ws_line(ws, "Concave up: ", _interval_list(res["concave_up"]))
+    _ws_line(ws, "Concave down: ", _interval_list(res["concave_down"]))
+    if res["abs_max"] is None:
+        _ws_line(ws, "No absolute extrema found (f is unbounded or undefined in places)")
+    else:
+        _ws_line(ws, "Absolute max: (", _curve_num(res["abs_max"][0]), ", ", _curve_num(res["abs_max"][1]), ")")
+        _ws_line(ws, "Absolute min: (", _curve_num(res["abs_min"][0]), ", ", _curve_num(res["abs_min"][1]), ")")
+    _ws_pause(ws)
+    return ws
 
-    print("3) Point: (" + str(a) + ", " + str(round(y, 6)) + ")")
-    print("4) Tangent line formula: y - f(a) = f'(a)(x - a)")
-    print("   y - " + str(round(y, 6)) + " = " + str(round(m, 6)) + "(x - " + str(a) + ")")
+def curve_tool():
+    print("\nCURVE SKETCHING: f', f'', extrema, asymptotes")
+    expr = input("Enter f(x): ")
 
+    try:
+        lo = float(input("Interval start: "))
+        hi = float(input("Interval end: "))
+    except:
+        print("Invalid interval.")
+        pause()
+        return
+    if not lo < hi:
+        print("Invalid interval.")
+        pause()
+        return
 
-    pause()
+    show_worksheet(curve_worksheet(expr, lo, hi))
 
 def derivative_from_graph_guided():
     print("\nDERIVATIVE FROM A GRAPH (GUIDED)")
@@ -1913,10 +7403,62 @@ def derivative_from_graph_guided():
 
     pause()
 
-def algebraic_limit_helper():
-    print("\nALGEBRAIC LIMIT HELPER (HAND STEPS)")
-    print("Use this when you must SIMPLIFY to evaluate a limit.\n")
+def algebraic_limit_worksheet(expr, a):
+    """
+    Factor / conjugate / cancel work for lim x->a (see algebraic_limit_result).
+    values: error, text, value (float, None if infinite), inf, form,
+    simplified and steps.
+    """
+    res = algebraic_limit_result(expr, a)
+    ws = _ws_new("algebraic_limit")
+    value = None
+    if res["limit"] is not None:
+        value = _m_float(res["limit"])
+    ws["values"] = {"error": res["error"], "text": res["text"], "value": value,
+                    "inf": res["inf"], "form": res["form"],
+                    "simplified": res["simplified"], "steps": res["steps"]}
+
+    if res["error"] == "tokenize":
+        _ws_line(ws, "Tokenizer failed. Check your input.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "parse":
+        _ws_line(ws, "Parse failed. Check parentheses and spelling.")
+        _ws_pause(ws)
+        return ws
+
+    if res["error"] == "point":
+        _ws_line(ws, "Use a whole number or a short decimal for a.")
+        _ws_pause(ws)
+        return ws
+
+    _ws_line(ws, "\n--- STEP-BY-STEP ---")
+    _ws_line(ws, "Step 1: f(x) = ", expr)
+    steps = res["steps"]
+    i = 0
+    while i < len(steps):
+        _ws_line(ws, str(i + 2), ") ", steps[i])
+        i += 1
+
+    if res["error"] == "form":
+        _ws_line(ws, "Cannot factor or rationalize this one.")
+        _ws_line(ws, "Try Exact Limit (L'Hopital / series).")
+        _ws_pause(ws)
+        return ws
+    _ws_pause(ws)
 
+    _ws_line(ws, "\nWRITE THIS:")
+    if res["form"] is not None:
+        _ws_line(ws, "1) Substitute x = ", a, ": 0/0")
+        _ws_line(ws, "2) Simplify: f(x) = ", res["simplified"], " (x != ", a, ")")
+        _ws_line(ws, "3) Substitute again:")
+    _ws_line(ws, "lim x->", a, " f(x) = ", res["text"])
+
+    _ws_pause(ws)
+    return ws
+
+def _algebraic_limit_tips():
     print("1) Direct substitute x = a first.")
     print("   If you get a real number, you are done.\n")
 
@@ -1951,6 +7493,24 @@ def algebraic_limit_helper():
 
     pause()
 
+def algebraic_limit_helper():
+    print("\nALGEBRAIC LIMIT HELPER (HAND STEPS)")
+    print("Use this when you must SIMPLIFY to evaluate a limit.\n")
+
+    expr = input("Enter expression in x (ENTER for tips): ")
+    if expr.strip() == "":
+        _algebraic_limit_tips()
+        return
+
+    try:
+        a = float(input("Enter a: "))
+    except:
+        print("Invalid a.")
+        pause()
+        return
+
+    show_worksheet(algebraic_limit_worksheet(expr, a))
+
 def quick_chooser():
     while True:
         print("\nCHOOSE THE RIGHT TOOL (TIERED)\n")
@@ -1971,7 +7531,9 @@ def quick_chooser():
                 print("1) Limits from a Graph (Guided)")
                 print("2) Limit Calculator x->a (numeric check)")
                 print("3) Algebraic Limit Helper (factor, conjugate, cancel)")
-                print("4) Back\n")
+                print("4) Exact Limit (L'Hopital / series)")
+                print("5) Sequence Limit n->inf")
+                print("6) Back\n")
                 c = input("Choose: ")
 
                 if c == "1":
@@ -1981,6 +7543,10 @@ def quick_chooser():
                 elif c == "3":
                     algebraic_limit_helper()
                 elif c == "4":
+                    exact_limit_tool()
+                elif c == "5":
+                    sequence_limit_tool()
+                elif c == "6":
                     break
                 else:
                     print("Invalid choice.")
@@ -1997,7 +7563,10 @@ def quick_chooser():
                 print("3) Tangent line at x=a")
                 print("4) Velocity / Rate of Change")
                 print("5) Chain Rule Solver (steps)")
-                print("6) Back\n")
+                print("6) Implicit differentiation (x and y)")
+                print("7) Newton's Method (roots)")
+                print("8) Curve Sketching (f', f'', asymptotes)")
+                print("9) Back\n")
                 c = input("Choose: ")
 
                 if c == "1":
@@ -2011,6 +7580,12 @@ def quick_chooser():
                 elif c == "5":
                     chain_rule_tool()
                 elif c == "6":
+                    implicit_tool()
+                elif c == "7":
+                    newton_tool()
+                elif c == "8":
+                    curve_tool()
+                elif c == "9":
                     break
                 else:
                     print("Invalid choice.")
@@ -2079,6 +7654,8 @@ def menu_limits():
         print("1) Limits from a Graph (Guided)")
         print("2) Limit Calculator x->a (numeric check)")
         print("3) Algebraic Limit Helper (factor, conjugate, cancel)")
+        print("4) Exact Limit (L'Hopital / series)")
+        print("5) Sequence Limit n->inf")
         print("\nPress ENTER to go back")
 
         c = _menu_choice("Choice: ")
@@ -2090,6 +7667,10 @@ def menu_limits():
             limit_tool()
         elif c == "3":
             algebraic_limit_helper()
+        elif c == "4":
+            exact_limit_tool()
+        elif c == "5":
+            sequence_limit_tool()
         else:
             print("Invalid choice.")
 
@@ -2100,6 +7681,7 @@ def menu_derivatives():
         print("2) Derivative Solver f'(a) (numeric)")
         print("3) Tangent line at x=a")
         print("4) Derivative from a Graph (Guided)")
+        print("5) Curve Sketching (f', f'', asymptotes)")
         print("\nPress ENTER to go back")
 
         c = _menu_choice("Choice: ")
@@ -2113,6 +7695,8 @@ def menu_derivatives():
             tangent_line_tool()
         elif c == "4":
             derivative_from_graph_guided()
+        elif c == "5":
+            curve_tool()
         else:
             print("Invalid choice.")
 
@@ -2120,6 +7704,7 @@ def menu_applications():
     while True:
         print("\nAPPLICATIONS")
         print("1) Velocity / Rate of Change")
+        print("2) Newton's Method (roots)")
         print("\nPress ENTER to go back")
 
         c = _menu_choice("Choice: ")
@@ -2127,6 +7712,8 @@ def menu_applications():
             return
         elif c == "1":
             velocity_tool()
+        elif c == "2":
+            newton_tool()
         else:
             print("Invalid choice.")
 
@@ -2134,6 +7721,7 @@ def menu_chain_rule():
     while True:
         print("\nCHAIN RULE")
         print("1) Chain Rule Solver (steps)")
+        print("2) Implicit Differentiation (x and y)")
         print("\nPress ENTER to go back")
 
         c = _menu_choice("Choice: ")
@@ -2141,6 +7729,8 @@ def menu_chain_rule():
             return
         elif c == "1":
             chain_rule_tool()
+        elif c == "2":
+            implicit_tool()
         else:
             print("Invalid choice.")
 
@@ -2150,6 +7740,7 @@ def menu_helpers():
         print("1) Rule Helper (auto detect)")
         print("2) Rule Helper Tests")
         print("3) Help me choose the right tool")
+        print("4) Check my derivative answer")
         print("\nPress ENTER to go back")
 
         c = _menu_choice("Choice: ")
@@ -2161,6 +7752,8 @@ def menu_helpers():
             rule_helper_auto_tests()
         elif c == "3":
             quick_chooser()
+        elif c == "4":
+            check_answer_tool()
         else:
             print("Invalid choice.")
 
@@ -2206,7 +7799,16 @@ def main():
         else:
             print("Invalid choice.")
 
-main()
+# The calculator runs a program by importing it, so the menu starts on
+# import. Host scripts that only want the engine (Calculus_Buddy_Server.py)
+# set builtins.CALCULUS_BUDDY_NO_MENU = True before importing this file.
+try:
+    import builtins
+    _NO_MENU = getattr(builtins, "CALCULUS_BUDDY_NO_MENU", False)
+except ImportError:
+    _NO_MENU = False
+if not _NO_MENU:
+    main()
 
 
 # End of Calculus Buddy
\ No newline at end of file
@@ -0,0 +1,451 @@
+#          Calculus Buddy Server
+#               By ScienTiz
+#       https://github.com/ScienTiz/Calculus-Buddy
+
+# Host-side companion for Calculus_Buddy.py (NOT for the TI-Nspire).
+# Keeps the engine resident so a tutoring portal does not start a fresh
+# interpreter (and the menu) for every student query.
+
+# Protocol: one JSON object per line, over a Unix socket (default) or TCP.
+#   request : {"id": 1, "op": "chain", "expr": "sin(x^2)"}
+#             {"id": 2, "op": "limit", "expr": "sin(x)/x", "a": 0}
+#             {"id": 3, "op": "worksheet", "tool": "tangent", "expr": "x^2", "a": 3}
+#             {"id": 4, "op": "worksheet", "tool": "newton", "expr": "x^2-2", "starts": [1, -1]}
+#   reply   : {"id": 1, "ok": true, "result": {...}}
+#             {"id": 2, "ok": false, "error": "..."}
+# ops: chain, classify, limit, tangent, worksheet, stats
+# worksheet tools: limit, exact_limit, algebraic_limit, derivative, velocity,
+# tangent (these need a finite a; limit and exact_limit also take "inf"
+# or "-inf"), chain and sequence_limit; newton takes "starts" (a list of x0) and curve takes
+# "interval" ([lo, hi]) instead of a.
+# Add "text": true for the rendered pages as well as values.
+# Expressions must parse with the calculator grammar (workers never fall
+# back to eval()); non-finite numbers in replies are the strings "inf",
+# "-inf" and "nan", so every reply is strict JSON.
+#
+# Snapshots: --build-snapshot FILE --warm EXPRS warms the engine caches
+# for a list of expressions (one per line) and saves them; --snapshot FILE
+# loads them into every worker at startup, so no expression is re-parsed
+# or re-compiled.
+
+import asyncio
+import builtins
+import json
+import marshal
+import math
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# engine only: importing Calculus_Buddy would otherwise start its menu
+builtins.CALCULUS_BUDDY_NO_MENU = True
+import Calculus_Buddy as cb
+
+DEFAULT_SOCKET = "/tmp/calculus_buddy.sock"
+CACHE_SIZE = 4096
+# engine registry size on the host (the calculator default is much smaller)
+REGISTRY_SIZE = 16384
+SNAPSHOT_VERSION = 2
+
+# ops that need a point a
+POINT_OPS = ["limit", "tangent"]
+ALL_OPS = ["chain", "classify", "limit", "tangent", "worksheet"]
+
+# worksheet builders by tool name; all but NO_POINT_TOOLS take a point a
+WORKSHEETS = {
+    "limit": "limit_worksheet",
+    "derivative": "derivative_worksheet",
+    "velocity": "velocity_worksheet",
+    "tangent": "tangent_line_worksheet",
+    "exact_limit": "exact_limit_worksheet",
+    "algebraic_limit": "algebraic_limit_worksheet",
+    "sequence_limit": "sequence_limit_worksheet",
+    "newton": "newton_worksheet",
+    "curve": "curve_worksheet",
+    "chain": "chain_rule_worksheet"
+}
+NO_POINT_TOOLS = ["chain", "sequence_limit", "newton", "curve"]
+# the only tools with a limit at infinity
+INF_POINT_TOOLS = ["limit", "exact_limit"]
+MAX_STARTS = 1000
+# seconds one job may run before its worker gives up on it
+JOB_TIMEOUT = 10.0
+
+# ================================
+# Jobs (run inside worker processes)
+# ================================
+
+class JobTimeout(BaseException):
+    # BaseException, so the engine's "except Exception" cannot swallow it
+    pass
+
+def _on_alarm(signum, frame):
+    raise JobTimeout()
+
+def _json_safe(v):
+    # inf/nan -> "inf"/"-inf"/"nan"; json.dumps would write bare Infinity/NaN
+    if isinstance(v, float) and not math.isfinite(v):
+        if v != v:
+            return "nan"
+        return "inf" if v > 0 else "-inf"
+    if isinstance(v, dict):
+        return dict((k, _json_safe(x)) for (k, x) in v.items())
+    if isinstance(v, (list, tuple)):
+        return [_json_safe(x) for x in v]
+    return v
+
+def run_job(op, expr, a, tool=None, text=False):
+    """
+    Runs one engine request and returns a JSON-ready dict.
+    Top-level so ProcessPoolExecutor can pickle it. In a worker the job
+    is stopped after JOB_TIMEOUT seconds, which frees the worker.
+    """
+    timed = _TIMER["on"]
+    if timed:
+        signal.setitimer(signal.ITIMER_REAL, JOB_TIMEOUT)
+    try:
+        return _json_safe(_run_job(op, expr, a, tool, text))
+    except JobTimeout:
+        raise RuntimeError("job timed out after " + str(JOB_TIMEOUT) + " s")
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _run_job(op, expr, a, tool, text):
+    if op == "chain":
+        res = cb.chain_rule_result(expr)
+        return {
+            "normalized": res["normalized"],
+            "error": res["error"],
+            "f": res["f"],
+            "d": res["d"],
+            "steps": res["steps"]
+        }
+
+    if op == "classify":
+        return cb.classify_rules(expr)
+
+    if op == "limit":
+        left_vals, right_vals = cb.limit_samples(expr, a)
+        return {
+            "left": [[dx, y] for (dx, y) in left_vals],
+            "right": [[dx, y] for (dx, y) in right_vals]
+        }
+
+    if op == "tangent":
+        return cb.tangent_line_values(expr, a)
+
+    if op == "worksheet":
+        build = getattr(cb, WORKSHEETS[tool])
+        if tool == "newton":
+            ws = build(expr, list(a))
+        elif tool == "curve":
+            ws = build(expr, a[0], a[1])
+        elif tool in NO_POINT_TOOLS:
+            ws = build(expr)
+        else:
+            ws = build(expr, a)
+        out = {"tool": tool, "values": ws["values"]}
+        # pages are only formatted when asked for
+        if text:
+            out["pages"] = cb.worksheet_text(ws)
+        return out
+
+    raise ValueError("unknown op: " + str(op))
+
+# ================================
+# Snapshots
+# ================================
+
+def _snapshot_tag():
+    # marshal data is only valid for the interpreter version that wrote it
+    return (SNAPSHOT_VERSION, sys.version_info[0], sys.version_info[1])
+
+def _compile_item(item):
+    # evaluator sources -> code objects, so loading skips compilation
+    for key in ("eval", "deriv_eval"):
+        src = item.get(key)
+        if isinstance(src, str):
+            item[key] = compile(src, "<calculus_buddy>", "exec")
+    if "param_eval" in item:
+        out = []
+        for (wrt, params, src) in item["param_eval"]:
+            if isinstance(src, str):
+                src = compile(src, "<calculus_buddy>", "exec")
+            out.append((wrt, params, src))
+        item["param_eval"] = out
+    return item
+
+def warm(exprs):
+    """
+    Fills the engine caches for each expression: AST, rule
+    classification, derivative with steps and compiled evaluators.
+    """
+    for expr in exprs:
+        cb.chain_rule_result(expr)
+        cb.classify_rules(expr)
+        cb.eval_expr(expr, 1.0)
+        cb.derivative_at(expr, 1.0)
+
+def save_snapshot(path):
+    # Writes the current engine registry; returns the number of entries
+    items = [_compile_item(item) for item in cb.registry_export()]
+    data = marshal.dumps((_snapshot_tag(), items))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(items)
+
+def load_snapshot(path):
+    """
+    Loads a snapshot into the engine registry. Returns the number of
+    entries, or 0 if the file is missing or from another Python version.
+    """
+    try:
+        with open(path, "rb") as f:
+            tag, items = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return 0
+    if tuple(tag) != _snapshot_tag():
+        return 0
+    return cb.registry_import(items)
+
+# set in worker processes, where SIGALRM can interrupt a job
+_TIMER = {"on": False}
+
+def _init_worker(snapshot):
+    # requests come from the network: no eval() fallback in workers
+    cb.set_eval_fallback(False)
+    if hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGALRM, _on_alarm)
+        _TIMER["on"] = True
+    cb.registry_resize(REGISTRY_SIZE)
+    if snapshot is not None:
+        load_snapshot(snapshot)
+
+# ================================
+# Server
+# ================================
+
+def _expr_ok(expr):
+    # only expressions the calculator grammar accepts reach a worker
+    try:
+        return cb.expr_parses(expr)
+    except Exception:
+        return False
+
+class BuddyServer:
+    """
+    Serves engine requests with:
+    - a bounded pool of worker processes for the CPU-bound work
+    - coalescing: identical requests in flight share one job
+    - an LRU result cache answered directly on the event loop
+    """
+
+    def __init__(self, workers=None, cache_size=CACHE_SIZE, snapshot=None):
+        if workers is None:
+            workers = os.cpu_count() or 2
+        self.workers = workers
+        self.cache_size = cache_size
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(snapshot,))
+        # at most 2 queued jobs per worker; the rest wait here
+        self.slots = asyncio.Semaphore(2 * workers)
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.stats = {"requests": 0, "hits": 0, "coalesced": 0, "jobs": 0, "errors": 0}
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+    async def compute(self, op, expr, a, tool=None, text=False):
+        key = (op, expr.replace(" ", ""), a, tool, text)
+
+        if key in self.cache:
+            self.stats["hits"] += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.inflight[key] = fut
+        try:
+            async with self.slots:
+                self.stats["jobs"] += 1
+                result = await loop.run_in_executor(self.pool, run_job, op, expr, a, tool, text)
+        except BaseException as e:
+            # CancelledError too: coalesced waiters must never hang, and
+            # they get an error reply instead of being cancelled themselves
+            if isinstance(e, Exception):
+                fut.set_exception(e)
+            else:
+                fut.set_exception(RuntimeError("request cancelled"))
+            # mark retrieved so a lone request does not log "never retrieved"
+            fut.exception()
+            raise
+        finally:
+            del self.inflight[key]
+
+        fut.set_result(result)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    async def handle_request(self, req):
+        self.stats["requests"] += 1
+        rid = req.get("id")
+        op = req.get("op")
+
+        if op == "stats":
+            out = dict(self.stats)
+            out["cached"] = len(self.cache)
+            out["inflight"] = len(self.inflight)
+            return {"id": rid, "ok": True, "result": out}
+
+        if op not in ALL_OPS:
+            return {"id": rid, "ok": False, "error": "unknown op"}
+
+        expr = req.get("expr")
+        if not isinstance(expr, str) or expr.strip() == "":
+            return {"id": rid, "ok": False, "error": "missing expr"}
+        if not _expr_ok(expr):
+            return {"id": rid, "ok": False, "error": "expression does not parse"}
+
+        tool = None
+        text = False
+        if op == "worksheet":
+            tool = req.get("tool")
+            if tool not in WORKSHEETS:
+                return {"id": rid, "ok": False, "error": "unknown tool"}
+            text = bool(req.get("text", False))
+
+        a = None
+        if op in POINT_OPS or (tool is not None and tool not in NO_POINT_TOOLS):
+            try:
+                a = float(req.get("a"))
+            except (TypeError, ValueError):
+                return {"id": rid, "ok": False, "error": "missing or invalid a"}
+            # nan is never a point; inf and -inf only for limits at infinity
+            if a != a:
+                return {"id": rid, "ok": False, "error": "missing or invalid a"}
+            if not math.isfinite(a) and tool not in INF_POINT_TOOLS:
+                return {"id": rid, "ok": False, "error": "point: a must be finite here"}
+        if tool == "newton":
+            # a tuple of starts, so it can be part of the cache key
+            starts = req.get("starts")
+            if not isinstance(starts, list) or len(starts) == 0 or len(starts) > MAX_STARTS:
+                return {"id": rid, "ok": False, "error": "missing or invalid starts"}
+            try:
+                a = tuple(float(x) for x in starts)
+            except (TypeError, ValueError):
+                return {"id": rid, "ok": False, "error": "missing or invalid starts"}
+            if not all(math.isfinite(x) for x in a):
+                return {"id": rid, "ok": False, "error": "missing or invalid starts"}
+        if tool == "curve":
+            iv = req.get("interval")
+            try:
+                a = (float(iv[0]), float(iv[1]))
+            except (TypeError, ValueError, IndexError, KeyError):
+                return {"id": rid, "ok": False, "error": "missing or invalid interval"}
+            if len(iv) != 2 or not a[0] < a[1] or not math.isfinite(a[0]) or not math.isfinite(a[1]):
+                return {"id": rid, "ok": False, "error": "missing or invalid interval"}
+
+        try:
+            result = await self.compute(op, expr, a, tool, text)
+        except Exception as e:
+            self.stats["errors"] += 1
+            return {"id": rid, "ok": False, "error": str(e)}
+
+        return {"id": rid, "ok": True, "result": result}
+
+    async def handle_client(self, reader, writer):
+        # Requests on one connection are answered in order.
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    req = json.loads(line.decode("utf-8"))
+                    if not isinstance(req, dict):
+                        raise ValueError("request must be an object")
+                except ValueError:
+                    reply = {"id": None, "ok": False, "error": "bad json"}
+                else:
+                    reply = await self.handle_request(req)
+
+                writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(path=DEFAULT_SOCKET, host=None, port=None, workers=None, snapshot=None):
+    cb.set_eval_fallback(False)
+    server = BuddyServer(workers=workers, snapshot=snapshot)
+    try:
+        if port is not None:
+            srv = await asyncio.start_server(server.handle_client, host or "127.0.0.1", port)
+            where = (host or "127.0.0.1") + ":" + str(port)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            srv = await asyncio.start_unix_server(server.handle_client, path)
+            where = path
+
+        print("Calculus Buddy server on " + where + " (" + str(server.workers) + " workers)")
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        server.close()
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Calculus Buddy request server")
+    ap.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    ap.add_argument("--host", default=None, help="TCP host (with --port)")
+    ap.add_argument("--port", type=int, default=None, help="serve TCP instead of a Unix socket")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes")
+    ap.add_argument("--snapshot", default=None, help="load engine caches from this file in every worker")
+    ap.add_argument("--build-snapshot", default=None, metavar="FILE",
+                    help="warm the caches for --warm expressions, save them to FILE and exit")
+    ap.add_argument("--warm", default=None, metavar="EXPRS", help="file with one expression per line")
+    args = ap.parse_args(argv)
+
+    if args.build_snapshot is not None:
+        if args.warm is None:
+            ap.error("--build-snapshot needs --warm")
+        with open(args.warm) as f:
+            exprs = [line.strip() for line in f if line.strip()]
+        cb.registry_resize(max(REGISTRY_SIZE, len(exprs)))
+        t0 = time.time()
+        warm(exprs)
+        n = save_snapshot(args.build_snapshot)
+        print("Saved " + str(n) + " expressions to " + args.build_snapshot
+              + " (" + str(round(time.time() - t0, 2)) + " s)")
+        return 0
+
+    try:
+        asyncio.run(serve(args.socket, args.host, args.port, args.workers, args.snapshot))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())